@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+"""
+Bulk account sweep for Eric.
+
+Streams account numbers from a file (text, one per line, or CSV with the
+account in the first column) and shares them between several Eric
+sessions. For each account the session searches, checks which reports are
+listed, then selects and views each requested report. Finds slow-account
+outliers (e.g. suppliers with huge statements) that the few fixed accounts
+in the Scenario tab never show.
+
+Every result is logged as it happens (see results_log.py), and the log
+doubles as the checkpoint: re-running the same sweep with resume skips
+accounts already done (accounts that ended in error are tried again).
+Without resume, a previous sweep's log is archived and every account is
+swept again. Login details come from the first login/dlogin step of
+the spreadsheet's Scenario tab.
+
+Relies on spreadsheet_run.py to perform the steps.
+"""
+
+import argparse
+import csv
+import getpass
+import os
+import Queue
+import threading
+import time
+
+import openpyxl
+
+from spreadsheet_run import ExcelRun
+from scenario_plan import Step
+from results_log import ResultsLog, read_records
+
+
+def read_accounts(filename):
+    """Generate account numbers from file, without reading it all at once.
+    Blank lines, lines starting # and a heading line "account" are skipped.
+    """
+    with open(filename, "rb") as accounts_file:
+        for row in csv.reader(accounts_file):
+            if not row:
+                continue
+            account = row[0].strip()
+            if not account or account.startswith("#") or account.lower() == "account":
+                continue
+            yield account
+
+
+class SweepWorker(threading.Thread):
+    """One Eric session working through accounts from the shared queue"""
+    def __init__(self, worker_id, sweep):
+        """
+        Args:
+            worker_id - (int) identifier recorded with each result
+            sweep - AccountSweep the worker belongs to
+        """
+        threading.Thread.__init__(self, name="sweep-{}".format(worker_id))
+        self.daemon = True
+        self.worker_id = worker_id
+        self.sweep = sweep
+        # Each worker has its own runner, and so its own Eric/Webdriver session
+        self.runner = ExcelRun(filename=sweep.filename)
+        self.runner.extract_details = False
+        self.runner.stop_phase_recording()
+        self.runner.credentials = dict(sweep.credentials)
+        self.runner.eric.headless = sweep.headless
+        self.logged_in = False
+
+    def login(self):
+        """Start session using the sweep's login step"""
+        self.runner.continue_run = True
+        values = self.runner.perform(self.sweep.login_step)
+        self.logged_in = self.runner.continue_run
+        if not self.logged_in:
+            raise RuntimeError("Login failed: " + str(values[-1]))
+
+    def logout(self):
+        """End session (ignoring failures - session may be broken)"""
+        self.logged_in = False
+        try:
+            self.runner.perform(Step("logout", None, None, None, None))
+        except Exception:
+            try:
+                self.runner.eric.close()
+            except Exception:
+                pass
+
+    def run(self):
+        """Take accounts from queue until it is exhausted"""
+        while True:
+            account = self.sweep.queue.get()
+            if account is None:
+                break
+            try:
+                if not self.logged_in:
+                    self.login()
+                self.check_account(account)
+                self.sweep.record(self.worker_id, account, "done", None, None)
+            except Exception as e:
+                # Record the failure and start a fresh session for the next one
+                self.sweep.record(self.worker_id, account, "error", type(e).__name__, str(e))
+                self.logout()
+        if self.logged_in:
+            self.logout()
+
+    def check_account(self, account):
+        """Search for account then select and view each requested report"""
+        runner = self.runner
+        perform = runner.perform
+        _, search_time = perform(Step("search", account, None, None, None))
+        self.sweep.record(self.worker_id, account, "search", None, search_time)
+        message, report_names = runner.eric.report_list_items()
+        for report in self.sweep.reports:
+            if report > len(report_names):
+                continue
+            _, select_time = perform(Step("select", report, None, None, None))
+            self.sweep.record(self.worker_id, account, "select", report, select_time)
+            report_name, view_time = perform(Step("view", None, None, None, None))
+            self.sweep.record(self.worker_id, account, "view", report_name, view_time)
+
+
+class AccountSweep(object):
+    def __init__(self, filename="", accounts_filename="", workers=2, reports=(1, 2, 3, 4),
+                 scenario="Scenario", headless=False, resume=False):
+        """
+        Search/select/view for every account in a file, shared between
+        several Eric sessions.
+        Args:
+            filename - Excel file with test data (login details)
+            accounts_filename - file of account numbers
+            workers - number of Eric sessions
+            reports - report numbers (1 to 4) to select and view per account
+            scenario - tab whose first login/dlogin step is used
+            headless - when True browsers run without visible windows
+            resume - when True, carry on from the last sweep of the same
+                accounts file (its log), skipping accounts already done
+        """
+        self.filename = filename
+        self.accounts_filename = accounts_filename
+        self.workers = workers
+        self.reports = reports
+        self.scenario = scenario
+        self.headless = headless
+        self.resume = resume
+        self.credentials = {}
+        # Accounts waiting for a worker - bounded so file is streamed
+        self.queue = Queue.Queue(maxsize=workers * 10)
+        self.lock = threading.Lock()
+        # Reuses ExcelRun for scenario reading and results folder
+        self.reader = ExcelRun(filename=filename)
+        # Results log, also the checkpoint - named after accounts file
+        # so an interrupted sweep of the same file resumes
+        name = os.path.splitext(os.path.basename(accounts_filename))[0]
+        self.log_filename = os.path.join(self.reader.results_folder, "Sweep_" + name + ".jsonl")
+        self.log = None
+        self.login_step = None
+
+    def read_login(self):
+        """Find login step and ask for any missing username/password
+        before browsers start
+        """
+        wb = openpyxl.load_workbook(filename=self.filename)
+        plan = self.reader.read_plan(wb[self.scenario])
+        for step in plan.steps():
+            if step.action in ("login", "dlogin"):
+                self.login_step = step
+                break
+        else:
+            raise ValueError("No login/dlogin step in " + self.scenario)
+        step = self.login_step
+        if step.action == "login" and not (step.parameter2 and step.parameter3):
+            self.credentials[step.parameter] = (step.parameter2 or raw_input("Username:"),
+                                                step.parameter3 or getpass.getpass(prompt="Password:"))
+
+    def completed(self):
+        """Accounts already done in previous attempts (accounts that ended
+        in error are tried again)
+        """
+        if not os.path.exists(self.log_filename):
+            return set()
+        return set(record["account"] for record in read_records(self.log_filename)
+                   if record["action"] == "done")
+
+    def archive_log(self):
+        """Rename log of a previous sweep (if any) so a new sweep starts
+        afresh. Archived logs are named after the time they were last written.
+        Returns:
+            archived log path (None if no previous log)
+        """
+        if not os.path.exists(self.log_filename):
+            return None
+        stamp = time.strftime("%Y.%m.%d_%H.%M.%S", time.localtime(os.path.getmtime(self.log_filename)))
+        archived = os.path.splitext(self.log_filename)[0] + "_" + stamp + ".jsonl"
+        os.rename(self.log_filename, archived)
+        return archived
+
+    def record(self, worker_id, account, action, parameter, duration):
+        """Log one result"""
+        with self.lock:
+            self.log.write({"worker": worker_id,
+                            "timestamp": time.strftime("%d/%m/%Y - %H:%M:%S"),
+                            "account": account,
+                            "action": action,
+                            "parameter": parameter,
+                            "duration": duration})
+
+    def run(self):
+        """Sweep all accounts not already completed, then save results
+        Returns:
+            path of CSV results file
+        """
+        self.read_login()
+        completed = set()
+        if self.resume:
+            completed = self.completed()
+            print "Resuming - skipping", len(completed), "accounts already done"
+        else:
+            archived = self.archive_log()
+            if archived:
+                print "Previous sweep log archived as", archived
+        self.log = ResultsLog(self.log_filename)
+        threads = []
+        for worker_id in range(self.workers):
+            worker = SweepWorker(worker_id + 1, self)
+            worker.start()
+            threads.append(worker)
+
+        try:
+            queued = 0
+            for account in read_accounts(self.accounts_filename):
+                if account not in completed:
+                    self.queue.put(account)
+                    queued += 1
+            print "Accounts queued:", queued
+        finally:
+            # Tell workers to stop once queue is empty
+            for _ in threads:
+                self.queue.put(None)
+            for worker in threads:
+                worker.join()
+            self.log.close()
+        return self.save_results()
+
+    def save_results(self):
+        """Write all logged results (including from resumed attempts) to
+        CSV file in results folder, and print the slowest accounts
+        Returns:
+            path of CSV file
+        """
+        fields = ["worker", "timestamp", "account", "action", "parameter", "duration"]
+        csv_path = os.path.splitext(self.log_filename)[0] + ".csv"
+        slowest = []
+        with open(csv_path, "wb") as csv_file:
+            writer = csv.DictWriter(csv_file, fields, extrasaction="ignore")
+            writer.writeheader()
+            for record in read_records(self.log_filename):
+                writer.writerow(dict((key, value.encode("utf-8") if isinstance(value, unicode) else value)
+                                     for key, value in record.items()))
+                if isinstance(record["duration"], float):
+                    slowest.append((record["duration"], record["action"], record["account"]))
+        print "Slowest:"
+        for duration, action, account in sorted(slowest, reverse=True)[:10]:
+            print "  {:.2f}s {} {}".format(duration, action, account)
+        return csv_path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Search/select/view every account in a file")
+    parser.add_argument("accounts", help="file of account numbers (text or CSV, first column)")
+    parser.add_argument("--excel", default="eric_data.xlsx", help="spreadsheet with login step")
+    parser.add_argument("--scenario", default="Scenario", help="tab with login step")
+    parser.add_argument("--workers", type=int, default=2, help="number of Eric sessions")
+    parser.add_argument("--reports", default="1,2,3,4", help="report numbers to view")
+    parser.add_argument("--headless", action="store_true", help="run browsers headless")
+    parser.add_argument("--resume", action="store_true",
+                        help="carry on from interrupted sweep of the same accounts file")
+    args = parser.parse_args()
+
+    go = AccountSweep(filename=args.excel, accounts_filename=args.accounts,
+                      workers=args.workers,
+                      reports=[int(report) for report in args.reports.split(",")],
+                      scenario=args.scenario, headless=args.headless, resume=args.resume)
+    print "Results:", go.run()
+    print "Finished"
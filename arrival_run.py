@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+"""
+Open-workload (arrival rate) mode for Eric.
+
+load_run.py is a closed loop - each user starts its next iteration when
+the last one ends, so when Eric slows down the load offered drops too and
+hides the problem (coordinated omission). Here scenario iterations are
+started at a target arrival rate regardless of how long earlier ones take:
+
+    constant   - fixed iterations per minute
+    step       - rate raised by a fixed amount at fixed intervals
+    profile    - (seconds, rate) pairs read from a CSV file
+
+Iterations are taken by a pool of sessions. If none is free an iteration
+waits, and the wait is recorded: each iteration has its intended and actual
+start, and its corrected time runs from the intended start. Each action's
+corrected time is its duration plus its iteration's wait. Think time can
+be added between actions.
+
+If the scenario has subs named "setup", "iteration" and "teardown" (see
+scenario_plan.py) each session runs setup once (e.g. login), iteration for
+each arrival and teardown at the end. Setup is run again before the next
+iteration if one fails. Otherwise the whole scenario is run
+for each arrival.
+"""
+
+import argparse
+import csv
+import os
+import Queue
+import random
+import threading
+import time
+
+from calibration import percentile
+from load_run import LoadRun, VirtualUser
+
+
+def constant_profile(rate):
+    """Profile of fixed rate (iterations per minute)"""
+    return [(0, rate)]
+
+
+def step_profile(start_rate, increment, interval, steps):
+    """Profile starting at start_rate, raised by increment every
+    interval seconds, for steps steps
+    """
+    return [(interval * step, start_rate + increment * step) for step in range(steps)]
+
+
+def read_profile(filename):
+    """Profile from CSV file of seconds, rate (per minute) rows. If a time
+    is repeated the last rate given for it is used.
+    """
+    rates = {}
+    with open(filename, "rb") as profile_file:
+        for row in csv.reader(profile_file):
+            try:
+                rates[float(row[0])] = float(row[1])
+            except (IndexError, ValueError):
+                # Heading or blank line
+                continue
+    return sorted(rates.items())
+
+
+def rate_at(profile, offset):
+    """Target rate (per minute) at seconds offset from start"""
+    rate = 0
+    for start, step_rate in profile:
+        if start > offset:
+            break
+        rate = step_rate
+    return rate
+
+
+def arrival_times(profile, duration, poisson=False):
+    """Generate intended start times (seconds from start) of iterations
+    Args:
+        profile - list of (seconds, rate per minute) pairs
+        duration - seconds after which no iteration starts
+        poisson - when True, gaps are random (exponential) with the target
+            mean rather than even
+    """
+    offset = 0.0
+    while True:
+        rate = rate_at(profile, offset)
+        if rate <= 0:
+            # Skip to next change of rate (if any)
+            later = [start for start, _ in profile if start > offset]
+            if not later:
+                return
+            offset = later[0]
+            continue
+        if poisson:
+            offset += random.expovariate(rate / 60.0)
+        else:
+            offset += 60.0 / rate
+        if offset >= duration:
+            return
+        yield offset
+
+
+class ArrivalUser(VirtualUser):
+    """Session taking iterations from the arrival queue"""
+    def __init__(self, user_id, run, think_time=0, think_random=False):
+        """
+        Args:
+            user_id - (int) identifier recorded with each result
+            run - ArrivalRun the session belongs to
+            think_time - seconds paused after each step
+            think_random - when True pauses are random (exponential)
+                with think_time mean
+        """
+        VirtualUser.__init__(self, user_id, run.filename, run.plan, None,
+                             run.results, run.lock, credentials=run.credentials)
+        self.arrivals = run.arrivals
+        self.start = run.start
+        self.think_time = think_time
+        self.think_random = think_random
+        self.staged = self.plan.has_sub("iteration")
+        self.intended = None
+        self.actual = None
+        # Set once setup has been run
+        self.ready = threading.Event()
+
+    def record(self, action, parameter, duration, corrected=None):
+        """Add one timing (with this iteration's start times) to the shared
+        results. Unless given, an action's corrected time is its duration
+        plus the iteration's queue delay (time from intended start).
+        """
+        if corrected is None and isinstance(duration, float) and self.actual is not None:
+            corrected = duration + self.actual - self.intended
+        result = {"user": self.user_id,
+                  "iteration": self.iteration,
+                  "intended": self.intended,
+                  "actual": self.actual,
+                  "queue_delay": None if self.actual is None else self.actual - self.intended,
+                  "action": action,
+                  "parameter": parameter,
+                  "duration": duration,
+                  "corrected": corrected}
+        with self.lock:
+            self.results.append(result)
+
+    def pause(self, step):
+        """Think time after step"""
+        if self.think_time and step.action != "newline":
+            if self.think_random:
+                time.sleep(random.expovariate(1.0 / self.think_time))
+            else:
+                time.sleep(self.think_time)
+
+    def setup(self):
+        """Run setup sub (e.g. login)
+        Returns:
+            True if successful
+        """
+        try:
+            self.run_scenario("setup")
+        except Exception as e:
+            self.record("error", type(e).__name__, str(e))
+            self.close_session()
+            return False
+        return self.runner.continue_run
+
+    def close_session(self):
+        """End broken Eric session (ignoring failures)"""
+        try:
+            self.runner.eric.close()
+        except Exception:
+            pass
+
+    def run(self):
+        """Run setup, then an iteration for each arrival until told to stop.
+        After an iteration fails setup is run again (in the next
+        iteration's time) so the session logs in again.
+        """
+        has_setup = self.staged and self.plan.has_sub("setup")
+        set_up = self.setup() if has_setup else True
+        self.ready.set()
+        while True:
+            arrival = self.arrivals.get()
+            if arrival is None:
+                break
+            self.iteration, self.intended = arrival
+            self.actual = time.time() - self.start
+            try:
+                if not set_up:
+                    set_up = self.setup()
+                if set_up:
+                    self.run_scenario("iteration" if self.staged else None)
+                    outcome = "ok" if self.runner.continue_run else "login failed"
+                else:
+                    outcome = "setup failed"
+            except Exception as e:
+                outcome = "error: " + type(e).__name__
+                self.record("error", type(e).__name__, str(e))
+                self.close_session()
+            # Session needs setting up again after a failure
+            if has_setup and outcome != "ok":
+                set_up = False
+            # Whole iteration - actual time and time from intended start
+            end = time.time() - self.start
+            self.record("iteration", outcome, end - self.actual, end - self.intended)
+        self.intended = self.actual = None
+        if self.staged and self.plan.has_sub("teardown"):
+            try:
+                self.run_scenario("teardown")
+            except Exception as e:
+                self.record("error", type(e).__name__, str(e))
+
+
+class ArrivalRun(LoadRun):
+    def __init__(self, filename="", profile=((0, 6),), duration=600, users=10,
+                 scenario="Scenario", think_time=0, think_random=False, poisson=False):
+        """
+        Start scenario iterations at a target arrival rate.
+        Args:
+            filename - Excel file with test data
+            profile - list of (seconds from start, iterations per minute)
+                pairs (see constant_profile, step_profile, read_profile)
+            duration - seconds after which no iteration starts
+            users - number of sessions taking iterations (most that can
+                run at once)
+            scenario - name of tab holding scenario
+            think_time - seconds paused after each step
+            think_random - when True pauses are random with think_time mean
+            poisson - when True arrivals are random with the target rate
+        """
+        LoadRun.__init__(self, filename=filename, users=users, scenarios=(scenario,))
+        self.profile = list(profile)
+        self.duration = duration
+        self.think_time = think_time
+        self.think_random = think_random
+        self.poisson = poisson
+        self.plan = None
+        self.start = None
+        # (iteration, intended start) waiting for a session
+        self.arrivals = Queue.Queue()
+
+    def run(self):
+        """Start sessions, release iterations at their arrival times,
+        then save results
+        """
+        self.plan = self.read_scenarios()[self.scenarios[0]]
+        self.start = time.time()
+        threads = []
+        for user_id in range(self.users):
+            user = ArrivalUser(user_id + 1, self, self.think_time, self.think_random)
+            user.start()
+            threads.append(user)
+        # Arrival times count from when all sessions are set up
+        for user in threads:
+            user.ready.wait()
+        self.start = time.time()
+        for user in threads:
+            user.start = self.start
+
+        for iteration, intended in enumerate(arrival_times(self.profile, self.duration,
+                                                           self.poisson)):
+            delay = self.start + intended - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.arrivals.put((iteration + 1, intended))
+
+        for _ in threads:
+            self.arrivals.put(None)
+        for user in threads:
+            user.join()
+        self.summarise()
+        return self.save_results()
+
+    def summarise(self):
+        """Print target and achieved rate, and corrected iteration times,
+        for each step of the profile
+        """
+        iterations = [result for result in self.results if result["action"] == "iteration"]
+        steps = sorted(set(start for start, _ in self.profile if start < self.duration))
+        for position, start in enumerate(steps):
+            end = steps[position + 1] if position + 1 < len(steps) else self.duration
+            if end <= start:
+                continue
+            in_step = [result for result in iterations if start <= result["intended"] < end]
+            corrected = [result["corrected"] for result in in_step]
+            delays = [result["queue_delay"] for result in in_step]
+            print "{:>6.0f}s target {:.1f}/min achieved {:.1f}/min - corrected median {} p90 {} - queue p90 {}".format(
+                start, rate_at(self.profile, start), len(in_step) * 60.0 / (end - start),
+                percentile(corrected, 0.5), percentile(corrected, 0.9), percentile(delays, 0.9))
+
+    def save_results(self):
+        """Write results to CSV file in results folder
+        Returns:
+            path of CSV file
+        """
+        fields = ["user", "iteration", "intended", "actual", "queue_delay",
+                  "action", "parameter", "duration", "corrected"]
+        csv_path = os.path.join(self.reader.results_folder,
+                                "Arrival_" + self.run_start + ".csv")
+        with open(csv_path, "wb") as csv_file:
+            writer = csv.DictWriter(csv_file, fields)
+            writer.writeheader()
+            for result in sorted(self.results, key=lambda result: result["intended"]):
+                writer.writerow(result)
+        return csv_path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run Eric scenario at a target arrival rate")
+    parser.add_argument("--excel", default="eric_data.xlsx", help="spreadsheet with scenario")
+    parser.add_argument("--scenario", default="Scenario", help="tab with scenario")
+    parser.add_argument("--rate", type=float, default=6, help="iterations per minute")
+    parser.add_argument("--step", nargs=3, type=float, metavar=("INCREMENT", "INTERVAL", "STEPS"),
+                        help="raise rate by INCREMENT every INTERVAL seconds, STEPS times")
+    parser.add_argument("--profile", help="CSV file of seconds, rate pairs")
+    parser.add_argument("--duration", type=float, default=600, help="seconds to start iterations for")
+    parser.add_argument("--users", type=int, default=10, help="number of sessions")
+    parser.add_argument("--think", type=float, default=0, help="think time after each step (s)")
+    parser.add_argument("--think-random", action="store_true", help="random think times")
+    parser.add_argument("--poisson", action="store_true", help="random arrivals")
+    args = parser.parse_args()
+
+    if args.profile:
+        profile = read_profile(args.profile)
+    elif args.step:
+        increment, interval, steps = args.step
+        profile = step_profile(args.rate, increment, interval, int(steps))
+        args.duration = interval * int(steps)
+    else:
+        profile = constant_profile(args.rate)
+
+    go = ArrivalRun(filename=args.excel, profile=profile, duration=args.duration,
+                    users=args.users, scenario=args.scenario, think_time=args.think,
+                    think_random=args.think_random, poisson=args.poisson)
+    print "Results:", go.run()
+    print "Finished"
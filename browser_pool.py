@@ -0,0 +1,180 @@
+"""
+Pool of warm Firefox (Webdriver) instances.
+
+Starting Firefox and geckodriver is slow, so the pool starts a number of
+browsers up-front (headless by default, so no display is needed) and
+hands them out to Eric sessions. When a browser is returned its cookies,
+storage and extra windows are cleared so the next session starts clean.
+Browsers are replaced after a set number of uses or if their memory use
+grows too large.
+"""
+
+import threading
+import Queue
+
+from selenium import webdriver
+from selenium.webdriver.firefox.webdriver import FirefoxProfile
+from selenium.common.exceptions import WebDriverException
+
+import procinfo
+
+
+# Firefox preferences that stop anything being cached
+NO_CACHE_PREFERENCES = {"browser.cache.disk.enable": False,
+                        "browser.cache.memory.enable": False,
+                        "browser.cache.offline.enable": False,
+                        "network.http.use-cache": False}
+
+
+def new_firefox(headless=False, profile_path="", cache=True):
+    """Start Firefox via Webdriver
+    Args:
+        headless - when True Firefox runs without a visible window
+        profile_path - (optional) path to Firefox profile to use
+            (e.g. one with Modify Headers settings)
+        cache - when False the browser cache is disabled
+    Returns:
+        Webdriver instance
+    """
+    options = webdriver.FirefoxOptions()
+    if headless:
+        options.add_argument("-headless")
+    profile = FirefoxProfile(profile_path) if profile_path else None
+    if not cache:
+        profile = profile or FirefoxProfile()
+        for name, value in NO_CACHE_PREFERENCES.items():
+            profile.set_preference(name, value)
+    return webdriver.Firefox(firefox_profile=profile, options=options)
+
+
+def browser_pid(driver):
+    """Firefox process id of Webdriver instance (None if not known)"""
+    return driver.capabilities.get("moz:processID")
+
+
+def driver_pid(driver):
+    """geckodriver process id of Webdriver instance (None if not known)"""
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+
+class BrowserPool(object):
+    """Keeps Firefox instances running for reuse by Eric sessions"""
+    def __init__(self, size=2, headless=True, max_uses=20, max_rss_mb=1500,
+                 profile_path=""):
+        """
+        Args:
+            size - number of browsers kept warm
+            headless - when True browsers run without visible windows
+            max_uses - browser is replaced after this many sessions
+            max_rss_mb - browser is replaced when memory use of its
+                process tree exceeds this (Linux only)
+            profile_path - (optional) Firefox profile used by all browsers
+        """
+        self.size = size
+        self.headless = headless
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.profile_path = profile_path
+        # Browsers ready for use
+        self.idle = Queue.Queue()
+        # Number of times each browser has been handed out (by id)
+        self.uses = {}
+        self.lock = threading.Lock()
+        # Counts of pool activity
+        self.stats = {"started": 0, "acquired": 0, "recycled": 0, "reset_failed": 0}
+        for _ in range(size):
+            self.idle.put(self.start_browser())
+
+    def start_browser(self):
+        """Start a new browser for the pool"""
+        driver = new_firefox(self.headless, self.profile_path)
+        with self.lock:
+            self.uses[id(driver)] = 0
+            self.stats["started"] += 1
+        return driver
+
+    def acquire(self, timeout=None):
+        """Take a browser from the pool, waiting if none are free
+        Args:
+            timeout - maximum seconds to wait (None waits indefinitely)
+        Returns:
+            Webdriver instance
+        Raises:
+            Queue.Empty if no browser free within timeout
+        """
+        driver = self.idle.get(timeout=timeout)
+        with self.lock:
+            self.uses[id(driver)] += 1
+            self.stats["acquired"] += 1
+        return driver
+
+    def release(self, driver):
+        """Return browser to the pool. Browser is reset, or replaced by a
+        new one if worn out or reset fails.
+        """
+        if not self.worn_out(driver) and self.reset(driver):
+            self.idle.put(driver)
+            return
+        with self.lock:
+            self.uses.pop(id(driver), None)
+            self.stats["recycled"] += 1
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+        self.idle.put(self.start_browser())
+
+    def worn_out(self, driver):
+        """True if browser has reached use or memory limit"""
+        if self.uses.get(id(driver), 0) >= self.max_uses:
+            return True
+        pid = browser_pid(driver)
+        if pid and self.max_rss_mb:
+            rss = procinfo.tree_rss_mb(pid)
+            if rss is not None and rss > self.max_rss_mb:
+                return True
+        return False
+
+    def reset(self, driver):
+        """Clear cookies and storage, close all but one window and show
+        a blank page.
+        Cookies can only be removed for sites that are open in a window,
+        so each window is cleared before it is closed.
+        Returns:
+            True if successful, False if browser appears broken
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles:
+                driver.switch_to_window(handle)
+                driver.delete_all_cookies()
+                try:
+                    driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+                except WebDriverException:
+                    # No storage for this page (e.g. about:blank)
+                    pass
+            for handle in handles[1:]:
+                driver.switch_to_window(handle)
+                driver.close()
+            driver.switch_to_window(handles[0])
+            driver.get("about:blank")
+        except WebDriverException:
+            with self.lock:
+                self.stats["reset_failed"] += 1
+            return False
+        return True
+
+    def close(self):
+        """Shut down all idle browsers"""
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except Queue.Empty:
+                break
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
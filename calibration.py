@@ -0,0 +1,177 @@
+"""
+Harness overhead calibration.
+
+Part of every measured Eric time is Webdriver command latency on the
+load-generator machine rather than Eric itself. This module:
+
+    CommandCounter - counts the Webdriver commands issued (by command name)
+    Calibrator     - times each primitive command against a trivial local
+                     page, giving the cost distribution per command
+
+An action's overhead is estimated as the sum over the commands it issued
+of count x median cost, so raw and overhead-corrected times can both be
+reported.
+"""
+
+import time
+
+from timing import clock
+
+# Trivial local page used for calibration - same kinds of element as Eric.
+# Written into a blank window (Firefox won't open data: urls from script)
+CALIBRATION_PAGE = ("<html><body>"
+                    "<div id='blockingDiv' style='display:none'>Please Wait</div>"
+                    "<input id='field'>"
+                    "<a id='link' href='#' onclick='return false;'>link</a>"
+                    "</body></html>")
+
+
+def percentile(values, fraction):
+    """Value at fraction (0 to 1) of sorted values (nearest rank)"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = int(round(fraction * (len(ordered) - 1)))
+    return ordered[position]
+
+
+class CommandCounter(object):
+    """Counts Webdriver commands by wrapping driver.execute
+    (elements send their commands through the same method)
+    """
+    def __init__(self, driver):
+        self.counts = {}
+        original = driver.execute
+
+        def execute(command, params=None):
+            self.counts[command] = self.counts.get(command, 0) + 1
+            return original(command, params)
+        driver.execute = execute
+
+    @classmethod
+    def install(cls, driver):
+        """CommandCounter for driver, reusing one already installed
+        (e.g. on a pooled browser)
+        """
+        counter = getattr(driver, "command_counter", None)
+        if counter is None:
+            counter = cls(driver)
+            driver.command_counter = counter
+        return counter
+
+    def reset(self):
+        self.counts = {}
+
+    def snapshot(self):
+        """Copy of current counts"""
+        return dict(self.counts)
+
+
+class Calibrator(object):
+    """Measures the cost of Webdriver primitives against a trivial page"""
+    def __init__(self, driver, counter, samples=20):
+        """
+        Args:
+            driver - Webdriver instance
+            counter - CommandCounter installed on driver
+            samples - number of times each primitive is timed
+        """
+        self.driver = driver
+        self.counter = counter
+        self.samples = samples
+        # Command name: list of measured durations (latest calibration)
+        self.measurements = {}
+        # (time.time(), summary) of each calibration
+        self.history = []
+        self.calibrated_at = None
+
+    def primitives(self):
+        """(description, function) pairs for the primitives Eric actions use"""
+        driver = self.driver
+        link = driver.find_element_by_id("link")
+        field = driver.find_element_by_id("field")
+        handle = driver.current_window_handle
+        return [("find element", lambda: driver.find_element_by_id("link")),
+                ("find elements", lambda: driver.find_elements_by_tag_name("a")),
+                ("click", link.click),
+                ("is displayed", lambda: driver.find_element_by_id("blockingDiv").is_displayed()),
+                ("send keys", lambda: field.send_keys("x")),
+                ("clear", field.clear),
+                ("get text", lambda: link.text),
+                ("script", lambda: driver.execute_script("return 1;")),
+                ("window handles", lambda: driver.window_handles),
+                ("switch window", lambda: driver.switch_to_window(handle))]
+
+    def calibrate(self):
+        """Time each primitive in a separate window, then return to the
+        original window.
+        Returns:
+            summary (see summary())
+        """
+        driver = self.driver
+        original = driver.current_window_handle
+        # Other windows (e.g. Portal and Eric) may be open - the test window
+        # is the one that wasn't there before
+        known = set(driver.window_handles)
+        driver.execute_script("window.open('about:blank');")
+        new_handle = (set(driver.window_handles) - known).pop()
+        driver.switch_to_window(new_handle)
+        measurements = {}
+        try:
+            driver.execute_script("document.open(); document.write(arguments[0]); document.close();",
+                                  CALIBRATION_PAGE)
+            for _, primitive in self.primitives():
+                for _ in range(self.samples):
+                    self.counter.reset()
+                    start = clock()
+                    primitive()
+                    duration = clock() - start
+                    counts = self.counter.snapshot()
+                    # Share duration between the commands issued
+                    issued = sum(counts.values())
+                    for command, count in counts.items():
+                        measurements.setdefault(command, []).append(duration / issued)
+        finally:
+            driver.close()
+            driver.switch_to_window(original)
+            self.counter.reset()
+        self.measurements = measurements
+        self.calibrated_at = clock()
+        summary = self.summary()
+        self.history.append((time.time(), summary))
+        return summary
+
+    def age(self):
+        """Seconds since last calibration (None if never calibrated)"""
+        if self.calibrated_at is None:
+            return None
+        return clock() - self.calibrated_at
+
+    def cost(self, command):
+        """Median cost of command in seconds. Commands not measured are
+        given the median cost over all measured commands.
+        """
+        if command in self.measurements:
+            return percentile(self.measurements[command], 0.5)
+        medians = [percentile(values, 0.5) for values in self.measurements.values()]
+        return percentile(medians, 0.5) or 0.0
+
+    def summary(self):
+        """Cost distribution of each command
+        Returns:
+            dictionary of command: {"median", "p90", "max", "samples"}
+        """
+        return dict((command, {"median": percentile(values, 0.5),
+                               "p90": percentile(values, 0.9),
+                               "max": max(values),
+                               "samples": len(values)})
+                    for command, values in self.measurements.items())
+
+    def overhead(self, counts):
+        """Estimated harness overhead of issuing commands
+        Args:
+            counts - dictionary of command name: count
+        Returns:
+            seconds
+        """
+        return sum(self.cost(command) * count for command, count in counts.items())
@@ -8,15 +8,28 @@ Mainly intended to be a module used by other scripts.
 However, can be run directly
 """
 
-import time
 import getpass
+import functools
+import uuid
 
-from selenium import webdriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 
-# Needed to set particular Firefox profile in Selenium (e.g. for Modify Headers)
-from selenium.webdriver.firefox.webdriver import FirefoxProfile
+# Starts Firefox, optionally headless or with particular profile (e.g. for Modify Headers)
+from browser_pool import new_firefox
+
+# Monotonic high-resolution clock and per-phase action timing
+from timing import clock, ActionTiming
+# Browser-side Navigation/Resource Timing capture
+import page_timing
+# In-browser wait conditions
+import waits
+from waits import Wait
+# Cached single-query locators for controls lacking identifiers
+from locators import LocatorCache
+# Webdriver command counting and overhead calibration
+from calibration import CommandCounter, Calibrator
+
+from resource_sampler import ResourceSampler
 
 def fn_timer(fn, *args, **kwargs):
     """Measures execution time of function
@@ -27,9 +40,9 @@ def fn_timer(fn, *args, **kwargs):
     Returns:
         duration in seconds
     """
-    t_start = time.time()
+    t_start = clock()
     fn(*args, **kwargs)
-    t_end = time.time()
+    t_end = clock()
     return t_end - t_start
 
 
@@ -46,13 +59,64 @@ def fn_timer_decorator(fn):
         decorated function
     """
     def temp(*args, **kwargs):
-        t_start = time.time()
+        t_start = clock()
         fn(*args, **kwargs)
-        t_end = time.time()
+        t_end = clock()
         return t_end - t_start
     return temp
 
 
+def action_timer(fn, *args, **kwargs):
+    """
+    Alternative to fn_timer for timed Eric actions (see timed_action)
+    Returns the action's own recorded duration, which excludes work done
+    once the action is complete (page timing capture, timing listeners
+    writing results etc.)
+    Args:
+        fn - timed method of an Eric instance
+        args - arbitary args, passed to fn
+        kwargs - arbitary kwargs, passed to fn
+    Returns:
+        duration in seconds
+    """
+    fn(*args, **kwargs)
+    return fn.__self__.last_timing.duration
+
+
+def timed_action(action):
+    """
+    Decorator for Eric methods that records an ActionTiming for each call.
+    While the method runs the timing is available as self.timing so that
+    phases can be marked. When complete it becomes self.last_timing and is
+    passed to each function in self.timing_listeners.
+    See Eric.start_timing and Eric.finish_timing for what is recorded.
+    Args:
+        action - name of action recorded in the timing
+    Returns:
+        decorator
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def temp(self, *args, **kwargs):
+            parameter = args[0] if args else None
+            # Recorded parameter is kept to a single (spreadsheet cell) value
+            if isinstance(parameter, (list, tuple)):
+                parameter = ", ".join(unicode(item) for item in parameter)
+            self.start_timing(action, parameter)
+            try:
+                result = fn(self, *args, **kwargs)
+            except Exception as e:
+                self.timing.stop("error: " + type(e).__name__)
+                raise
+            else:
+                self.timing.stop()
+            finally:
+                self.finish_timing()
+            return result
+        return temp
+    return decorate
+
+
 def table_extract(table):
     """Extract content from an html table.
     Args:
@@ -71,13 +135,219 @@ def table_extract(table):
     return table_content
 
 
+# Executed in the browser by table_extract_bulk. Same output as
+# table_extract, but for every table in one call.
+TABLE_EXTRACT_SCRIPT = """
+var root = arguments[0] || document;
+function cellText(cell) {
+    var text = cell.innerText;
+    if (text === undefined) {
+        text = cell.textContent;
+    }
+    return text.replace(/[ \\t\\u00a0]+/g, " ").replace(/ *\\n */g, "\\n").trim();
+}
+var tables = root.getElementsByTagName("table");
+var content = [];
+for (var ti = 0; ti < tables.length; ti++) {
+    var tableContent = [];
+    var rows = tables[ti].getElementsByTagName("tr");
+    for (var ri = 0; ri < rows.length; ri++) {
+        var tags = ["th", "td"];
+        for (var gi = 0; gi < tags.length; gi++) {
+            var cells = rows[ri].getElementsByTagName(tags[gi]);
+            var rowText = [];
+            for (var ci = 0; ci < cells.length; ci++) {
+                rowText.push(cellText(cells[ci]));
+            }
+            if (rowText.length) {
+                tableContent.push(rowText);
+            }
+        }
+    }
+    content.push(tableContent);
+}
+return content;
+"""
+
+
+def table_extract_bulk(driver, element=None):
+    """Extract content from every html table in one Webdriver call.
+    Much faster than calling table_extract for each table as no
+    per-row/per-cell round-trips are needed.
+    Args:
+        driver - Webdriver instance (focused on the frame holding the tables)
+        element - (optional) Webdriver element to search within.
+            Defaults to whole document.
+    Returns:
+        list of tables, each a list of lists (rows, columns) containing
+        <th> and <td> text, as from table_extract
+    """
+    return driver.execute_script(TABLE_EXTRACT_SCRIPT, element)
+
+
 class Eric(object):
     """Uses Webdriver to interact with Eric"""
     def __init__(self):
         # Text of link used to open application from Portal
         self.application_link = "Management Information (MI)"
+        # Identifies this session in traces/results
+        self.session_id = uuid.uuid4().hex[:8]
+        # Webdriver instance (None when no browser held)
+        self.driver = None
         # When True, Browser window is placed at x-coordinate -3000 to hide it.
         self.offscreen = False
+        # When True, Firefox runs headless (no display needed)
+        self.headless = False
+        # Optional browser_pool.BrowserPool supplying warm browsers
+        self.pool = None
+        # Maximum seconds to wait for a browser from the pool
+        self.pool_timeout = 600
+        # Optional session_cache.SessionCache - when set, Portal login
+        # cookies are saved and reused to skip the login form
+        self.session_cache = None
+        # ActionTiming of action in progress (None when no timed action running)
+        self.timing = None
+        # ActionTiming of most recently completed timed action
+        self.last_timing = None
+        # Functions called with each completed ActionTiming
+        self.timing_listeners = []
+        # When True, browser performance entries are captured after each timed action
+        self.capture_page_timing = False
+        # Seconds between polls when waiting for page conditions
+        self.wait_poll = 0.1
+        # Finds and keeps controls lacking convenient identifiers
+        # (stats attribute has hit/miss counts)
+        self.locators = LocatorCache()
+        # When True, Webdriver command costs are calibrated when the browser
+        # starts (and every calibration_interval seconds) so that timings
+        # include an estimate of harness overhead
+        self.calibrate = False
+        self.calibration_interval = 600
+        self.command_counter = None
+        self.calibrator = None
+        # Report windows opened by view_reports and main window they were
+        # opened from (closed/returned to by close_reports)
+        self.report_windows = []
+        self.main_window = None
+        # When True, resources of the browser/driver processes are sampled
+        # every sample_interval seconds while the browser is in use, and
+        # a summary added to each timing (Linux only)
+        self.sample_resources = False
+        self.sample_interval = 1.0
+        self.sampler = None
+        # Cache measurement mode (None if not set):
+        #   cold   - each browser is new, with its cache disabled (no pool)
+        #   warm   - views follow an untimed view of the same report
+        #   repeat - same report viewed several times in a row
+        # Cold mode is recorded with every timing; warm and repeat only with
+        # the views they measure (timed while measuring is True)
+        self.cache_mode = None
+        self.measuring = False
+        # Iteration index recorded with each timing (e.g. which repeat)
+        self.iteration = 1
+        # When True, timed actions are not passed to timing_listeners
+        # (used for untimed cache warming)
+        self.warming = False
+
+    def uses_pool(self):
+        """True if browsers come from the pool (never in cold mode)"""
+        return bool(self.pool) and self.cache_mode != "cold"
+
+    def start_driver(self, profile_path=""):
+        """Get Webdriver instance - from the pool if one is set,
+        otherwise by starting Firefox (with cache disabled in cold mode).
+        Args:
+            profile_path - (optional) Firefox profile path. Not used with
+                pool (pool has its own profile setting)
+        """
+        if self.uses_pool():
+            self.driver = self.pool.acquire(self.pool_timeout)
+        else:
+            self.driver = new_firefox(self.headless, profile_path,
+                                      cache=self.cache_mode != "cold")
+            #Move window off edge of screen (effecivtely hides it) if flag set
+            if self.offscreen:
+                self.driver.set_window_position(3000, 0) # driver.set_window_position(0, 0) to get it bac
+        self.locators.attach(self.driver)
+        if self.calibrate:
+            self.command_counter = CommandCounter.install(self.driver)
+            self.calibrator = Calibrator(self.driver, self.command_counter)
+            self.calibrator.calibrate()
+        if self.sample_resources:
+            self.stop_sampler()
+            self.sampler = ResourceSampler(self.driver, self.sample_interval)
+            self.sampler.start()
+        return self.driver
+
+    def stop_sampler(self):
+        """Stop resource sampling (if running)"""
+        if self.sampler:
+            self.sampler.stop()
+            self.sampler = None
+
+    def start_timing(self, action, parameter=None):
+        """Begin timing of action as self.timing.
+        Recalibrates first (untimed) if calibration is due.
+        """
+        if self.calibrator and self.calibrator.age() > self.calibration_interval:
+            self.calibrator.calibrate()
+        if self.command_counter:
+            self.command_counter.reset()
+        self.timing = ActionTiming(action, parameter)
+        if self.cache_mode == "cold" or self.measuring:
+            self.timing.mode = self.cache_mode
+        self.timing.iteration = self.iteration
+
+    def finish_timing(self):
+        """
+        Complete timing of action (already stopped). It becomes
+        self.last_timing, with Webdriver commands issued and estimated
+        overhead (if calibrating), browser performance entries (if
+        self.capture_page_timing is set, read outside the timed period) and
+        load generator resource use (if sampling), and is passed to each
+        function in self.timing_listeners.
+        """
+        self.last_timing, self.timing = self.timing, None
+        if self.command_counter:
+            self.last_timing.commands = self.command_counter.snapshot()
+            self.last_timing.overhead = self.calibrator.overhead(self.last_timing.commands)
+        if self.sampler and self.last_timing.end is not None:
+            self.last_timing.resources = self.sampler.summary(self.last_timing.start,
+                                                              self.last_timing.end)
+        # Cache warming actions aren't reported
+        if self.warming:
+            return
+        if self.capture_page_timing:
+            self.last_timing.page_timing = self.collect_page_timing()
+        for listener in self.timing_listeners:
+            listener(self.last_timing)
+
+    def switch_window(self, handle):
+        """Switch focus to browser window, discarding located elements
+        of the previous window
+        """
+        self.driver.switch_to_window(handle)
+        self.locators.clear()
+
+    def mark(self, phase):
+        """Record phase in timing of current action (if any)"""
+        if self.timing:
+            self.timing.mark(phase)
+
+    def collect_page_timing(self):
+        """Read Navigation/Resource Timing entries from current window
+        and its reportContent iframe (if any).
+        Returns:
+            dictionary of captured entries plus "summary" of headline
+            figures (see page_timing.summarise), or None if unavailable
+        """
+        try:
+            captured = page_timing.collect(self.driver)
+        except WebDriverException:
+            return None
+        if captured:
+            captured["summary"] = page_timing.summarise(captured)
+        return captured
 
     def check_page_blocked(self):
         """
@@ -87,6 +357,42 @@ class Eric(object):
         blocker = self.driver.find_element_by_id("blockingDiv")
         return blocker.is_displayed()
 
+    def wait(self, condition, timeout=20, name=""):
+        """
+        Wait for condition, evaluated in the browser where possible.
+        Details of the wait are added to timing of current action (if any).
+        Args:
+            condition - waits.Condition or callable taking the driver
+            timeout - maximum wait in seconds
+            name - description of the wait
+        Returns:
+            condition's final return value
+        """
+        waiter = Wait(self.driver, timeout, self.wait_poll)
+        result = waiter.until(condition, name)
+        if self.timing:
+            self.timing.waits.append(waiter.last_result)
+        return result
+
+    def wait_unblocked(self, timeout=20):
+        """
+        Wait for "Please Wait" message to go.
+        Marks "please wait shown" phase (if message seen) and
+        "please wait cleared" phase in timing of current action.
+        Args:
+            timeout - maximum wait in seconds
+        """
+        seen = []
+        def unblocked(driver):
+            # True/False visibility, None if blockingDiv not present yet
+            blocked = driver.execute_script(waits.VISIBILITY_SCRIPT, "blockingDiv")
+            if blocked and not seen:
+                seen.append(True)
+                self.mark("please wait shown")
+            return blocked is False
+        self.wait(unblocked, timeout, "please wait cleared")
+        self.mark("please wait cleared")
+
     def login(self, username, password, url):
         """
         Login to Portal.
@@ -102,19 +408,17 @@ class Eric(object):
         # Default fail return result
         result = 1
         # Create Webdriver instance
-        self.driver = webdriver.Firefox()
-        driver = self.driver
-        #Move window off edge of screen (effecivtely hides it) if flag set
-        if self.offscreen:
-            driver.set_window_position(3000, 0) # driver.set_window_position(0, 0) to get it bac
+        driver = self.start_driver()
+
+        # Try saved session first, if cache in use
+        if self.session_cache and self.restore_session(username, url):
+            return 0
 
         # Open URL
         self.driver.get(url)
         # Wait for page
-        WebDriverWait(driver, 10).until(lambda driver:
-                                        driver.title == "LAA Online Portal"
-                                        or "By logging in to this Portal"
-                                        in driver.page_source)
+        self.wait(waits.title_is("LAA Online Portal")
+                  | waits.text_present("By logging in to this Portal"), 10)
 
         # Login to Portal - New or Old
         # New Portal
@@ -131,23 +435,68 @@ class Eric(object):
 
         # Wait for response
         try:
-            WebDriverWait(self.driver, 20).until(lambda driver:
-                                                 ">Logged in as:" in driver.page_source
-                                                 or "An incorrect Username or Password was specified" in driver.page_source
-                                                 or "Authentication failed. Please try again" in driver.page_source
-                                                 or "t be displayed" in driver.page_source # Avoiding weird apostrophe! from "can't"
-                                                 or "Secure Connection Failed" in driver.page_source)
+            self.wait(waits.text_present(">Logged in as:",
+                                         "An incorrect Username or Password was specified",
+                                         "Authentication failed. Please try again",
+                                         "t be displayed", # Avoiding weird apostrophe! from "can't"
+                                         "Secure Connection Failed"))
         except TimeoutException:
             pass
 
         # Check if login was successful
-        if ">Logged in as:" in driver.page_source:
+        if self.portal_ready():
+            result = 0
+            # Keep session for reuse
+            if self.session_cache:
+                self.session_cache.save(url, username, driver.get_cookies())
+
+        return result
+
+    def portal_ready(self):
+        """True if logged-in to Portal and MI link present"""
+        driver = self.driver
+        if waits.text_present(">Logged in as:")(driver):
             # Do we have MI link?
             links = [e.text for e in driver.find_elements_by_tag_name("a")]
             if self.application_link in links:
-                result = 0
+                return True
+        return False
 
-        return result
+    def restore_session(self, username, url):
+        """
+        Put saved Portal session cookies into the browser and check that
+        the Portal accepts them. Rejected sessions are removed from the
+        cache and the browser's cookies cleared, ready for normal login.
+        Args:
+            username
+            url: portal url
+        Returns:
+            True if now logged-in to Portal with MI link present
+        """
+        cookies = self.session_cache.load(url, username)
+        if not cookies:
+            return False
+        driver = self.driver
+        # Cookies can only be added for the site currently open
+        driver.get(url)
+        for cookie in cookies:
+            try:
+                driver.add_cookie(cookie)
+            except WebDriverException:
+                # Belongs to a different domain
+                pass
+        driver.get(url)
+        try:
+            self.wait(waits.text_present(">Logged in as:", "By logging in to this Portal")
+                      | waits.title_is("LAA Online Portal"), 10)
+        except TimeoutException:
+            pass
+        if self.portal_ready():
+            return True
+        # Session rejected
+        self.session_cache.discard(url, username)
+        driver.delete_all_cookies()
+        return False
 
     def login_direct(self,
                      url="http://ds01za003:7813/lscapps/eric-emi-murali/AutoLoginServlet",
@@ -161,52 +510,55 @@ class Eric(object):
             profile_path - path to Firefox profile with apporpriate Modify
                 Headers details.
         """
-        ffp_object = FirefoxProfile(profile_path)
         # Use Webdriver to open Firefox using chosen profile
-        self.driver = webdriver.Firefox(ffp_object)
+        self.start_driver(profile_path)
         # Open the URL
         self.driver.get(url)
         # Check expected page is present
-        WebDriverWait(self.driver, 20).until(lambda driver:
-                                        "reports found for" in driver.page_source
-                                        or "0 report(s) found for user" in driver.page_source)
+        self.wait(waits.text_present("reports found for", "0 report(s) found for user"))
         # Wait for "please wait" message to go
-        WebDriverWait(self.driver, 20).until(lambda driver: not self.check_page_blocked())
+        self.wait_unblocked()
 
+    @timed_action("open_eric")
     def open_eric(self):
         """ Click Eric link in portal and wait for Eric app to open"""
         driver = self.driver
         # Click the Hyperlink
-        driver.find_element_by_link_text(self.application_link).click()
+        link = driver.find_element_by_link_text(self.application_link)
+        self.mark("located")
+        link.click()
+        self.mark("click sent")
         # Wait for the Eric Window to open, then switch to it.
-        WebDriverWait(driver, 20).until(lambda x: len(x.window_handles) == 2, self.driver)
+        self.wait(waits.window_count(2), name="Eric window open")
         newwindow = driver.window_handles[-1]
-        driver.switch_to_window(newwindow)
+        self.switch_window(newwindow)
+        self.mark("window switched")
         # Check expected page is present
-        WebDriverWait(driver, 20).until(lambda driver:
-                                        "reports found for" in driver.page_source
-                                        or "0 report(s) found for user" in driver.page_source)
+        self.wait(waits.text_present("reports found for", "0 report(s) found for user"))
+        self.mark("page present")
         # Wait for "please wait" message to go
-        WebDriverWait(driver, 20).until(lambda driver: not self.check_page_blocked())
+        self.wait_unblocked()
 
+    @timed_action("search")
     def search(self, search_string):
         """Perform search
         Args:
             search_string - text typed into search field
         """
-        driver = self.driver
         # Search field and search button lack convenient identifiers
-        # Finding by looking for not-hidden input fields in containing div
-        div = driver.find_element_by_class_name("tableBoxInd")
-        fields = [e for e in div.find_elements_by_tag_name("input")
-                  if e.get_attribute("type") != "hidden"]
+        # Found (and kept) by locator cache - not-hidden input fields in containing div
+        def enter_text(fields):
+            self.mark("located")
+            fields[0].clear()
+            fields[0].send_keys(search_string)
         # Enter the search text
-        fields[0].clear()
-        fields[0].send_keys(search_string)
+        self.locators.call("search_controls", enter_text)
+        self.mark("text entered")
         # Click search button
-        fields[1].click()
+        self.locators.call("search_controls", lambda fields: fields[1].click())
+        self.mark("click sent")
         # Wait for "please wait" to go
-        WebDriverWait(driver, 20).until(lambda driver: not self.check_page_blocked())
+        self.wait_unblocked()
 
     def report_list_items(self):
         """Finds which reports are listed
@@ -242,6 +594,7 @@ class Eric(object):
 
         return message, report_names
 
+    @timed_action("select_report")
     def select_report(self, report=0):
         """
         Select Report on Eric Main Screen by position (from 0)
@@ -255,7 +608,13 @@ class Eric(object):
         #           "Criminal financial statement",
         #           "Family mediation financial statement",
         #           "Financial statement summary"]
+        self.click_report(report)
 
+    def click_report(self, report=0):
+        """Click report link and wait for page to update (see select_report)
+        Returns:
+            name of report selected
+        """
         # Find the report name present on screen
 
         driver = self.driver
@@ -267,9 +626,13 @@ class Eric(object):
         else:
             report_text = report
 
-        driver.find_element_by_link_text(report_text).click()
+        link = driver.find_element_by_link_text(report_text)
+        self.mark("located")
+        link.click()
+        self.mark("click sent")
         # Wait for "please wait" to go
-        WebDriverWait(driver, 20).until(lambda driver: not self.check_page_blocked())
+        self.wait_unblocked()
+        return report_text
 
     def read_report_choice(self):
         """Returns the name of the report currently selected"""
@@ -283,6 +646,7 @@ class Eric(object):
             report_name = h3_texts[-1]
         return report_name
 
+    @timed_action("view_report")
     def view_report(self):
         """
         Click the "View Report" button
@@ -292,26 +656,90 @@ class Eric(object):
         driver = self.driver
         # Click "View Report" button
         # lacks a convenient identifier
-        # Accessing via its parent form
-        form = driver.find_element_by_id("ReportDetailsForm")
-        # Contains multiple "input" fields, filter to get right one
-        input_elements = [e for e in form.find_elements_by_tag_name("input")
-                          if e.get_attribute("value") == "View Report"]
-        button = input_elements[0]
-        button.click()
+        # Found by locator cache - input of parent form with "View Report" value
+        def click_view(buttons):
+            self.mark("located")
+            buttons[0].click()
+        self.locators.call("view_button", click_view)
+        self.mark("click sent")
         # Report is in a new window - switch to it
-        driver.switch_to_window(driver.window_handles[-1])
+        self.switch_window(driver.window_handles[-1])
+        self.mark("window switched")
         # Wait for "Please Wait to go"
-        WebDriverWait(driver, 20).until(lambda driver: not self.check_page_blocked())
+        self.wait_unblocked()
 
-    def get_report_details(self, get_source=True, get_cells=False):
+    @timed_action("view_reports")
+    def view_reports(self, reports=(0, 1, 2, 3), timeout=60):
+        """
+        Open several reports at once, each in its own window, then wait for
+        all of their "Please Wait" messages to go together - so Eric
+        generates them concurrently rather than one after another.
+        Phases "<report> opened" and "<report> ready" are marked for each.
+        The timing parameter is the report positions as text (e.g. "0, 2").
+        Report windows are left open (see close_reports).
+        Args:
+            reports - report positions (from 0) to open
+            timeout - maximum wait in seconds for all reports
+        Returns:
+            list of (report name, seconds from its View Report click until ready)
+        """
+        driver = self.driver
+        main_window = self.main_window = driver.current_window_handle
+        # (report name, window handle, clock() when opened)
+        opened = []
+        self.report_windows = []
+        for report in reports:
+            name = self.click_report(report)
+            known = set(driver.window_handles)
+            self.locators.call("view_button", lambda buttons: buttons[0].click())
+            self.wait(waits.window_count(len(known) + 1), name=name + " window open")
+            handle = (set(driver.window_handles) - known).pop()
+            opened.append((name, handle, clock()))
+            # Recorded as opened, so close_reports closes it even if a wait fails
+            self.report_windows.append(handle)
+            self.mark(name + " opened")
+            # Back to main window to select the next report
+            self.switch_window(main_window)
+
+        # Check each report window in turn until all are ready
+        ready = {}
+        def all_ready(driver):
+            for name, handle, started in opened:
+                if handle in ready:
+                    continue
+                driver.switch_to_window(handle)
+                if driver.execute_script(waits.VISIBILITY_SCRIPT, "blockingDiv") is False:
+                    ready[handle] = clock() - started
+                    self.mark(name + " ready")
+            return len(ready) == len(opened)
+        self.wait(all_ready, timeout, "all reports ready")
+        self.switch_window(main_window)
+        return [(name, ready[handle]) for name, handle, _ in opened]
+
+    def close_reports(self):
+        """Close report windows left open by view_reports and return focus
+        to main Eric window
+        """
+        for handle in self.report_windows:
+            self.switch_window(handle)
+            self.locators.call("report_buttons", lambda buttons: buttons[-1].click())
+        self.report_windows = []
+        if self.main_window:
+            self.switch_window(self.main_window)
+            self.main_window = None
+
+    def get_report_details(self, get_source=True, get_cells=False, bulk=True):
         """Extract details from already open report.
         Args:
             get_source (bool) - When True, get page source and return
             as "source" element of content dictionary
             get_cells (bool) - When True, get contents of each HTML table cell in
                 3-level list - table, row, column. Returned as cells element
-                of content dictionary. n.b. can be slow (>25 seconds)
+                of content dictionary.
+            bulk (bool) - When True, all tables are extracted in a single
+                Webdriver call (table_extract_bulk). When False, each
+                table/row/cell is read individually (table_extract) -
+                n.b. can be slow (>25 seconds)
         Returns:
                 Report details indictionary
         """
@@ -326,14 +754,23 @@ class Eric(object):
         report_frame = driver.find_element_by_id("reportContent")
         driver.switch_to_frame(report_frame)
 
-        if "Empty Report" in driver.page_source:
-            content["cells"]=([["Empty Report"]])
-
         # Just get the whole source
         if get_source:
-            content["source"] = driver.page_source.encode('utf-8')
+            source = driver.page_source
+            empty = "Empty Report" in source
+            # Kept as unicode - encoded when written
+            content["source"] = source
+        else:
+            empty = waits.text_present("Empty Report")(driver)
+
+        if empty:
+            content["cells"]=([["Empty Report"]])
+
+        # All tables in one call
+        if get_cells and bulk:
+            content["cells"].extend(table_extract_bulk(driver))
         # Extract each table individually
-        if get_cells:
+        elif get_cells:
             # Results are in four tables within (Summary, Detail, Additional, Payments)
             tables = driver.find_elements_by_tag_name("table")
             #Extract details from each table individually
@@ -356,13 +793,11 @@ class Eric(object):
         Return focus back to main Eric window.
         """
         driver = self.driver
-        # Buttons lack convenient labels. Finding by tag name
-        button_div = driver.find_element_by_id("buttons2")
-        buttons = button_div.find_elements_by_tag_name("a")
+        # Buttons lack convenient labels. Found by locator cache (links in buttons2)
         # Click the "Close Report" button (assuming its the last one)
-        buttons[-1].click()
+        self.locators.call("report_buttons", lambda buttons: buttons[-1].click())
         # Return Window focus
-        driver.switch_to_window(driver.window_handles[-1])
+        self.switch_window(driver.window_handles[-1])
 
     def log_out(self):
         """Log out from Eric and the Portal (if present)
@@ -376,20 +811,29 @@ class Eric(object):
         # Follow-up Portal logout
         if window_count ==2:
             # Wait for the Eric window to close
-            WebDriverWait(driver, 20).until(lambda x: len(x.window_handles) == 1, self.driver)
+            self.wait(waits.window_count(1), name="Eric window closed")
             # Ensure focus is on the portal window
-            driver.switch_to_window(driver.window_handles[0])
+            self.switch_window(driver.window_handles[0])
             # Click the portqal log out link
             driver.find_element_by_link_text("Log Out").click()
             # Wait for confirmation message
-            WebDriverWait(driver, 20).until(lambda driver: '<h1 class="heading-xlarge">Logged Out</h1>' in driver.page_source)
+            self.wait(waits.text_present('<h1 class="heading-xlarge">Logged Out</h1>'))
         # Non portal
         else:
-            WebDriverWait(driver, 20).until(lambda driver: "You have successfully logged out of EMI application" in driver.page_source)
+            self.wait(waits.text_present("You have successfully logged out of EMI application"))
 
     def close(self):
-        """Shutdown webdriver"""
-        self.driver.close()
+        """Shutdown webdriver, or return it to the pool if from one
+        (nothing is done if no browser is held)
+        """
+        self.stop_sampler()
+        if self.driver is None:
+            return
+        driver, self.driver = self.driver, None
+        if self.uses_pool():
+            self.pool.release(driver)
+        else:
+            driver.close()
 
 # Management Information
 if __name__ == "__main__":
@@ -404,12 +848,12 @@ if __name__ == "__main__":
     print "\nPortal login result:", login_result
 
     # Open CCR from Portal Link
-    launch_time = fn_timer(test.open_eric)
+    launch_time = action_timer(test.open_eric)
     print url
     print "CCR launch time:", launch_time
 
     # Perform Search in CCR
-    search_time = fn_timer(test.search, "0G934M")
+    search_time = action_timer(test.search, "0G934M")
     print "Search time:", search_time
 
     # Show which reports were found (not timed)
@@ -420,10 +864,11 @@ if __name__ == "__main__":
     for report_no in [0, 1, 2, 3]:
         print "\nTimings for report:", report_no
         # Select the report
-        print "Select:", fn_timer(test.select_report, report_no)
+        print "Select:", action_timer(test.select_report, report_no)
         print "Found:", test.read_report_choice()
         # View the selected report
-        print "View:", fn_timer(test.view_report)
+        print "View:", action_timer(test.view_report)
+        print "Phases:", test.last_timing.phase_durations()
         # Examine report details - not complete
         ##test.examine_report_details()
         # Close the report (not timed)
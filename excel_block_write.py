@@ -1,25 +1,50 @@
+import datetime
 import os
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+
+# Cell values written as they are (anything else is converted to str)
+TYPED_VALUES = (int, long, float, bool, basestring, datetime.datetime,
+                datetime.date, datetime.time, type(None))
+
+# Number formats for date/time values (the block styles are General, which
+# would show them as serial numbers). datetime before date - it's a subclass
+DATE_FORMATS = ((datetime.datetime, "DD/MM/YYYY HH:MM:SS"),
+                (datetime.date, "DD/MM/YYYY"),
+                (datetime.time, "HH:MM:SS"))
 
 
 class WriteExcel(object):
     """Writes tabular data from list of lists (row by column) to Excel Spreadsheet"""
-    def __init__(self, filename):
+    def __init__(self, filename, streaming=True):
         """Args:
             filename - filename of Excel file. If file exists it will be
                 opened, otherwise new file will be created.
+            streaming - when True (and the file is new), rows are streamed
+                to the file with openpyxl's write-only mode. Each tab must
+                then be written top to bottom, and save() used once.
         """
-        #Define cell styles
-        self.styles={}
-        self.styles["head"] = self.make_style(bold_text=True, bg_colour="FF9EB9E5")
-        self.styles["body"] = self.make_style()
         # Spreadhsheet filename
         self.filename = filename
         # Open workbook - either existing or new
         if os.path.exists(filename):
             self.wb = openpyxl.load_workbook(filename=filename)
+            self.streaming = False
         else:
-            self.wb = openpyxl.Workbook()
+            self.wb = openpyxl.Workbook(write_only=streaming)
+            self.streaming = streaming
+        # Row below the last one written by write_block in each tab
+        self.next_row = {}
+        #Define cell styles, registered once with the workbook
+        self.styles={}
+        self.styles["head"] = self.make_style(bold_text=True, bg_colour="FF9EB9E5", name="block_head")
+        self.styles["body"] = self.make_style(name="block_body")
+        for style in self.styles.values():
+            try:
+                self.wb.add_named_style(style)
+            except ValueError:
+                # Already registered (existing file written before)
+                pass
 
     def write_block(self, rows, top_row=1, left_col=1, tab_name="Statements", highlight_rows=()):
         """Write block of data to location in spreadsheet.
@@ -35,31 +60,84 @@ class WriteExcel(object):
                              bolder hightlighing, to make top row distinctive
                              use [0]
         """
-        # If tab name supplied, use this tab (create if necessary)
-        if tab_name:
-            if tab_name not in self.wb.sheetnames:
-                self.wb.create_sheet(tab_name)
-            ws = self.wb[tab_name]
-            ws.sheet_view.showGridLines = False
-        # Default to the active sheet
-        else:
-            ws = self.wb.active
+        ws = self.sheet(tab_name)
+        if self.streaming:
+            self.stream_block(ws, rows, top_row, left_col, highlight_rows)
+            return
+        self.next_row[ws.title] = max(self.next_row.get(ws.title, 1), top_row + len(rows))
 
         # Write the data
         for ri, row in enumerate(rows):
-            # Cell Style
-            style = self.styles["body"]
+            # Cell Style (by registered name)
+            style = self.styles["body"].name
             # Set different style for row if it's to be highlighted
             if ri in highlight_rows:
-                style = self.styles["head"]
+                style = self.styles["head"].name
             # Write row to spreadsheet
             for ci, col in enumerate(row):
                 cell = ws.cell(row=top_row+ri, column=left_col+ci)
-                cell.value = str(col)
+                cell.value = self.cell_value(col)
                 cell.style = style
+                self.set_date_format(cell)
+
+    def stream_block(self, ws, rows, top_row, left_col, highlight_rows):
+        """Append block of data to write-only worksheet (see write_block)"""
+        next_row = self.next_row.get(ws.title, 1)
+        if top_row < next_row:
+            raise ValueError("Row {} of '{}' already written (streaming)".format(top_row, ws.title))
+        # Blank rows down to top_row
+        for _ in range(top_row - next_row):
+            ws.append([])
+        for ri, row in enumerate(rows):
+            style = self.styles["body"].name
+            if ri in highlight_rows:
+                style = self.styles["head"].name
+            cells = [None] * (left_col - 1)
+            for col in row:
+                cell = WriteOnlyCell(ws, value=self.cell_value(col))
+                cell.style = style
+                self.set_date_format(cell)
+                cells.append(cell)
+            ws.append(cells)
+        self.next_row[ws.title] = top_row + len(rows)
+
+    def sheet(self, tab_name):
+        """Worksheet to write to (created if necessary), active sheet if
+        tab_name not given
+        """
+        # If tab name supplied, use this tab (create if necessary)
+        if tab_name:
+            if tab_name not in self.wb.sheetnames:
+                ws = self.wb.create_sheet(tab_name)
+                ws.sheet_view.showGridLines = False
+            return self.wb[tab_name]
+        # Default to the active sheet
+        if self.streaming:
+            # (write-only workbooks have no active sheet)
+            return self.sheet("Sheet")
+        return self.wb.active
+
+    def cell_value(self, value):
+        """Value as written to cell - numbers, text, dates and blanks keep
+        their type, anything else is converted to str
+        """
+        if isinstance(value, TYPED_VALUES):
+            return value
+        return str(value)
+
+    def set_date_format(self, cell):
+        """Give cell holding a date/time value a date/time number format"""
+        for kind, number_format in DATE_FORMATS:
+            if isinstance(cell.value, kind):
+                cell.number_format = number_format
+                return
+
+    def next_free_row(self, tab_name):
+        """Row below the last one written to tab by write_block (1 if none)"""
+        return self.next_row.get(tab_name, 1)
 
     def save(self):
-        """Save spreadsheet"""
+        """Save spreadsheet (only once when streaming)"""
         self.wb.save(self.filename)
 
     def make_style(self,
@@ -67,9 +145,10 @@ class WriteExcel(object):
                    text_colour="FF000000",
                    bold_text=False,
                    bg_colour=None,
-                   border=True):
+                   border=True,
+                   name="Normal"):
         """Make and return an openpyxl style"""
-        style = openpyxl.styles.named_styles.NamedStyle()
+        style = openpyxl.styles.named_styles.NamedStyle(name=name)
         # Font
         style.font = openpyxl.styles.Font(bold=bold_text, size=text_size, color=text_colour)
         # Background fill
@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+
+"""
+Browserless probe of Eric response times.
+
+Replays the HTTP requests behind Eric.open_eric (direct AutoLoginServlet
+login), search, select_report and view_report without Firefox, using
+keep-alive connections reused between requests. Several probe sessions can
+run at once in worker threads, each sampling at a fixed interval, so
+latency can be sampled every few seconds from one small host.
+
+Results use the same layout as the Selenium timings (timing.ActionTiming),
+with page_timing summary holding TTFB and payload size.
+
+Only the direct login (as used by Eric.login_direct with Modify Headers) is
+replayed - the headers that Modify Headers would add are passed in.
+"""
+
+import argparse
+import csv
+import httplib
+import json
+import os
+import socket
+import threading
+import time
+import urlparse
+import urllib
+from HTMLParser import HTMLParser
+
+from timing import ActionTiming, clock
+
+# Elements that have no closing tag
+VOID_TAGS = ("area", "base", "br", "col", "embed", "hr", "img", "input",
+             "link", "meta", "param", "source", "wbr")
+
+
+class PageParser(HTMLParser):
+    """Finds forms, links and iframes in an Eric page, noting the
+    ids/classes of elements that contain them (Eric controls lack
+    convenient identifiers of their own).
+    """
+    def __init__(self):
+        HTMLParser.__init__(self)
+        # Open elements as (tag, id, classes)
+        self.stack = []
+        # Forms as dictionaries with action, method, id, inputs, containers
+        self.forms = []
+        # Links as dictionaries with href, text, containers
+        self.links = []
+        self.iframes = []
+        self.form = None
+        self.link = None
+
+    def containers(self):
+        """ids and classes of currently open elements"""
+        names = set()
+        for _, element_id, classes in self.stack:
+            if element_id:
+                names.add(element_id)
+            names.update(classes)
+        return names
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self.form = {"action": attrs.get("action", ""),
+                         "method": attrs.get("method", "get").lower(),
+                         "id": attrs.get("id"),
+                         "inputs": [],
+                         "containers": self.containers()}
+            self.forms.append(self.form)
+        elif tag in ("input", "button", "select", "textarea") and self.form is not None:
+            self.form["inputs"].append({"name": attrs.get("name"),
+                                        "type": attrs.get("type", "text").lower(),
+                                        "value": attrs.get("value", ""),
+                                        "containers": self.containers()})
+        elif tag == "a":
+            self.link = {"href": attrs.get("href", ""), "text": "",
+                         "containers": self.containers()}
+            self.links.append(self.link)
+        elif tag == "iframe":
+            self.iframes.append({"id": attrs.get("id"), "src": attrs.get("src", "")})
+        if tag not in VOID_TAGS:
+            self.stack.append((tag, attrs.get("id"), (attrs.get("class") or "").split()))
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self.form = None
+        elif tag == "a":
+            self.link = None
+        # Close back to the matching element (copes with unclosed tags)
+        for position in range(len(self.stack) - 1, -1, -1):
+            if self.stack[position][0] == tag:
+                del self.stack[position:]
+                break
+
+    def handle_data(self, data):
+        if self.link is not None:
+            self.link["text"] += data
+
+
+def parse_page(body):
+    """Parse page HTML
+    Returns:
+        PageParser holding forms, links and iframes
+    """
+    parser = PageParser()
+    parser.feed(body.decode("utf-8", "replace"))
+    return parser
+
+
+class ProbeError(Exception):
+    """Raised when a page lacks the controls needed to continue"""
+    pass
+
+
+class HttpProbe(object):
+    """One browserless Eric session"""
+    def __init__(self, url, headers=None, timeout=30):
+        """
+        Args:
+            url - Eric "auto login" url
+            headers - (optional) dictionary of extra request headers,
+                e.g. those normally added by Modify Headers
+            timeout - socket timeout in seconds
+        """
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        # Keep-alive connections by (scheme, host:port)
+        self.connections = {}
+        self.cookies = {}
+        # Current page url and parsed content
+        self.page_url = None
+        self.page = None
+        # ActionTiming of most recent action
+        self.last_timing = None
+
+    def connection(self, scheme, netloc, fresh=False):
+        """Reusable connection for scheme/host"""
+        key = (scheme, netloc)
+        if fresh or key not in self.connections:
+            if key in self.connections:
+                self.connections[key].close()
+            if scheme == "https":
+                conn = httplib.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                conn = httplib.HTTPConnection(netloc, timeout=self.timeout)
+            self.connections[key] = conn
+        return self.connections[key]
+
+    def request(self, method, url, data=None, timing=None, redirects=5):
+        """Make request over pooled connection, following redirects
+        Args:
+            method - "GET" or "POST"
+            url - absolute url
+            data - (optional) dictionary of form values for POST
+            timing - (optional) ActionTiming to mark phases in
+        Returns:
+            (status, final url, body) tuple
+        """
+        parts = urlparse.urlsplit(url)
+        path = urlparse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        headers = dict(self.headers)
+        if self.cookies:
+            headers["Cookie"] = "; ".join("{}={}".format(name, value)
+                                          for name, value in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urllib.urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        # Retry once on a fresh connection if the kept-alive one was dropped
+        for attempt in (0, 1):
+            conn = self.connection(parts.scheme, parts.netloc, fresh=attempt == 1)
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    # Headers and body are sent separately - don't let Nagle delay them
+                    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                break
+            except (httplib.HTTPException, socket.error):
+                if attempt:
+                    raise
+        if timing:
+            timing.mark("response started")
+        content = response.read()
+        if timing:
+            timing.mark("body received")
+
+        for header in response.msg.getheaders("set-cookie"):
+            name, _, value = header.split(";")[0].partition("=")
+            self.cookies[name.strip()] = value.strip()
+
+        if response.status in (301, 302, 303, 307) and redirects:
+            location = urlparse.urljoin(url, response.getheader("location"))
+            if response.status != 307:
+                method, data = "GET", None
+            return self.request(method, location, data, timing, redirects - 1)
+        return response.status, url, content
+
+    def timed(self, action, parameter, method, url, data=None):
+        """Make request as a timed action and make result current page
+        Returns:
+            ActionTiming for the request
+        """
+        timing = ActionTiming(action, parameter)
+        try:
+            status, final_url, content = self.request(method, url, data, timing)
+        except Exception as e:
+            timing.stop("error: " + type(e).__name__)
+            self.last_timing = timing
+            raise
+        first_byte = dict(timing.phases).get("response started", 0)
+        timing.stop("ok" if status < 400 else "http {}".format(status))
+        timing.page_timing = {"summary": {"ttfb": first_byte * 1000,
+                                          "resource_count": 1,
+                                          "resource_bytes": len(content)},
+                              "status": status}
+        self.page_url = final_url
+        self.page = parse_page(content)
+        self.page.body = content
+        self.last_timing = timing
+        return timing
+
+    def form_request(self, form, chosen=None, values=None):
+        """Build request that submits form
+        Args:
+            form - form dictionary from PageParser
+            chosen - submit input to send (name/value included)
+            values - dictionary of values overriding form defaults
+        Returns:
+            (method, url, data) tuple
+        """
+        data = {}
+        for field in form["inputs"]:
+            if not field["name"] or field["type"] in ("submit", "button", "image", "reset"):
+                continue
+            if field["type"] in ("checkbox", "radio"):
+                continue
+            data[field["name"]] = field["value"]
+        if chosen and chosen["name"]:
+            data[chosen["name"]] = chosen["value"]
+        data.update(values or {})
+        # urlencode needs byte strings
+        data = dict((name.encode("utf-8"), unicode(value).encode("utf-8"))
+                    for name, value in data.items())
+        url = urlparse.urljoin(self.page_url, form["action"] or self.page_url)
+        if form["method"] == "post":
+            return "POST", url, data
+        separator = "&" if "?" in url else "?"
+        return "GET", url + separator + urllib.urlencode(data), None
+
+    def open_eric(self):
+        """Direct login to Eric (AutoLoginServlet)"""
+        timing = self.timed("open_eric", None, "GET", self.url)
+        if "reports found for" not in self.page.body and "0 report(s) found for user" not in self.page.body:
+            timing.outcome = "unexpected page"
+        return timing
+
+    def search(self, search_string):
+        """Submit the search form (in tableBoxInd div)"""
+        for form in self.page.forms:
+            fields = [field for field in form["inputs"]
+                      if "tableBoxInd" in field["containers"] | form["containers"]
+                      and field["type"] != "hidden"]
+            if len(fields) >= 2:
+                method, url, data = self.form_request(form, chosen=fields[1],
+                                                      values={fields[0]["name"]: search_string})
+                return self.timed("search", search_string, method, url, data)
+        raise ProbeError("Search form not found")
+
+    def report_links(self):
+        """Report links from search results (tableBoxIndHalf2 div)"""
+        return [link for link in self.page.links
+                if "tableBoxIndHalf2" in link["containers"]]
+
+    def select_report(self, report=0):
+        """Follow report link, by position (from 0) or name"""
+        links = self.report_links()
+        if type(report) is int:
+            link = links[report]
+        else:
+            matches = [link for link in links if link["text"].strip() == report]
+            if not matches:
+                raise ProbeError("Report not found: " + report)
+            link = matches[0]
+        if link["href"].lower().startswith("javascript:"):
+            raise ProbeError("Report link uses JavaScript - can't replay")
+        url = urlparse.urljoin(self.page_url, link["href"])
+        return self.timed("select_report", report, "GET", url)
+
+    def view_report(self):
+        """Submit ReportDetailsForm with its View Report button, then fetch
+        the reportContent iframe (the report itself) if the page has one.
+        Both requests count towards the timing. As in the browser (where
+        the report opens in its own window) the main page stays current.
+        """
+        forms = [form for form in self.page.forms if form["id"] == "ReportDetailsForm"]
+        if not forms:
+            raise ProbeError("ReportDetailsForm not found")
+        buttons = [field for field in forms[0]["inputs"] if field["value"] == "View Report"]
+        method, url, data = self.form_request(forms[0], chosen=buttons[0] if buttons else None)
+        main_page, main_url = self.page, self.page_url
+        timing = self.timed("view_report", None, method, url, data)
+        try:
+            frames = [frame for frame in self.page.iframes if frame["id"] == "reportContent"]
+            if frames and frames[0]["src"]:
+                frame_url = urlparse.urljoin(self.page_url, frames[0]["src"])
+                _, _, content = self.request("GET", frame_url)
+                timing.end = clock()
+                timing.mark("report frame received")
+                summary = timing.page_timing["summary"]
+                summary["resource_count"] += 1
+                summary["resource_bytes"] += len(content)
+        finally:
+            self.page, self.page_url = main_page, main_url
+        return timing
+
+    def close(self):
+        """Close pooled connections"""
+        for conn in self.connections.values():
+            conn.close()
+        self.connections = {}
+
+
+class ProbeRun(object):
+    """Samples Eric with several concurrent browserless sessions"""
+    def __init__(self, url, accounts, reports=(0,), headers=None,
+                 workers=1, interval=5, count=1):
+        """
+        Args:
+            url - Eric "auto login" url
+            accounts - account numbers to search, used in turn
+            reports - report positions (from 0) or names to select and view
+            headers - (optional) extra request headers
+            workers - number of concurrent probe sessions
+            interval - seconds between the start of each sample
+            count - number of samples per worker
+        """
+        self.url = url
+        self.accounts = accounts
+        self.reports = reports
+        self.headers = headers
+        self.workers = workers
+        self.interval = interval
+        self.count = count
+        self.results = []
+        self.lock = threading.Lock()
+        self.run_start = time.strftime("%Y.%m.%d_%H.%M.%S")
+
+    def record(self, worker, sample, timing):
+        result = timing.as_dict()
+        result["user"] = worker
+        result["iteration"] = sample
+        with self.lock:
+            self.results.append(result)
+
+    def sample(self, worker, sample, probe):
+        """One pass: login, search, then select/view each report"""
+        steps = [(probe.open_eric, ()),
+                 (probe.search, (self.accounts[(sample - 1) % len(self.accounts)],))]
+        for report in self.reports:
+            steps.append((probe.select_report, (report,)))
+            steps.append((probe.view_report, ()))
+        for step, args in steps:
+            try:
+                self.record(worker, sample, step(*args))
+            except Exception as e:
+                if probe.last_timing and probe.last_timing.outcome.startswith("error"):
+                    self.record(worker, sample, probe.last_timing)
+                else:
+                    timing = ActionTiming(step.__name__, args[0] if args else None)
+                    timing.stop("error: {}: {}".format(type(e).__name__, e))
+                    self.record(worker, sample, timing)
+                break
+
+    def worker(self, worker):
+        probe = HttpProbe(self.url, self.headers)
+        start = time.time()
+        try:
+            for sample in range(1, self.count + 1):
+                # Fixed cadence - next sample starts interval after the last began
+                delay = start + (sample - 1) * self.interval - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                probe.cookies = {}
+                probe.last_timing = None
+                self.sample(worker, sample, probe)
+        finally:
+            probe.close()
+
+    def run(self):
+        threads = [threading.Thread(target=self.worker, args=(worker + 1,))
+                   for worker in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.results
+
+    def save_results(self, folder):
+        """Write results to CSV file
+        Returns:
+            path of CSV file
+        """
+        fields = ["user", "iteration", "timestamp", "action", "parameter",
+                  "duration", "outcome", "ttfb", "resource_bytes", "phases"]
+        csv_path = os.path.join(folder, "Probe_" + self.run_start + ".csv")
+        with open(csv_path, "wb") as csv_file:
+            writer = csv.DictWriter(csv_file, fields, extrasaction="ignore")
+            writer.writeheader()
+            for result in self.results:
+                row = dict(result)
+                summary = (result["page_timing"] or {}).get("summary", {})
+                row["ttfb"] = summary.get("ttfb")
+                row["resource_bytes"] = summary.get("resource_bytes")
+                row["phases"] = json.dumps(result["phases"])
+                writer.writerow(row)
+        return csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Browserless Eric response time probe")
+    parser.add_argument("url", help='Eric "auto login" url')
+    parser.add_argument("accounts", nargs="+", help="account numbers to search")
+    parser.add_argument("--header", action="append", default=[],
+                        help="extra request header as Name:Value (repeatable)")
+    parser.add_argument("--reports", default="0", help="comma-separated report positions (from 0)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=5)
+    parser.add_argument("--count", type=int, default=1)
+    args = parser.parse_args()
+
+    headers = dict(header.split(":", 1) for header in args.header)
+    headers = dict((name.strip(), value.strip()) for name, value in headers.items())
+    reports = [int(report) for report in args.reports.split(",") if report]
+
+    go = ProbeRun(args.url, args.accounts, reports, headers,
+                  args.workers, args.interval, args.count)
+    go.run()
+    folder = os.path.join(os.getcwd(), "extracted_details")
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    print "Results:", go.save_results(folder)
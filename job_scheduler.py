@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+
+"""
+Job scheduler with cron-like schedules read from a config file.
+
+Unlike scheduler.py (one event at a time, schedule edited in the source),
+jobs here run on a bounded pool of workers, so a slow run doesn't delay
+the others, and every run - or skipped/missed run - is recorded in a
+ledger with its start, end, duration, exit code and resource use.
+
+Config file (see schedule.ini):
+
+    [scheduler]
+    workers = 2                          ; runs at once
+    ledger = scheduler_ledger.csv
+    log = scheduler_log.txt
+
+    [job:eric]
+    command = python spreadsheet_run.py
+    cwd = .
+    schedule = */5 8-17 * * 1-5          ; minute hour day month weekday
+    overlap = skip                       ; skip, queue or kill
+    jitter = 30                          ; random start delay up to (s)
+    timeout = 900                        ; kill after (s), 0 for none
+    service = eric_data.xlsx             ; (optional) use runner_service.py
+
+Overlap policy decides what happens when a job is due while its previous
+run is still going: skip the new run, queue it to start when the previous
+one ends (at most one waiting), or kill the previous run.
+"""
+
+import argparse
+import ConfigParser
+import csv
+import datetime
+import errno
+import os
+import Queue
+import random
+import shlex
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+import runner_service
+
+# Earliest/latest values of each cron field, and names allowed
+# (weekday 7 is also Sunday)
+CRON_FIELDS = [("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31),
+               ("month", 1, 12), ("weekday", 0, 7)]
+CRON_NAMES = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+              "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+              "sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
+
+LEDGER_FIELDS = ["job", "scheduled", "start", "end", "duration", "delay", "status",
+                 "exit_code", "max_rss_mb", "user_cpu", "system_cpu", "via", "cpu"]
+
+# Errors meaning runner service isn't running (so command can be used instead)
+NOT_RUNNING = (errno.ECONNREFUSED, getattr(errno, "WSAECONNREFUSED", errno.ECONNREFUSED))
+
+# Seconds late after which a due run counts as missed (e.g. machine asleep)
+MISSED_AFTER = 120
+
+
+def parse_cron_field(text, low, high):
+    """Set of values matched by one cron field (e.g. "*/5", "1-5", "0,30")"""
+    values = set()
+    for part in text.lower().split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = [int(CRON_NAMES.get(value, value)) for value in part.split("-")]
+        else:
+            start = int(CRON_NAMES.get(part, part))
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError("Cron value '{}' outside {}-{}".format(text, low, high))
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule(object):
+    """Five-field cron expression: minute hour day month weekday
+    (weekday 0 is Sunday, 7 also accepted)
+    """
+    def __init__(self, expression):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("Cron expression needs 5 fields: " + expression)
+        (self.minutes, self.hours, self.days,
+         self.months, self.weekdays) = [parse_cron_field(text, low, high)
+                                        for text, (_, low, high) in zip(fields, CRON_FIELDS)]
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - set([7])) | set([0])
+        # Cron rule - if day and weekday are both restricted, either matches
+        self.day_or_weekday = fields[2] != "*" and fields[4] != "*"
+
+    def day_matches(self, when):
+        day = when.day in self.days
+        weekday = (when.isoweekday() % 7) in self.weekdays
+        if self.day_or_weekday:
+            return day or weekday
+        return day and weekday
+
+    def matches(self, when):
+        return (when.minute in self.minutes and when.hour in self.hours
+                and when.month in self.months and self.day_matches(when))
+
+    def next_after(self, when):
+        """First matching minute after datetime when (None if none in
+        the next 4 years)
+        """
+        when = when.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = when + datetime.timedelta(days=366 * 4)
+        while when < limit:
+            if when.month not in self.months or not self.day_matches(when):
+                # Skip to start of next day
+                when = (when + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+            elif when.hour not in self.hours:
+                when = (when + datetime.timedelta(hours=1)).replace(minute=0)
+            elif when.minute not in self.minutes:
+                when += datetime.timedelta(minutes=1)
+            else:
+                return when
+        return None
+
+
+class Job(object):
+    """One scheduled job and its run state"""
+    def __init__(self, name, command, schedule, cwd=None, overlap="skip", jitter=0,
+                 timeout=0, service=None):
+        """
+        Args:
+            name - job name (recorded in ledger)
+            command - command line to run
+            schedule - CronSchedule
+            cwd - (optional) working directory
+            overlap - "skip", "queue" or "kill"
+            jitter - most seconds of random delay added to each start
+            timeout - seconds after which run is killed (0 for never)
+            service - (optional) spreadsheet to run with runner service
+                instead of command (command used if service not running)
+        """
+        if overlap not in ("skip", "queue", "kill"):
+            raise ValueError("Overlap policy must be skip, queue or kill: " + overlap)
+        self.name = name
+        self.command = command
+        self.schedule = schedule
+        self.cwd = cwd
+        self.overlap = overlap
+        self.jitter = jitter
+        self.timeout = timeout
+        self.service = service
+        # Next scheduled datetime
+        self.next_run = None
+        # Run in progress (subprocess.Popen or True when via service)
+        self.process = None
+        # Runs waiting for a worker or for the previous run (queue policy)
+        self.waiting = 0
+        self.killed = False
+        self.lock = threading.Lock()
+
+
+def read_config(filename):
+    """Settings and jobs from config file
+    Returns:
+        (settings dictionary, list of Job)
+    """
+    config = ConfigParser.RawConfigParser({"cwd": "", "overlap": "skip", "jitter": "0",
+                                            "timeout": "0", "service": ""})
+    if not config.read(filename):
+        raise IOError("Can't read config file " + filename)
+    settings = {"workers": 2, "ledger": "scheduler_ledger.csv", "log": "scheduler_log.txt"}
+    if config.has_section("scheduler"):
+        for option in ("workers", "ledger", "log"):
+            if config.has_option("scheduler", option):
+                settings[option] = config.get("scheduler", option)
+        settings["workers"] = int(settings["workers"])
+    jobs = []
+    for section in config.sections():
+        if not section.startswith("job:"):
+            continue
+        jobs.append(Job(section[4:].strip(),
+                        config.get(section, "command"),
+                        CronSchedule(config.get(section, "schedule")),
+                        cwd=config.get(section, "cwd") or None,
+                        overlap=config.get(section, "overlap").strip().lower(),
+                        jitter=config.getfloat(section, "jitter"),
+                        timeout=config.getfloat(section, "timeout"),
+                        service=config.get(section, "service") or None))
+    return settings, jobs
+
+
+class JobScheduler(object):
+    """Starts jobs when due on a pool of worker threads"""
+    def __init__(self, jobs, workers=2, ledger="scheduler_ledger.csv", log="scheduler_log.txt"):
+        """
+        Args:
+            jobs - list of Job
+            workers - most runs at once
+            ledger - CSV file each run is recorded in
+            log - text log file ("" for none)
+        """
+        self.jobs = jobs
+        self.workers = workers
+        self.ledger = ledger
+        self.log_filename = log
+        # (job, scheduled datetime) waiting for a worker
+        self.queue = Queue.Queue()
+        self.lock = threading.Lock()
+        self.stopping = False
+
+    def log(self, text):
+        """Print text and add it to log file"""
+        line = time.strftime("%d-%m-%Y %H:%M:%S") + " - " + text
+        print line
+        if self.log_filename:
+            with self.lock:
+                with open(self.log_filename, "a") as log_file:
+                    log_file.write(line + "\n")
+
+    def record(self, job, scheduled, status, start=None, end=None, exit_code=None,
+               rusage=None, via="", cpu=None):
+        """Add run to ledger. CPU seconds (user plus system) come from
+        rusage, or cpu for runner service runs.
+        """
+        def stamp(value):
+            if value is None:
+                return ""
+            if isinstance(value, datetime.datetime):
+                return value.strftime("%d/%m/%Y %H:%M:%S")
+            return time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(value))
+        scheduled_time = time.mktime(scheduled.timetuple())
+        row = {"job": job.name,
+               "scheduled": stamp(scheduled),
+               "start": stamp(start),
+               "end": stamp(end),
+               "duration": "" if end is None else round(end - start, 3),
+               "delay": "" if start is None else round(start - scheduled_time, 3),
+               "status": status,
+               "exit_code": "" if exit_code is None else exit_code,
+               "max_rss_mb": "", "user_cpu": "", "system_cpu": "",
+               "via": via,
+               "cpu": "" if cpu is None else round(cpu, 3)}
+        if rusage is not None:
+            # ru_maxrss is in kilobytes (Linux)
+            row["max_rss_mb"] = round(rusage.ru_maxrss / 1024.0, 1)
+            row["user_cpu"] = round(rusage.ru_utime, 3)
+            row["system_cpu"] = round(rusage.ru_stime, 3)
+            row["cpu"] = round(rusage.ru_utime + rusage.ru_stime, 3)
+        with self.lock:
+            new = not os.path.exists(self.ledger)
+            with open(self.ledger, "ab") as ledger_file:
+                writer = csv.DictWriter(ledger_file, LEDGER_FIELDS)
+                if new:
+                    writer.writeheader()
+                writer.writerow(row)
+        if status not in ("ok",):
+            self.log("{} {} (scheduled {})".format(job.name, status, stamp(scheduled)))
+
+    def due(self, job, scheduled):
+        """Job's scheduled time has arrived - apply overlap policy"""
+        with job.lock:
+            busy = job.process is not None or job.waiting
+            if busy and job.overlap == "skip":
+                status = "skipped"
+            elif busy and job.overlap == "queue" and job.waiting:
+                # Already one waiting - don't build up a backlog
+                status = "skipped"
+            else:
+                status = None
+                if job.process is not None and job.overlap == "kill":
+                    self.kill(job)
+                job.waiting += 1
+        if status:
+            self.record(job, scheduled, status)
+            return
+        delay = random.uniform(0, job.jitter) if job.jitter else 0
+        if delay:
+            timer = threading.Timer(delay, self.queue.put, ((job, scheduled),))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.queue.put((job, scheduled))
+
+    def kill(self, job):
+        """Stop job's current run (job.lock held)"""
+        if job.process is not None and job.process is not True:
+            job.killed = True
+            try:
+                job.process.send_signal(signal.SIGTERM)
+            except OSError:
+                pass
+
+    def worker(self):
+        """Worker thread - start queued runs"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            job, scheduled = item
+            # Queue policy - wait for previous run of this job to end
+            while True:
+                with job.lock:
+                    if job.process is None:
+                        job.process = True
+                        job.waiting -= 1
+                        break
+                time.sleep(1)
+            try:
+                self.run_job(job, scheduled)
+            except Exception as e:
+                self.record(job, scheduled, "error: " + type(e).__name__)
+                self.log("{} failed to start: {}".format(job.name, e))
+            finally:
+                with job.lock:
+                    job.process = None
+                    job.killed = False
+
+    def run_job(self, job, scheduled):
+        """Perform one run of job and record it in ledger"""
+        start = time.time()
+        if job.service:
+            try:
+                response = runner_service.request_run(os.path.join(job.cwd or "", job.service),
+                                                      timeout=job.timeout or runner_service.DEFAULT_TIMEOUT)
+            except socket.timeout:
+                # Service is still running it - starting the command too
+                # would have two runs writing the same workbook
+                self.log("{} timed out waiting for runner service".format(job.name))
+                self.record(job, scheduled, "timed out", start, time.time(), via="service")
+                return
+            except socket.error as e:
+                if e.errno not in NOT_RUNNING:
+                    self.record(job, scheduled, "error: " + str(e), start, time.time(),
+                                via="service")
+                    return
+                # Service not running - use command instead
+            else:
+                end = time.time()
+                status = "ok" if response.get("exit_code") == 0 else "failed"
+                self.record(job, scheduled, status, start, end, response.get("exit_code"),
+                            via="service", cpu=response.get("cpu"))
+                return
+
+        process = subprocess.Popen(shlex.split(job.command), cwd=job.cwd)
+        with job.lock:
+            job.process = process
+        timer = None
+        if job.timeout:
+            timer = threading.Timer(job.timeout, self.timed_out, (job, process))
+            timer.daemon = True
+            timer.start()
+        if hasattr(os, "wait4"):
+            # wait4 gives the run's resource use (including its own children)
+            _, status_code, rusage = os.wait4(process.pid, 0)
+            if os.WIFSIGNALED(status_code):
+                exit_code = -os.WTERMSIG(status_code)
+            else:
+                exit_code = os.WEXITSTATUS(status_code)
+            process.returncode = exit_code
+        else:
+            # No wait4 (Windows) - resource use isn't recorded
+            exit_code = process.wait()
+            rusage = None
+        end = time.time()
+        if timer:
+            timer.cancel()
+        if job.killed:
+            status = "killed"
+        elif exit_code == 0:
+            status = "ok"
+        else:
+            status = "failed"
+        self.record(job, scheduled, status, start, end, exit_code, rusage, via="process")
+
+    def timed_out(self, job, process):
+        """Kill run that has gone on too long"""
+        with job.lock:
+            if job.process is process:
+                self.log("{} timed out - killing".format(job.name))
+                self.kill(job)
+
+    def run(self, until=None):
+        """Start workers and schedule jobs until stopped (or datetime until)"""
+        threads = []
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.worker)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        now = datetime.datetime.now()
+        for job in self.jobs:
+            job.next_run = job.schedule.next_after(now)
+            self.log("{} scheduled '{}', first run {}".format(job.name, job.schedule.expression,
+                                                           job.next_run))
+        try:
+            while not self.stopping:
+                now = datetime.datetime.now()
+                if until and now >= until:
+                    break
+                for job in self.jobs:
+                    while job.next_run and job.next_run <= now:
+                        late = (now - job.next_run).total_seconds()
+                        if late > MISSED_AFTER:
+                            self.record(job, job.next_run, "missed")
+                        else:
+                            self.due(job, job.next_run)
+                        job.next_run = job.schedule.next_after(job.next_run)
+                upcoming = [job.next_run for job in self.jobs if job.next_run]
+                if not upcoming:
+                    break
+                wait = (min(upcoming) - datetime.datetime.now()).total_seconds()
+                time.sleep(min(max(wait, 0.1), 30))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for _ in threads:
+                self.queue.put(None)
+            for thread in threads:
+                thread.join()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run jobs on cron-like schedules")
+    parser.add_argument("config", nargs="?", default="schedule.ini", help="config file")
+    args = parser.parse_args()
+
+    settings, jobs = read_config(args.config)
+    scheduler = JobScheduler(jobs, workers=settings["workers"], ledger=settings["ledger"],
+                             log=settings["log"])
+    scheduler.log("*** Job scheduler started - {} job(s), {} worker(s) ***".format(
+        len(jobs), settings["workers"]))
+    scheduler.run()
+    scheduler.log("Job scheduler finished")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+"""
+Concurrent load mode for Eric.
+
+Runs several independent virtual users at the same time, each with its own
+Eric (Webdriver) session, working through a scenario read from the
+spreadsheet. Users are started gradually over a ramp-up period and repeat
+their scenario until the hold period ends. Timings from every user are
+merged into one result set, tagged with user id, and saved to CSV.
+
+Relies on spreadsheet_run.py to read scenarios and perform the steps.
+"""
+
+import getpass
+import threading
+import time
+import csv
+import sys
+import os
+
+import openpyxl
+
+from spreadsheet_run import ExcelRun
+from browser_pool import BrowserPool
+from scenario_plan import compile_plan
+
+
+class VirtualUser(threading.Thread):
+    """One simulated Eric user running a scenario in its own thread"""
+    def __init__(self, user_id, filename, plan, stop_time, results, lock, pool=None,
+                 session_cache=None, tracer=None, credentials=None, sample_resources=False):
+        """
+        Args:
+            user_id - (int) identifier recorded with each result
+            filename - Excel file with test data
+            plan - scenario_plan.Plan as returned by ExcelRun.read_plan
+            stop_time - time.time() value after which no new iteration starts
+            results - shared list that result dictionaries are appended to
+            lock - threading.Lock protecting results
+            pool - (optional) BrowserPool shared by users
+            session_cache - (optional) SessionCache shared by users
+            tracer - (optional) tracing.Tracer shared by users
+            credentials - (optional) dictionary of url: (username, password)
+                for logins without them in the spreadsheet
+            sample_resources - when True the user's browser/driver processes
+                are sampled (see resource_sampler.py)
+        """
+        threading.Thread.__init__(self, name="user-{}".format(user_id))
+        self.daemon = True
+        self.user_id = user_id
+        self.plan = plan
+        self.stop_time = stop_time
+        self.results = results
+        self.lock = lock
+        # Each user has its own runner, and so its own Eric/Webdriver session
+        self.runner = ExcelRun(filename=filename, session_cache=session_cache)
+        self.runner.extract_details = False
+        # No results log here, so phase breakdowns aren't kept
+        self.runner.stop_phase_recording()
+        self.runner.eric.pool = pool
+        self.runner.credentials = dict(credentials or {})
+        self.runner.eric.sample_resources = sample_resources
+        if tracer:
+            tracer.attach(self.runner.eric, user=user_id)
+        self.iteration = 0
+
+    def record(self, action, parameter, duration):
+        """Add one timing to the shared results, with load generator
+        resources during the step's Eric action (if sampled)
+        """
+        timing = self.runner.eric.last_timing
+        resources = (timing and timing.resources) or {}
+        result = {"user": self.user_id,
+                  "iteration": self.iteration,
+                  "timestamp": time.strftime("%d/%m/%Y - %H:%M:%S"),
+                  "action": action,
+                  "parameter": parameter,
+                  "duration": duration,
+                  "host_cpu": resources.get("host_cpu"),
+                  "browser_cpu": resources.get("browser_cpu"),
+                  "browser_rss": resources.get("browser_rss"),
+                  "saturated": resources.get("saturated")}
+        with self.lock:
+            self.results.append(result)
+
+    def run(self):
+        """Repeat scenario until stop time reached"""
+        while time.time() < self.stop_time:
+            self.iteration += 1
+            try:
+                self.run_scenario()
+            except Exception as e:
+                # Record the failure and try to release the browser
+                self.record("error", type(e).__name__, str(e))
+                try:
+                    self.runner.eric.close()
+                except Exception:
+                    pass
+
+    def run_scenario(self, sub=None):
+        """Perform one pass through the scenario steps
+        Args:
+            sub - (optional) name of sub-scenario to run instead of main
+        """
+        runner = self.runner
+        runner.continue_run = True
+        for step in self.plan.steps(sub):
+            values = runner.perform(step)
+            # Record steps that produce a (parameter, time) pair
+            # (viewall adds per-report times after its total)
+            if len(values) >= 2 and values[1] is not None:
+                self.record(step.action, values[0], values[1])
+            # Give up on this iteration if login was unsuccessful
+            if not runner.continue_run:
+                return
+            self.pause(step)
+
+    def pause(self, step):
+        """Called after each step - no pause between steps here"""
+        pass
+
+
+class LoadRun(object):
+    def __init__(self, filename="", users=2, ramp_up=60, hold=300,
+                 scenarios=("Scenario",), pool_size=0, headless=False,
+                 session_cache=None, tracer=None, sample_resources=True):
+        """
+        Run many Eric sessions at once using scenario(s) from specially
+        formatted spreadsheet.
+        Args:
+            filename - Excel file with test data
+            users - number of concurrent virtual users
+            ramp_up - seconds over which user start times are spread
+            hold - seconds for which all users keep running after ramp-up
+            scenarios - names of tabs holding scenarios. User n runs
+                scenarios[n % len(scenarios)]
+            pool_size - when not 0, browsers come from a warm pool of this
+                size rather than being started for each login
+            headless - when True browsers run without visible windows
+            session_cache - (optional) session_cache.SessionCache used to
+                reuse Portal logins
+            tracer - (optional) tracing.Tracer receiving spans from all users
+            sample_resources - when True each user's browser/driver
+                processes are sampled, and results during which the load
+                generator was saturated are flagged
+        """
+        self.filename = filename
+        self.users = users
+        self.ramp_up = ramp_up
+        self.hold = hold
+        self.scenarios = scenarios
+        self.pool_size = pool_size
+        self.headless = headless
+        self.session_cache = session_cache
+        self.tracer = tracer
+        self.sample_resources = sample_resources
+        # Merged results from all users (list of dictionaries)
+        self.results = []
+        self.lock = threading.Lock()
+        # (username, password) by url, asked for before users start
+        self.credentials = {}
+        # Start date/time (used in results filename creation)
+        self.run_start = time.strftime("%Y.%m.%d_%H.%M.%S")
+        # Reuses ExcelRun for scenario reading and results folder
+        self.reader = ExcelRun(filename=filename)
+
+    def read_scenarios(self):
+        """Read and check each scenario tab once, before any browser starts.
+        Missing usernames/passwords are requested here so that
+        user threads never wait for keyboard input.
+        Returns:
+            dictionary of tab name: scenario_plan.Plan
+        Raises:
+            scenario_plan.ScenarioError if a scenario is invalid
+        """
+        wb = openpyxl.load_workbook(filename=self.filename)
+        plans = {}
+        for tab in self.scenarios:
+            steps = self.reader.read_scenario(wb[tab])
+            plans[tab] = compile_plan(steps)
+            for step in steps:
+                if step.action == "login" and step.parameter not in self.credentials \
+                        and not (step.parameter2 and step.parameter3):
+                    username = step.parameter2 or raw_input("Username ({}):".format(tab))
+                    password = step.parameter3 or getpass.getpass(prompt="Password ({}):".format(tab))
+                    self.credentials[step.parameter] = (username, password)
+        return plans
+
+    def run(self):
+        """Start users, wait for them to finish and save merged results"""
+        plans = self.read_scenarios()
+        pool = None
+        if self.pool_size:
+            pool = BrowserPool(size=self.pool_size, headless=self.headless)
+        start = time.time()
+        stop_time = start + self.ramp_up + self.hold
+        # Gap between user starts
+        interval = float(self.ramp_up) / self.users if self.users else 0
+
+        threads = []
+        for user_id in range(self.users):
+            plan = plans[self.scenarios[user_id % len(self.scenarios)]]
+            user = VirtualUser(user_id + 1, self.filename, plan, stop_time,
+                               self.results, self.lock, pool, self.session_cache,
+                               self.tracer, self.credentials, self.sample_resources)
+            user.runner.eric.headless = self.headless
+            # Wait for this user's place in the ramp-up
+            delay = start + interval * user_id - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            print "Starting user", user_id + 1
+            user.start()
+            threads.append(user)
+
+        for user in threads:
+            user.join()
+        if pool:
+            pool.close()
+
+        saturated = len([result for result in self.results if result.get("saturated")])
+        if saturated:
+            print "Load generator saturated during {} of {} timings - " \
+                  "these may not reflect Eric".format(saturated, len(self.results))
+        return self.save_results()
+
+    def save_results(self):
+        """Write merged results to CSV file in results folder
+        Returns:
+            path of CSV file
+        """
+        fields = ["user", "iteration", "timestamp", "action", "parameter", "duration",
+                  "host_cpu", "browser_cpu", "browser_rss", "saturated"]
+        csv_path = os.path.join(self.reader.results_folder,
+                                "Load_" + self.run_start + ".csv")
+        with open(csv_path, "wb") as csv_file:
+            writer = csv.DictWriter(csv_file, fields)
+            writer.writeheader()
+            for result in self.results:
+                writer.writerow(result)
+        return csv_path
+
+
+if __name__ == "__main__":
+
+    # Defaults, can be overridden by command-line args:
+    # filename users ramp_up hold
+    filename = "eric_data.xlsx"
+    users, ramp_up, hold = 2, 60, 300
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+    if len(sys.argv) > 4:
+        users, ramp_up, hold = [int(arg) for arg in sys.argv[2:5]]
+
+    go = LoadRun(filename=filename, users=users, ramp_up=ramp_up, hold=hold)
+    print "Results:", go.run()
+    print "Finished"
@@ -0,0 +1,90 @@
+"""
+Locator cache for Eric controls that lack convenient identifiers.
+
+Each control (or group of controls) is found with a single in-browser
+query instead of several Webdriver calls, and the elements are kept for
+reuse. If a kept element has gone stale (page replaced), it is found again
+and the interaction retried. Hit/miss/stale counts are kept in stats.
+"""
+
+from selenium.common.exceptions import StaleElementReferenceException
+
+# In-browser queries, each returning a list of elements
+LOCATORS = {
+    # Search field and search button - not-hidden inputs in tableBoxInd div
+    "search_controls": """
+        var div = document.querySelector(".tableBoxInd");
+        if (!div) {return [];}
+        return Array.prototype.filter.call(div.getElementsByTagName("input"),
+            function(e) {return e.getAttribute("type") != "hidden";});
+    """,
+    # "View Report" button in ReportDetailsForm
+    "view_button": """
+        var form = document.getElementById("ReportDetailsForm");
+        if (!form) {return [];}
+        return Array.prototype.filter.call(form.getElementsByTagName("input"),
+            function(e) {return e.getAttribute("value") == "View Report";});
+    """,
+    # Report window buttons - "Close Report" is the last one
+    "report_buttons": """
+        var div = document.getElementById("buttons2");
+        if (!div) {return [];}
+        return Array.prototype.slice.call(div.getElementsByTagName("a"));
+    """,
+}
+
+
+class LocatorCache(object):
+    """Finds and keeps elements located by the LOCATORS queries"""
+    def __init__(self, driver=None):
+        """
+        Args:
+            driver - Webdriver instance (can be set later with attach)
+        """
+        self.driver = driver
+        # Located elements by locator name
+        self.cache = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0}
+
+    def attach(self, driver):
+        """Use a different Webdriver instance, discarding kept elements"""
+        self.driver = driver
+        self.clear()
+
+    def clear(self):
+        """Discard kept elements, e.g. after switching window"""
+        self.cache = {}
+
+    def resolve(self, name):
+        """Find elements with one in-browser query and keep them if found
+        Returns:
+            list of Webdriver elements
+        """
+        elements = self.driver.execute_script(LOCATORS[name])
+        if elements:
+            self.cache[name] = elements
+        return elements
+
+    def get(self, name):
+        """Kept elements for locator name, found if not kept already"""
+        if name in self.cache:
+            self.stats["hits"] += 1
+            return self.cache[name]
+        self.stats["misses"] += 1
+        return self.resolve(name)
+
+    def call(self, name, action):
+        """Perform action on located elements. If the elements have gone
+        stale, they are found again and the action retried once.
+        Args:
+            name - locator name (key of LOCATORS)
+            action - function taking the list of elements
+        Returns:
+            action's return value
+        """
+        try:
+            return action(self.get(name))
+        except StaleElementReferenceException:
+            self.stats["stale"] += 1
+            self.cache.pop(name, None)
+            return action(self.resolve(name))
@@ -0,0 +1,108 @@
+"""
+Browser-side timing capture.
+
+Reads Navigation Timing and Resource Timing entries from window.performance
+of the current page and of the report iframe (reportContent), giving
+server/network/rendering figures that Python-side timers can't see.
+Times are in milliseconds, as reported by the browser.
+"""
+
+# Executed in the browser. Collects entries from the page and the
+# reportContent iframe (if present), then clears the resource entries so
+# the next capture only includes resources loaded since this one.
+COLLECT_SCRIPT = """
+function collect(win) {
+    var perf = win.performance;
+    if (!perf || !perf.getEntriesByType) {
+        return null;
+    }
+    var navigation = null;
+    var nav = perf.getEntriesByType("navigation")[0];
+    if (nav) {
+        navigation = {url: nav.name,
+                      ttfb: nav.responseStart - nav.requestStart,
+                      dom_content_loaded: nav.domContentLoadedEventEnd - nav.startTime,
+                      load_event: nav.loadEventEnd - nav.startTime,
+                      transfer_size: nav.transferSize || 0};
+    } else if (perf.timing) {
+        var t = perf.timing;
+        navigation = {url: win.location.href,
+                      ttfb: t.responseStart - t.requestStart,
+                      dom_content_loaded: t.domContentLoadedEventEnd - t.navigationStart,
+                      load_event: t.loadEventEnd - t.navigationStart,
+                      transfer_size: 0};
+    }
+    var resources = [];
+    var entries = perf.getEntriesByType("resource");
+    for (var i = 0; i < entries.length; i++) {
+        var r = entries[i];
+        resources.push({url: r.name,
+                        type: r.initiatorType,
+                        duration: r.duration,
+                        transfer_size: r.transferSize || 0,
+                        encoded_size: r.encodedBodySize || 0,
+                        decoded_size: r.decodedBodySize || 0});
+    }
+    if (perf.clearResourceTimings) {
+        perf.clearResourceTimings();
+    }
+    return {navigation: navigation, resources: resources};
+}
+var result = {page: collect(window), frames: []};
+var frame = document.getElementById("reportContent");
+if (frame) {
+    try {
+        result.frames.push(collect(frame.contentWindow));
+    } catch (e) {
+        // Cross-origin or not yet loaded - skip
+    }
+}
+return result;
+"""
+
+
+def collect(driver):
+    """Read performance entries from the current browser window
+    Args:
+        driver - Webdriver instance, focused on window of interest
+    Returns:
+        dictionary with "page" and "frames" entries, each holding
+        "navigation" and "resources" details
+    """
+    return driver.execute_script(COLLECT_SCRIPT)
+
+
+def summarise(captured):
+    """Reduce captured entries to headline figures
+    Args:
+        captured - dictionary as returned by collect()
+    Returns:
+        dictionary with ttfb, dom_content_loaded and load_event (ms) of the
+        page, frame_ttfb/frame_load_event of the report iframe, and
+        resource_count/resource_bytes across page and frames.
+    """
+    summary = {"ttfb": None, "dom_content_loaded": None, "load_event": None,
+               "frame_ttfb": None, "frame_load_event": None,
+               "resource_count": 0, "resource_bytes": 0}
+    if not captured:
+        return summary
+    documents = [captured.get("page")] + list(captured.get("frames") or [])
+    for position, document in enumerate(documents):
+        if not document:
+            continue
+        navigation = document.get("navigation")
+        if navigation:
+            # Page navigation is first, the iframe follows
+            if position == 0:
+                summary["ttfb"] = navigation["ttfb"]
+                summary["dom_content_loaded"] = navigation["dom_content_loaded"]
+                summary["load_event"] = navigation["load_event"]
+            elif summary["frame_ttfb"] is None:
+                summary["frame_ttfb"] = navigation["ttfb"]
+                summary["frame_load_event"] = navigation["load_event"]
+        for resource in document.get("resources") or []:
+            summary["resource_count"] += 1
+            # Transfer size is 0 for cached resources, fall back on body size
+            summary["resource_bytes"] += max(resource["transfer_size"],
+                                             resource["encoded_size"])
+    return summary
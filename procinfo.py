@@ -0,0 +1,141 @@
+"""
+Process details read from /proc (Linux only).
+
+Used to find the browser/driver process trees started by Webdriver and
+how much memory, CPU and open handles they use. Functions return empty/None values on
+platforms without /proc.
+"""
+
+import os
+
+PROC = "/proc"
+
+# Units of CPU times in /proc (normally 100 per second)
+try:
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+
+
+def available():
+    """True if /proc process details can be read"""
+    return os.path.isdir(os.path.join(PROC, "self"))
+
+
+def parent_pids():
+    """Parent of every running process
+    Returns:
+        dictionary of pid: parent pid
+    """
+    parents = {}
+    if not available():
+        return parents
+    for name in os.listdir(PROC):
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(PROC, name, "stat")) as stat_file:
+                stat = stat_file.read()
+        except (IOError, OSError):
+            # Process ended while looking
+            continue
+        # Command name is in brackets and may contain spaces
+        fields = stat[stat.rfind(")") + 2:].split()
+        parents[int(name)] = int(fields[1])
+    return parents
+
+
+def process_tree(pid, parents=None):
+    """pid plus the pids of all its descendants
+    Args:
+        pid - (int) root process id
+        parents - (optional) parent_pids() result to use, when finding
+            several trees at once
+    Returns:
+        list of pids, root first (empty if root not running)
+    """
+    if parents is None:
+        parents = parent_pids()
+    if pid not in parents:
+        return []
+    tree = [pid]
+    for member in tree:
+        tree.extend(child for child, parent in parents.items() if parent == member)
+    return tree
+
+
+def rss_mb(pid):
+    """Resident memory of one process in MB (None if unavailable)"""
+    try:
+        with open(os.path.join(PROC, str(pid), "status")) as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def tree_rss_mb(pid):
+    """Total resident memory of process and its descendants in MB
+    (None if unavailable)
+    """
+    sizes = [rss_mb(member) for member in process_tree(pid)]
+    sizes = [size for size in sizes if size is not None]
+    if not sizes:
+        return None
+    return sum(sizes)
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time used by one process in seconds
+    (None if unavailable)
+    """
+    try:
+        with open(os.path.join(PROC, str(pid), "stat")) as stat_file:
+            stat = stat_file.read()
+    except (IOError, OSError):
+        return None
+    # utime and stime are fields 14 and 15 (11 and 12 after the command name)
+    fields = stat[stat.rfind(")") + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / float(CLOCK_TICKS)
+
+
+def open_handles(pid):
+    """Number of open file descriptors (files, sockets, pipes) of one
+    process (None if unavailable)
+    """
+    try:
+        return len(os.listdir(os.path.join(PROC, str(pid), "fd")))
+    except (IOError, OSError):
+        return None
+
+
+def host_cpu_times():
+    """Busy and total CPU time of the whole machine, in clock ticks since boot
+    Returns:
+        (busy, total) tuple, or None if unavailable
+    """
+    try:
+        with open(os.path.join(PROC, "stat")) as stat_file:
+            fields = [int(field) for field in stat_file.readline().split()[1:]]
+    except (IOError, OSError, ValueError):
+        return None
+    # idle and iowait are the 4th and 5th figures
+    idle = sum(fields[3:5])
+    return sum(fields) - idle, sum(fields)
+
+
+def mem_available_fraction():
+    """Fraction of machine memory available for new work (None if unavailable)"""
+    details = {}
+    try:
+        with open(os.path.join(PROC, "meminfo")) as meminfo_file:
+            for line in meminfo_file:
+                name, value = line.split(":", 1)
+                details[name] = int(value.split()[0])
+    except (IOError, OSError, ValueError):
+        return None
+    if not details.get("MemTotal") or "MemAvailable" not in details:
+        return None
+    return details["MemAvailable"] / float(details["MemTotal"])
@@ -0,0 +1,160 @@
+"""
+Streaming percentiles and SLA checks for Eric action timings.
+
+LogHistogram counts durations in logarithmically sized buckets, so any
+percentile can be read back to within a fixed relative error (1% by
+default) using memory that depends only on the range of durations, not on
+how many there are. ActionStats keeps one per action, and per report for
+select/view, from completed timings.
+
+SLAs are (action, report, percentile, threshold) rows; evaluate() reports
+which are breached.
+"""
+
+import math
+from collections import namedtuple
+
+
+class LogHistogram(object):
+    """Constant-memory quantile sketch for positive values"""
+    def __init__(self, accuracy=0.01):
+        """
+        Args:
+            accuracy - relative error of quantiles (0.01 is 1%)
+        """
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # Bucket index: count. Bucket i holds values in (gamma^(i-1), gamma^i]
+        self.buckets = {}
+        # Zero (or negative) values
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = int(math.ceil(math.log(value) / self.log_gamma))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantile(self, fraction):
+        """Value at fraction (0 to 1) of recorded values (None if empty)"""
+        if not self.count:
+            return None
+        if fraction >= 1:
+            return self.max
+        rank = fraction * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Middle of bucket (in relative terms), kept within min/max
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self):
+        """Dictionary of count, mean, p50, p90, p99 and max"""
+        return {"count": self.count,
+                "mean": self.mean(),
+                "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99),
+                "max": self.max}
+
+
+class ActionStats(object):
+    """LogHistogram of successful durations per action, and per report for
+    select and view. Errors are counted separately.
+    """
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        # (action, report): LogHistogram - report is None for action overall
+        self.histograms = {}
+        # (action, report): error count
+        self.errors = {}
+        # Report number most recently selected (views are of this report)
+        self.report = None
+
+    def keys(self, timing):
+        """(action, report) keys a timing counts towards"""
+        if timing.action == "select_report":
+            # select_report parameter is report index from 0, or report name
+            if timing.parameter is None:
+                self.report = None
+            elif isinstance(timing.parameter, (int, long)):
+                self.report = str(timing.parameter + 1)
+            else:
+                self.report = unicode(timing.parameter)
+        keys = [(timing.action, None)]
+        if timing.action in ("select_report", "view_report") and self.report:
+            keys.append((timing.action, self.report))
+        return keys
+
+    def record(self, timing):
+        """Add completed timing.ActionTiming (suitable for Eric.timing_listeners)"""
+        for key in self.keys(timing):
+            if timing.outcome == "ok" and timing.duration is not None:
+                if key not in self.histograms:
+                    self.histograms[key] = LogHistogram(self.accuracy)
+                self.histograms[key].add(timing.duration)
+            else:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def summary_rows(self):
+        """[action, report, count, errors, mean, p50, p90, p99, max] rows"""
+        rows = []
+        for key in sorted(set(self.histograms) | set(self.errors)):
+            summary = self.histograms[key].summary() if key in self.histograms else {}
+            rows.append([key[0], key[1], summary.get("count", 0), self.errors.get(key, 0)]
+                        + [summary.get(name) for name in ("mean", "p50", "p90", "p99", "max")])
+        return rows
+
+
+SLA = namedtuple("SLA", "action report percentile threshold")
+
+# Scenario action names accepted in SLA rows, as timed action names
+ACTION_NAMES = {"login": "open_eric", "select": "select_report", "view": "view_report",
+                "viewall": "view_reports"}
+
+# Percentile names accepted in SLA rows, as fractions
+PERCENTILES = {"p50": 0.5, "median": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99, "max": 1.0}
+
+
+def percentile_fraction(name):
+    """Fraction for percentile given as name (p90, max) or number (90)"""
+    name = str(name).strip().lower()
+    if name in PERCENTILES:
+        return PERCENTILES[name]
+    return float(name.lstrip("p")) / 100
+
+
+def evaluate(stats, slas):
+    """Check SLAs against recorded timings
+    Args:
+        stats - ActionStats
+        slas - list of SLA
+    Returns:
+        list of (SLA, measured value, breached) - value is None (and
+        breached False) if there are no timings for the SLA
+    """
+    results = []
+    for sla in slas:
+        action = ACTION_NAMES.get(sla.action, sla.action)
+        key = (action, None if sla.report in (None, "") else str(sla.report))
+        histogram = stats.histograms.get(key)
+        value = histogram.quantile(percentile_fraction(sla.percentile)) if histogram else None
+        results.append((sla, value, value is not None and value > sla.threshold))
+    return results
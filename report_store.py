@@ -0,0 +1,121 @@
+"""
+Content-addressed store for extracted report HTML.
+
+Each report body is hashed (SHA-256) and stored gzip-compressed once,
+however many times it is extracted:
+
+    report_store/objects/ab/ab12...ef.html.gz   - unique report bodies
+    report_store/index.csv                      - run, account, report,
+                                                  timestamp, url, hash, size
+
+Bodies are hashed and compressed as they are written, in chunks, so no
+extra encoded copy is held in memory. Disk use grows with distinct content
+rather than with the number of runs.
+"""
+
+import csv
+import gzip
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+# Characters encoded/written at a time
+CHUNK = 65536
+
+INDEX_FIELDS = ["run", "account", "report", "timestamp", "url", "hash", "size"]
+
+
+class ReportStore(object):
+    """Stores report bodies by content hash, with an index of where each
+    was seen
+    """
+    def __init__(self, root="report_store"):
+        """
+        Args:
+            root - store folder (created if not present)
+        """
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.index_filename = os.path.join(root, "index.csv")
+        self.lock = threading.Lock()
+        if not os.path.exists(self.objects):
+            os.makedirs(self.objects)
+        # Stored and already-present counts since created
+        self.stats = {"stored": 0, "duplicate": 0}
+
+    def path(self, digest):
+        """Path of stored body with hash digest"""
+        return os.path.join(self.objects, digest[:2], digest + ".html.gz")
+
+    def put(self, body, run="", account="", report="", url=""):
+        """Store report body (if not already stored) and add index entry
+        Args:
+            body - report HTML (unicode or utf-8 str)
+            run, account, report, url - details recorded in index
+        Returns:
+            hash of body (hex)
+        """
+        sha = hashlib.sha256()
+        size = 0
+        temp_path = os.path.join(self.objects, "_" + uuid.uuid4().hex)
+        with open(temp_path, "wb") as temp_file:
+            compressed = gzip.GzipFile(fileobj=temp_file, mode="wb", mtime=0)
+            for start in range(0, len(body), CHUNK):
+                chunk = body[start:start + CHUNK]
+                if isinstance(chunk, unicode):
+                    chunk = chunk.encode("utf-8")
+                sha.update(chunk)
+                compressed.write(chunk)
+                size += len(chunk)
+            compressed.close()
+        digest = sha.hexdigest()
+        path = self.path(digest)
+        with self.lock:
+            if os.path.exists(path):
+                os.remove(temp_path)
+                self.stats["duplicate"] += 1
+            else:
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                os.rename(temp_path, path)
+                self.stats["stored"] += 1
+            self.add_index(run, account, report, url, digest, size)
+        return digest
+
+    def add_index(self, run, account, report, url, digest, size):
+        """Append entry to index file"""
+        new = not os.path.exists(self.index_filename)
+        with open(self.index_filename, "ab") as index_file:
+            writer = csv.writer(index_file)
+            if new:
+                writer.writerow(INDEX_FIELDS)
+            writer.writerow([unicode(value).encode("utf-8") for value in
+                             (run, account, report, time.strftime("%d/%m/%Y - %H:%M:%S"),
+                              url, digest, size)])
+
+    def open(self, digest):
+        """File object reading stored body (utf-8 bytes) with hash digest"""
+        return gzip.open(self.path(digest), "rb")
+
+    def get(self, digest):
+        """Stored body with hash digest (unicode)"""
+        with self.open(digest) as body_file:
+            return body_file.read().decode("utf-8")
+
+    def index(self, account=None, report=None, run=None):
+        """Generate index entries (dictionaries), optionally only those
+        matching account, report and/or run
+        """
+        if not os.path.exists(self.index_filename):
+            return
+        with open(self.index_filename, "rb") as index_file:
+            for entry in csv.DictReader(index_file):
+                if account is not None and entry["account"] != str(account):
+                    continue
+                if report is not None and entry["report"] != str(report):
+                    continue
+                if run is not None and entry["run"] != str(run):
+                    continue
+                yield entry
@@ -0,0 +1,160 @@
+"""
+Samples load generator resources in the background during an Eric session.
+
+When timings rise under load it may be our own Firefox/geckodriver
+processes (or the machine running them) that are struggling rather than
+Eric. ResourceSampler reads, at a fixed interval from /proc:
+
+    browser_cpu, browser_rss, browser_handles - Firefox process tree
+    driver_cpu, driver_rss, driver_handles    - geckodriver (less Firefox)
+    host_cpu, mem_available                   - whole machine
+
+CPU figures are percentages over the time since the previous sample
+(process trees as % of one core, host as % of all cores). A sample is
+saturated when host CPU or memory passes its limit. Eric adds a summary
+of the samples taken during each timed action to its ActionTiming
+(resources), so results show the load generator's state alongside each
+time. Linux only - nothing is recorded without /proc.
+"""
+
+import threading
+from collections import deque
+
+import procinfo
+from browser_pool import browser_pid, driver_pid
+from timing import clock
+
+# Measured fields of each sample. mem_available is the only one where
+# the minimum (rather than maximum) is of interest
+FIELDS = ["browser_cpu", "browser_rss", "browser_handles",
+          "driver_cpu", "driver_rss", "driver_handles",
+          "host_cpu", "mem_available"]
+
+
+def tree_usage(pids):
+    """Total CPU seconds, RSS (MB) and open handles of processes
+    Returns:
+        (cpu, rss, handles) tuple - each None if not readable for any process
+    """
+    totals = []
+    for reader in (procinfo.cpu_seconds, procinfo.rss_mb, procinfo.open_handles):
+        values = [reader(pid) for pid in pids]
+        values = [value for value in values if value is not None]
+        totals.append(sum(values) if values else None)
+    return tuple(totals)
+
+
+def percent(used, previous, elapsed):
+    """Percentage of elapsed time used (None if either reading is missing)"""
+    if used is None or previous is None or elapsed <= 0:
+        return None
+    return 100.0 * (used - previous) / elapsed
+
+
+class ResourceSampler(threading.Thread):
+    """Background thread sampling resources of one Webdriver's processes"""
+    def __init__(self, driver, interval=1.0, max_samples=3600, cpu_limit=90,
+                 memory_limit=5):
+        """
+        Args:
+            driver - Webdriver instance whose processes are sampled
+            interval - seconds between samples
+            max_samples - most recent samples kept
+            cpu_limit - host CPU % at or above which load generator is saturated
+            memory_limit - available memory % at or below which load
+                generator is saturated
+        """
+        threading.Thread.__init__(self, name="resource-sampler")
+        self.daemon = True
+        self.browser = browser_pid(driver)
+        self.driver = driver_pid(driver)
+        self.interval = interval
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        # Sample dictionaries (FIELDS plus time and saturated), oldest first
+        self.samples = deque(maxlen=max_samples)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        # Cumulative CPU readings of previous sample:
+        # (clock(), browser cpu, driver cpu, host (busy, total) ticks)
+        self.previous = None
+
+    def run(self):
+        """Sample every interval until stopped"""
+        while not self.stopping.is_set():
+            self.sample()
+            self.stopping.wait(self.interval)
+
+    def stop(self):
+        """Stop sampling (samples already taken are kept)"""
+        self.stopping.set()
+
+    def sample(self):
+        """Take one sample now
+        Returns:
+            sample dictionary
+        """
+        with self.lock:
+            now = clock()
+            parents = procinfo.parent_pids()
+            browser_tree = procinfo.process_tree(self.browser, parents) if self.browser else []
+            driver_tree = []
+            if self.driver:
+                driver_tree = [pid for pid in procinfo.process_tree(self.driver, parents)
+                               if pid not in browser_tree]
+            browser_cpu, browser_rss, browser_handles = tree_usage(browser_tree)
+            driver_cpu, driver_rss, driver_handles = tree_usage(driver_tree)
+            host = procinfo.host_cpu_times()
+            available = procinfo.mem_available_fraction()
+
+            sample = {"time": now,
+                      "browser_cpu": None, "browser_rss": browser_rss,
+                      "browser_handles": browser_handles,
+                      "driver_cpu": None, "driver_rss": driver_rss,
+                      "driver_handles": driver_handles,
+                      "host_cpu": None,
+                      "mem_available": None if available is None else 100 * available}
+            # CPU use since previous sample
+            if self.previous:
+                elapsed = now - self.previous[0]
+                sample["browser_cpu"] = percent(browser_cpu, self.previous[1], elapsed)
+                sample["driver_cpu"] = percent(driver_cpu, self.previous[2], elapsed)
+                if host and self.previous[3] and host[1] > self.previous[3][1]:
+                    sample["host_cpu"] = 100.0 * (host[0] - self.previous[3][0]) \
+                                         / (host[1] - self.previous[3][1])
+            self.previous = (now, browser_cpu, driver_cpu, host)
+            sample["saturated"] = self.saturated(sample)
+            self.samples.append(sample)
+        return sample
+
+    def saturated(self, sample):
+        """True if sample shows load generator CPU or memory at its limit"""
+        return (sample["host_cpu"] is not None and sample["host_cpu"] >= self.cpu_limit) \
+            or (sample["mem_available"] is not None
+                and sample["mem_available"] <= self.memory_limit)
+
+    def summary(self, start, end):
+        """Resource use during a period. A sample is taken first, so that
+        actions shorter than the interval are covered.
+        Args:
+            start, end - clock() values (e.g. ActionTiming start and end)
+        Returns:
+            dictionary of samples (count), the maximum of each field
+            (minimum of mem_available) and saturated (True if any sample
+            was), or None if there were no samples
+        """
+        self.sample()
+        with self.lock:
+            during = [sample for sample in self.samples if sample["time"] >= start]
+        # Keep the first sample after end, covering the end of the period
+        after = [sample for sample in during if sample["time"] > end]
+        during = [sample for sample in during if sample["time"] <= end] + after[:1]
+        if not during:
+            return None
+        summary = {"samples": len(during),
+                   "saturated": any(sample["saturated"] for sample in during)}
+        for field in FIELDS:
+            values = [sample[field] for sample in during if sample[field] is not None]
+            choose = min if field == "mem_available" else max
+            summary[field] = choose(values) if values else None
+        return summary
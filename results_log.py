@@ -0,0 +1,101 @@
+"""
+Append-only log of spreadsheet results, so a crash or hang loses nothing.
+
+Each result is written as one JSON line as soon as it is known:
+
+    {"sheet": "Results", "row": 7, "column": 3, "value": 1.52}  - cell value
+    {"sheet": "Phases", "append": [...]}                         - new row
+
+Lines are flushed to the operating system straight away (so they survive
+the process being killed) and fsync'ed in batches (so they survive a host
+crash without an fsync per result). consolidate() later applies the log to
+the workbook in the same layout as writing the cells directly.
+"""
+
+import json
+import os
+import time
+
+
+class ResultsLog(object):
+    """Writes result records to an append-only JSON lines file"""
+    def __init__(self, filename, sync_every=20, sync_interval=5.0):
+        """
+        Args:
+            filename - log file (appended to if it exists)
+            sync_every - fsync after this many records...
+            sync_interval - ...or when this many seconds have passed
+        """
+        self.filename = filename
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.file = open(filename, "a")
+        self.unsynced = 0
+        self.synced_at = time.time()
+        # Records written since opened
+        self.count = 0
+
+    def write(self, record):
+        """Append one record"""
+        self.file.write(json.dumps(record, default=str) + "\n")
+        self.file.flush()
+        self.count += 1
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or time.time() - self.synced_at >= self.sync_interval:
+            self.sync()
+
+    def cell(self, sheet, row, column, value):
+        """Record value for cell of sheet"""
+        self.write({"sheet": sheet, "row": row, "column": column, "value": value})
+
+    def append(self, sheet, values):
+        """Record a row to be appended to sheet"""
+        self.write({"sheet": sheet, "append": list(values)})
+
+    def sync(self):
+        """Force written records to disk"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.time()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
+def read_records(filename):
+    """Generate records from log file. A partly written last line
+    (process killed mid-write) is skipped.
+    """
+    with open(filename) as log_file:
+        for line in log_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def consolidate(wb, filename, headings=None):
+    """Apply records in log file to workbook (not saved)
+    Args:
+        wb - openpyxl workbook
+        filename - log file
+        headings - (optional) dictionary of sheet name: heading row, for
+            sheets to create (with headings) if not already present
+    Returns:
+        number of records applied
+    """
+    headings = headings or {}
+    count = 0
+    for record in read_records(filename):
+        if record["sheet"] not in wb.sheetnames:
+            wb.create_sheet(record["sheet"]).append(headings.get(record["sheet"], []))
+        ws = wb[record["sheet"]]
+        if "append" in record:
+            ws.append(record["append"])
+        else:
+            ws.cell(row=record["row"], column=record["column"]).value = record["value"]
+        count += 1
+    return count
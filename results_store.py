@@ -0,0 +1,318 @@
+"""
+Columnar store of action timings for long-term history.
+
+Timings are written as Parquet files partitioned by date:
+
+    results_store/date=2019-03-01/part-<time>-<session>.parquet
+
+with a fixed schema (COLUMNS) - timestamp, session, action, parameter,
+duration, outcome, overhead, browser-side page timing fields, the phase
+breakdown (JSON text), cache mode and iteration. load() reads back a time
+range as a pandas DataFrame, reading only the date partitions and columns
+needed.
+compact() merges each past day's part files into one, so loading months of
+frequent samples means opening one file per day.
+
+Needs pyarrow and pandas (on Python 2.7, pyarrow 0.16 and pandas 0.24 are
+the latest releases - only APIs they have are used). available() is False
+without them.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import datetime
+
+try:
+    import pandas
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+# Browser-side timing summary fields (see page_timing.summarise)
+PAGE_TIMING_FIELDS = ["ttfb", "dom_content_loaded", "load_event",
+                      "frame_ttfb", "frame_load_event",
+                      "resource_count", "resource_bytes"]
+
+# (column name, pyarrow type name) - partition column "date" is added by path
+COLUMNS = ([("timestamp", "float64"),
+            ("session", "string"),
+            ("action", "string"),
+            ("parameter", "string"),
+            ("duration", "float64"),
+            ("outcome", "string"),
+            ("overhead", "float64"),
+            ("corrected", "float64")]
+           + [(field, "float64") for field in PAGE_TIMING_FIELDS]
+           + [("phases", "string"),
+              ("mode", "string"),
+              ("iteration", "int64")])
+
+
+def available():
+    """True if pyarrow and pandas are installed"""
+    return pyarrow is not None
+
+
+def schema():
+    """pyarrow schema of stored timings"""
+    return pyarrow.schema([pyarrow.field(name, getattr(pyarrow, kind)())
+                           for name, kind in COLUMNS])
+
+
+def timing_row(timing, session=None):
+    """Store row (dictionary) for completed timing.ActionTiming"""
+    summary = {}
+    if timing.page_timing:
+        summary = timing.page_timing.get("summary") or {}
+    row = {"timestamp": timing.timestamp,
+           "session": session,
+           "action": timing.action,
+           "parameter": None if timing.parameter is None else unicode(timing.parameter),
+           "duration": timing.duration,
+           "outcome": timing.outcome,
+           "overhead": timing.overhead,
+           "corrected": timing.corrected_duration,
+           "phases": json.dumps(timing.phase_durations()),
+           "mode": timing.mode,
+           "iteration": timing.iteration}
+    for field in PAGE_TIMING_FIELDS:
+        value = summary.get(field)
+        row[field] = None if value is None else float(value)
+    return row
+
+
+def date_of(timestamp):
+    """Partition (local date, YYYY-MM-DD) of time.time() value"""
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+class ResultsStore(object):
+    """Buffers timings and writes them to the store in date partitions"""
+    def __init__(self, root="results_store", flush_every=500, compact_days=True):
+        """
+        Args:
+            root - store folder (created if not present)
+            flush_every - buffered rows that trigger a write
+            compact_days - when True, each flush also compacts past days
+                (see compact) so they're one file each
+        """
+        if not available():
+            raise ImportError("pyarrow and pandas are needed for ResultsStore")
+        self.root = root
+        self.flush_every = flush_every
+        self.compact_days = compact_days
+        self.rows = []
+        self.lock = threading.Lock()
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    def listener(self, session=None):
+        """Function suitable for Eric.timing_listeners that stores each
+        completed timing
+        """
+        def store_timing(timing):
+            self.add(timing_row(timing, session))
+        return store_timing
+
+    def attach(self, eric):
+        """Store every timed action of Eric instance"""
+        eric.timing_listeners.append(self.listener(eric.session_id))
+
+    def add(self, row):
+        """Buffer one row, writing buffered rows if enough are waiting"""
+        with self.lock:
+            self.rows.append(row)
+            full = len(self.rows) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows, one file per date partition"""
+        with self.lock:
+            rows, self.rows = self.rows, []
+        partitions = {}
+        for row in rows:
+            partitions.setdefault(date_of(row["timestamp"]), []).append(row)
+        for date, date_rows in sorted(partitions.items()):
+            folder = os.path.join(self.root, "date=" + date)
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            table = pyarrow.Table.from_arrays(
+                [pyarrow.array([row[name] for row in date_rows], type=field.type)
+                 for name, field in zip([name for name, _ in COLUMNS], schema())],
+                schema=schema())
+            filename = "part-{:.6f}-{}.parquet".format(time.time(), date_rows[0]["session"])
+            write_file(table, folder, filename)
+        if self.compact_days:
+            compact(self.root)
+
+    def close(self):
+        self.flush()
+
+
+def write_file(table, folder, filename):
+    """Write table to Parquet file, under a temporary name (ignored by
+    readers as it starts with _) until complete
+    """
+    path = os.path.join(folder, filename)
+    temp_path = os.path.join(folder, "_" + filename)
+    parquet.write_table(table, temp_path)
+    os.rename(temp_path, path)
+
+
+def read_part(path, columns=None):
+    """Table of one part file with the store's columns, in COLUMNS order.
+    Columns missing from files written before they were added (e.g. mode)
+    are filled with nulls.
+    Args:
+        path - part file
+        columns - (optional) list of columns to read (default all)
+    """
+    types = dict(COLUMNS)
+    names = [name for name, _ in COLUMNS if columns is None or name in columns]
+    part = parquet.ParquetFile(path)
+    present = part.schema.names
+    table = part.read(columns=[name for name in names if name in present])
+    arrays = []
+    for name in names:
+        if name in present:
+            arrays.append(table.column(table.schema.get_field_index(name)))
+        else:
+            arrays.append(pyarrow.chunked_array(
+                [pyarrow.array([None] * table.num_rows, type=getattr(pyarrow, types[name])())]))
+    return pyarrow.Table.from_arrays(arrays, names=names)
+
+
+# Compaction lock file in a partition (starts with _, so ignored by readers)
+COMPACT_LOCK = "_compacting"
+STALE_LOCK = 3600
+
+
+def part_files(folder):
+    """Part file names in date partition folder (in written order)"""
+    return sorted(part for part in os.listdir(folder)
+                  if part.startswith("part-") and part.endswith(".parquet"))
+
+
+def compact(root="results_store", before=None):
+    """Merge the part files of each date partition into a single file
+    Args:
+        root - store folder
+        before - (optional) only partitions before this date (YYYY-MM-DD)
+            are compacted. Defaults to today, so partitions still being
+            written to are left alone.
+    Returns:
+        number of partitions compacted
+    """
+    if before is None:
+        before = date_of(time.time())
+    compacted = 0
+    for name in sorted(os.listdir(root)):
+        folder = os.path.join(root, name)
+        if not name.startswith("date=") or name[5:] >= before:
+            continue
+        if len(part_files(folder)) < 2 or not lock_partition(folder):
+            continue
+        try:
+            # Listed again now locked (another process may have compacted it)
+            parts = part_files(folder)
+            if len(parts) < 2:
+                continue
+            table = pyarrow.concat_tables([read_part(os.path.join(folder, part)) for part in parts])
+            write_file(table, folder, "part-compacted-{:.6f}.parquet".format(time.time()))
+            for part in parts:
+                os.remove(os.path.join(folder, part))
+            compacted += 1
+        finally:
+            os.remove(os.path.join(folder, COMPACT_LOCK))
+    return compacted
+
+
+def lock_partition(folder):
+    """Take partition's compaction lock (a file, so that runs in separate
+    processes don't compact the same day at once). A lock older than
+    STALE_LOCK seconds is assumed left by a crashed run and replaced.
+    Returns:
+        True if lock taken
+    """
+    path = os.path.join(folder, COMPACT_LOCK)
+    try:
+        if time.time() - os.path.getmtime(path) > STALE_LOCK:
+            os.remove(path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except OSError:
+        return False
+    return True
+
+
+def load(root="results_store", start=None, end=None, actions=None, columns=None,
+         modes=None):
+    """Stored timings as a pandas DataFrame
+    Args:
+        root - store folder
+        start - (optional) datetime.datetime/time.time() value of
+            earliest timing
+        end - (optional) datetime.datetime/time.time() value of latest
+        actions - (optional) list of action names to include
+        columns - (optional) list of columns to read (default all)
+        modes - (optional) list of cache modes (cold, warm, repeat) to include
+    Returns:
+        DataFrame, with "date" (partition) and "time" (UTC datetime, from
+        timestamp) columns added, sorted by timestamp
+    """
+    if not available():
+        raise ImportError("pyarrow and pandas are needed to load results store")
+    start, end = [value if value is None or not isinstance(value, datetime.datetime)
+                  else time.mktime(value.timetuple()) + value.microsecond / 1e6
+                  for value in (start, end)]
+    if columns is not None:
+        needed = ["timestamp"] + (["action"] if actions else []) + (["mode"] if modes else [])
+        columns = list(columns) + [name for name in needed if name not in columns]
+    # Only the date partitions in range, and only the columns needed, are read
+    frames = []
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        if not name.startswith("date="):
+            continue
+        date = name[5:]
+        if (start is not None and date < date_of(start)) or \
+                (end is not None and date > date_of(end)):
+            continue
+        folder = os.path.join(root, name)
+        for part in part_files(folder):
+            frame = read_part(os.path.join(folder, part), columns).to_pandas()
+            frame["date"] = date
+            frames.append(frame)
+    if frames:
+        df = pandas.concat(frames, ignore_index=True)
+    else:
+        df = pandas.DataFrame(columns=[name for name, _ in COLUMNS
+                                       if columns is None or name in columns] + ["date"])
+    if start is not None:
+        df = df[df.timestamp >= start]
+    if end is not None:
+        df = df[df.timestamp <= end]
+    if actions:
+        df = df[df.action.isin(list(actions))]
+    if modes:
+        df = df[df["mode"].isin(list(modes))]
+    df["time"] = pandas.to_datetime(df.timestamp, unit="s")
+    return df.sort_values("timestamp").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Results store maintenance")
+    parser.add_argument("command", choices=["compact"],
+                        help="compact - merge each past day's part files into one")
+    parser.add_argument("--root", default="results_store", help="store folder")
+    parser.add_argument("--before", help="only days before this date (YYYY-MM-DD), default today")
+    args = parser.parse_args()
+
+    print "Days compacted:", compact(args.root, args.before)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+"""
+Long-lived runner for spreadsheet runs.
+
+Starting "python spreadsheet_run.py" for each scheduled sample means every
+run pays for interpreter start, imports, loading the workbook and starting
+Firefox before anything is measured. This service does that once, then
+waits for run requests on a local TCP socket:
+
+    request  - one JSON line: {"command": "run", "filename": "eric_data.xlsx"}
+               ("ping" and "stop" commands are also accepted)
+    response - one JSON line: {"status": "ok", "exit_code": 0, "duration": 41.2,
+                                "cpu": 1.3, "sla_breaches": 0, "result": null}
+
+A warm browser is kept in a one-browser pool and the workbook is kept in
+memory between runs (re-read only if changed by something else). Runs are
+handled one at a time. scheduler.py uses request_run(), falling back to a
+separate process if the service isn't running.
+
+Usernames/passwords not in the spreadsheet are asked for when the service
+starts, so scheduled runs never wait for keyboard input.
+"""
+
+import argparse
+import getpass
+import json
+import os
+import socket
+import SocketServer
+import time
+
+DEFAULT_PORT = 8765
+# Seconds request_run waits for a run to finish
+DEFAULT_TIMEOUT = 3600
+
+
+def cpu_seconds():
+    """User plus system CPU time of this process (None where the resource
+    module isn't available, e.g. Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    return sum(resource.getrusage(resource.RUSAGE_SELF)[:2])
+
+
+def request_run(filename, port=DEFAULT_PORT, command="run", timeout=DEFAULT_TIMEOUT):
+    """Ask runner service to perform a run
+    Args:
+        filename - spreadsheet to run
+        port - service port (on this machine)
+        command - "run", "ping" or "stop"
+        timeout - seconds to wait for the response (None waits indefinitely)
+    Returns:
+        response dictionary
+    Raises:
+        socket.timeout if there's no response within timeout
+        socket.error if the service can't be reached
+    """
+    connection = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+    try:
+        connection.sendall(json.dumps({"command": command, "filename": filename}) + "\n")
+        response = connection.makefile("rb").readline()
+    finally:
+        connection.close()
+    if not response:
+        raise socket.error("No response from runner service")
+    return json.loads(response)
+
+
+class RunnerService(SocketServer.TCPServer):
+    """Keeps an ExcelRun (and its warm browser) per spreadsheet and runs it
+    on request
+    """
+    allow_reuse_address = True
+
+    def __init__(self, port=DEFAULT_PORT, headless=True, session_cache=None,
+                 tracer=None, store=None, calibrate=False):
+        """
+        Args:
+            port - port to listen on (127.0.0.1 only)
+            headless - when True the warm browser runs headless
+            session_cache, tracer, store - (optional) passed to each ExcelRun
+            calibrate - when True, Webdriver overhead is calibrated
+        """
+        SocketServer.TCPServer.__init__(self, ("127.0.0.1", port), RunRequestHandler)
+        # Imported here so that request_run() doesn't need Selenium etc.
+        from browser_pool import BrowserPool
+        self.pool = BrowserPool(size=1, headless=headless)
+        self.session_cache = session_cache
+        self.tracer = tracer
+        self.store = store
+        self.calibrate = calibrate
+        # filename: ExcelRun
+        self.runners = {}
+        self.stopping = False
+
+    def runner(self, filename):
+        """ExcelRun for spreadsheet, created (and credentials asked for)
+        on first use
+        """
+        filename = os.path.abspath(filename)
+        if filename not in self.runners:
+            from spreadsheet_run import ExcelRun
+            runner = ExcelRun(filename=filename, session_cache=self.session_cache,
+                              tracer=self.tracer, store=self.store)
+            runner.keep_workbook = True
+            runner.eric.pool = self.pool
+            runner.eric.calibrate = self.calibrate
+            self.ask_credentials(runner)
+            self.runners[filename] = runner
+        return self.runners[filename]
+
+    def ask_credentials(self, runner):
+        """Ask for any username/password missing from the spreadsheet's
+        login steps
+        """
+        runner.open_spreadsheet()
+        for step in runner.read_scenario(runner.wb["Scenario"]):
+            if step.action == "login" and step.parameter not in runner.credentials \
+                    and not (step.parameter2 and step.parameter3):
+                print "Login details for", step.parameter
+                runner.credentials[step.parameter] = (
+                    step.parameter2 or raw_input("Username:"),
+                    step.parameter3 or getpass.getpass(prompt="Password:"))
+
+    def run(self, filename):
+        """Perform a run
+        Returns:
+            response dictionary
+        """
+        runner = self.runner(filename)
+        runner.run_start = time.strftime("%Y.%m.%d_%H.%M.%S")
+        start = time.time()
+        cpu_start = cpu_seconds()
+        try:
+            result = runner.run()
+        finally:
+            # Browser goes back to the pool even if the run ended without
+            # logging out (error or failed login), so the next run gets it
+            try:
+                runner.eric.close()
+            except Exception:
+                pass
+        cpu_end = cpu_seconds()
+        return {"status": "ok",
+                "exit_code": 1 if runner.sla_breaches else 0,
+                "duration": time.time() - start,
+                "cpu": None if cpu_start is None else cpu_end - cpu_start,
+                "sla_breaches": len(runner.sla_breaches),
+                "result": result}
+
+    def close(self):
+        """Stop listening and close the warm browser"""
+        self.server_close()
+        self.pool.close()
+
+
+class RunRequestHandler(SocketServer.StreamRequestHandler):
+    """Handles one JSON line request"""
+    def handle(self):
+        service = self.server
+        try:
+            request = json.loads(self.rfile.readline())
+            command = request.get("command", "run")
+            if command == "ping":
+                response = {"status": "ok"}
+            elif command == "stop":
+                service.stopping = True
+                response = {"status": "ok"}
+            else:
+                print time.strftime("%d-%m-%Y %H:%M:%S"), "- run", request["filename"]
+                response = service.run(request["filename"])
+        except Exception as e:
+            response = {"status": "error", "exit_code": 2,
+                        "error": type(e).__name__ + ": " + str(e)}
+        self.wfile.write(json.dumps(response, default=str) + "\n")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Long-lived spreadsheet_run.py service")
+    parser.add_argument("filenames", nargs="*", default=["eric_data.xlsx"],
+                        help="spreadsheet(s) to prepare (ask for logins) at start")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--visible", action="store_true", help="browser not headless")
+    parser.add_argument("--session-cache", action="store_true", help="reuse Portal logins")
+    parser.add_argument("--trace", action="store_true", help="write spans to eric_trace.jsonl")
+    parser.add_argument("--store", action="store_true", help="keep timings in results_store")
+    parser.add_argument("--calibrate", action="store_true", help="measure Webdriver overhead")
+    args = parser.parse_args()
+
+    session_cache = tracer = store = None
+    if args.session_cache:
+        from session_cache import SessionCache
+        session_cache = SessionCache()
+    if args.trace:
+        import tracing
+        tracer = tracing.Tracer([tracing.JsonlSink("eric_trace.jsonl")])
+    if args.store:
+        from results_store import ResultsStore
+        store = ResultsStore()
+
+    service = RunnerService(port=args.port, headless=not args.visible,
+                            session_cache=session_cache, tracer=tracer, store=store,
+                            calibrate=args.calibrate)
+    for filename in args.filenames:
+        service.runner(filename)
+    print "Runner service listening on port", args.port
+    try:
+        while not service.stopping:
+            service.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        if tracer:
+            tracer.close()
+    print "Finished"
@@ -0,0 +1,258 @@
+"""
+Compiles the spreadsheet Scenario tab into an executable plan.
+
+The Scenario rows are read once and checked before any browser starts.
+As well as the basic actions (login, dlogin, search, select, view, viewall,
+logout, newline) the plan supports blocks, each closed by an "end" row:
+
+    repeat  | N              - repeat the enclosed steps N times
+    foreach | a, b, c        - repeat the enclosed steps for each item,
+                               with {item} in their parameters replaced
+    sub     | name           - define named sub-scenario (not run in place)
+    call    | name           - run named sub-scenario here
+
+Rows with a blank action are ignored (they can hold notes).
+Steps are produced lazily, so long loops don't use extra memory.
+"""
+
+from collections import namedtuple
+
+# Actions performed by the runner
+ACTIONS = ("login", "dlogin", "search", "select", "view", "viewall", "logout", "newline")
+# Actions that open a block (closed by "end")
+BLOCKS = ("repeat", "foreach", "sub")
+
+Step = namedtuple("Step", "action parameter parameter2 parameter3 row")
+Block = namedtuple("Block", "kind parameter body row")
+
+
+class ScenarioError(Exception):
+    """Raised when the scenario is invalid. errors attribute lists
+    each problem found (with row number).
+    """
+    def __init__(self, errors):
+        Exception.__init__(self, "Invalid scenario:\n" + "\n".join(errors))
+        self.errors = errors
+
+
+def read_rows(ws, first_row, last_row=None):
+    """Read scenario rows from worksheet
+    Args:
+        ws - openpyxl worksheet
+        first_row - first scenario row (below headings)
+        last_row - (optional) last row to read. Defaults to last used row.
+    Returns:
+        list of Step (action lower-case str), blank actions left out
+    """
+    if last_row is None:
+        last_row = ws.max_row
+    steps = []
+    for row in range(first_row, last_row + 1):
+        # make action lower-case str
+        action = str(ws.cell(row=row, column=1).value).strip().lower()
+        if action in ("none", ""):
+            continue
+        steps.append(Step(action,
+                          ws.cell(row=row, column=2).value,
+                          ws.cell(row=row, column=3).value,
+                          ws.cell(row=row, column=4).value,
+                          row))
+    return steps
+
+
+def split_items(parameter):
+    """foreach parameter as list of str items"""
+    return [item.strip() for item in unicode(parameter if parameter is not None else "").split(",")
+            if item.strip()]
+
+
+def report_numbers(parameter):
+    """Report positions (from 0) for viewall parameter - comma separated
+    report numbers 1 to 4, or blank for all four
+    Raises:
+        ValueError if not valid
+    """
+    if parameter in (None, ""):
+        return [0, 1, 2, 3]
+    numbers = [int(float(item)) for item in split_items(parameter)]
+    if not numbers or any(number not in (1, 2, 3, 4) for number in numbers):
+        raise ValueError("report numbers must be 1 to 4")
+    return [number - 1 for number in numbers]
+
+
+def substitute(step, item):
+    """Copy of step with {item} in its parameters replaced"""
+    values = [value.replace("{item}", item) if isinstance(value, basestring) else value
+              for value in (step.parameter, step.parameter2, step.parameter3)]
+    return Step(step.action, values[0], values[1], values[2], step.row)
+
+
+class Plan(object):
+    """Validated scenario - main steps plus named sub-scenarios"""
+    def __init__(self, main, subs):
+        """
+        Args:
+            main - tuple of Step/Block
+            subs - dictionary of name: tuple of Step/Block
+        """
+        self._main = main
+        self._subs = dict(subs)
+
+    @property
+    def sub_names(self):
+        return sorted(self._subs)
+
+    def has_sub(self, name):
+        return name in self._subs
+
+    def steps(self, sub=None):
+        """Generate steps in execution order, expanding blocks
+        Args:
+            sub - (optional) name of sub-scenario to run instead of main
+        """
+        nodes = self._subs[sub] if sub else self._main
+        return self._expand(nodes, None)
+
+    def _expand(self, nodes, item):
+        for node in nodes:
+            if isinstance(node, Step):
+                if node.action == "call":
+                    for step in self._expand(self._subs[node.parameter], item):
+                        yield step
+                elif item is None:
+                    yield node
+                else:
+                    yield substitute(node, item)
+            elif node.kind == "repeat":
+                for _ in range(int(node.parameter)):
+                    for step in self._expand(node.body, item):
+                        yield step
+            elif node.kind == "foreach":
+                for each in split_items(node.parameter):
+                    for step in self._expand(node.body, each):
+                        yield step
+
+    def count(self, sub=None):
+        """Number of steps that steps() will produce (without expanding)"""
+        nodes = self._subs[sub] if sub else self._main
+        return self._count(nodes)
+
+    def _count(self, nodes):
+        total = 0
+        for node in nodes:
+            if isinstance(node, Step):
+                total += self._count(self._subs[node.parameter]) if node.action == "call" else 1
+            elif node.kind == "repeat":
+                total += int(node.parameter) * self._count(node.body)
+            elif node.kind == "foreach":
+                total += len(split_items(node.parameter)) * self._count(node.body)
+        return total
+
+
+def compile_plan(rows):
+    """Build Plan from scenario rows, checking it is valid
+    Args:
+        rows - list of Step as from read_rows
+    Returns:
+        Plan
+    Raises:
+        ScenarioError listing all problems found
+    """
+    errors = []
+    main = []
+    subs = {}
+    # Stack of (Block kind, parameter, row, list of body nodes)
+    stack = []
+    calls = []
+
+    def current():
+        return stack[-1][3] if stack else main
+
+    for step in rows:
+        where = "Row {}: ".format(step.row)
+        if step.action in BLOCKS:
+            if step.action == "repeat":
+                try:
+                    if int(step.parameter) < 1:
+                        raise ValueError
+                except (TypeError, ValueError):
+                    errors.append(where + "repeat needs a whole number above 0")
+            elif step.action == "foreach" and not split_items(step.parameter):
+                errors.append(where + "foreach needs a comma-separated list of items")
+            elif step.action == "sub":
+                if stack:
+                    errors.append(where + "sub can't be inside another block")
+                if not step.parameter:
+                    errors.append(where + "sub needs a name")
+                elif step.parameter in subs or any(s[1] == step.parameter for s in stack):
+                    errors.append(where + "sub '{}' defined twice".format(step.parameter))
+            stack.append((step.action, step.parameter, step.row, []))
+        elif step.action == "end":
+            if not stack:
+                errors.append(where + "end without repeat/foreach/sub")
+                continue
+            kind, parameter, row, body = stack.pop()
+            if kind == "sub":
+                subs[parameter] = tuple(body)
+            else:
+                current().append(Block(kind, parameter, tuple(body), row))
+        elif step.action == "call":
+            calls.append(step)
+            current().append(step)
+        elif step.action in ACTIONS:
+            if step.action in ("login", "dlogin") and not step.parameter:
+                errors.append(where + step.action + " needs a url")
+            if step.action in ("search", "select") and step.parameter in (None, ""):
+                errors.append(where + step.action + " needs a parameter")
+            if step.action == "select" and "{item}" not in unicode(step.parameter):
+                try:
+                    if int(step.parameter) not in (1, 2, 3, 4):
+                        raise ValueError
+                except (TypeError, ValueError):
+                    errors.append(where + "select needs report number 1 to 4")
+            if step.action == "viewall" and step.parameter not in (None, "") \
+                    and "{item}" not in unicode(step.parameter):
+                try:
+                    report_numbers(step.parameter)
+                except ValueError:
+                    errors.append(where + "viewall needs report numbers 1 to 4 (e.g. 1, 3)")
+            current().append(step)
+        else:
+            errors.append(where + "unknown action '{}'".format(step.action))
+
+    for kind, _, row, _ in stack:
+        errors.append("Row {}: {} has no matching end".format(row, kind))
+    for step in calls:
+        if step.parameter not in subs:
+            errors.append("Row {}: call to unknown sub '{}'".format(step.row, step.parameter))
+    if not errors:
+        errors.extend(check_recursion(subs))
+    if errors:
+        raise ScenarioError(errors)
+    return Plan(tuple(main), subs)
+
+
+def check_recursion(subs):
+    """Errors for sub-scenarios that end up calling themselves"""
+    def called(nodes):
+        for node in nodes:
+            if isinstance(node, Step):
+                if node.action == "call":
+                    yield node.parameter
+            else:
+                for name in called(node.body):
+                    yield name
+
+    errors = []
+    for name in subs:
+        seen = set()
+        pending = list(called(subs[name]))
+        while pending:
+            callee = pending.pop()
+            if callee == name:
+                errors.append("sub '{}' calls itself".format(name))
+                break
+            if callee not in seen:
+                seen.add(callee)
+                pending.extend(called(subs[callee]))
+    return errors
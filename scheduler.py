@@ -2,8 +2,13 @@ import sched
 import time
 import datetime
 import subprocess
+import socket
 import os
 
+# Run requests for the long-lived runner service
+import runner_service
+from job_scheduler import NOT_RUNNING
+
 """
 Scheduler that runs specified Python script at chosen intervals
 defined by time(s)of day and days to run.
@@ -18,6 +23,11 @@ v0.2 -
     (iii) Also more than one script can be scheduled in the same run.
     (iv) Days to run now a list, run_days, rather than integer.
     (iii) Optional log file kept. Uses log_print() function
+v0.3 -
+    (i) spreadsheet_run.py runs are sent to the runner service
+    (runner_service.py) when it's running, otherwise started as before.
+    (ii) Finish times and exit codes logged too.
+    (iii) Spreadsheet filename can be given with the script.
 """
 
 def from_now(interval=5, count=2):
@@ -37,7 +47,7 @@ def from_now(interval=5, count=2):
     return run_times
 
 
-def run_script(script):
+def run_script(script, filename=None):
     """Runs chosen python script (in own separate interpreter instance).
     When full path supplied, working directory for
     the script set to the path's location. This is to help it find files
@@ -46,6 +56,9 @@ def run_script(script):
         script (str) - name of script to run, e.g. test1.py
         If in same folder as present script can just be filename (e.g. "test1.py")
         otherwise specify full path (r"E:\scripts\test1.py")
+        filename (str) - optional command-line argument for script, e.g.
+        spreadsheet for spreadsheet_run.py (relative to script's folder).
+        None for script's default (eric_data.xlsx for spreadsheet_run.py)
     """
     # get script's directory, used to set cwd argument.
     path = os.path.dirname(script)
@@ -53,10 +66,34 @@ def run_script(script):
     if path == "":
         path = None
     log_print(time.strftime("%d-%m-%Y %H:%M:%S")+" - triggered "+os.path.basename(script))
-    subprocess.call(["python"]+[script], cwd=path)
-
-
-def create_events(script, run_times, run_days=None):
+    # spreadsheet_run.py runs go to the runner service if it's running
+    if RUNNER_PORT and os.path.basename(script) == "spreadsheet_run.py":
+        spreadsheet = os.path.abspath(os.path.join(path or "", filename or "eric_data.xlsx"))
+        try:
+            response = runner_service.request_run(spreadsheet, RUNNER_PORT)
+        except socket.timeout:
+            # Service still running it - don't start a second run
+            log_print(time.strftime("%d-%m-%Y %H:%M:%S")+" - no response from runner service for "
+                      +os.path.basename(script)+" (timed out)")
+            return
+        except socket.error as e:
+            if e.errno not in NOT_RUNNING:
+                # Service may have started the run - don't start a second one
+                log_print(time.strftime("%d-%m-%Y %H:%M:%S")+" - runner service error for "
+                          +os.path.basename(script)+" ("+str(e)+")")
+                return
+            log_print("Runner service not available - starting "+os.path.basename(script))
+        else:
+            log_print(time.strftime("%d-%m-%Y %H:%M:%S")+" - finished "+os.path.basename(script)
+                      +" (service) exit code "+str(response.get("exit_code"))
+                      +" "+response.get("error", ""))
+            return
+    exit_code = subprocess.call(["python"]+[script]+([filename] if filename else []), cwd=path)
+    log_print(time.strftime("%d-%m-%Y %H:%M:%S")+" - finished "+os.path.basename(script)
+              +" exit code "+str(exit_code))
+
+
+def create_events(script, run_times, run_days=None, filename=None):
     """
     Creates events that call specified script at specified times
     throughout day range.
@@ -66,6 +103,7 @@ def create_events(script, run_times, run_days=None):
         run_times:  times of day to run as list of tuple (hour,minute) pairs e.g. [(1,0),(2,45),(3,15)]
         run_days: (list of ints) - days on which to run, starting from today.
         e.g. [0,1,2] for today,tomorrow and day after.
+        filename: optional command-line argument for script (see run_script())
     """
     if not run_days:
         run_days = [0]
@@ -82,7 +120,7 @@ def create_events(script, run_times, run_days=None):
             schedule_date_time = datetime.datetime.combine(run_date, schedule_time)
             log_print(schedule_date_time.strftime("%d-%m-%Y %H:%M:%S")+" - "+os.path.basename(script))
             # Create the scheduled event which calls run_script()function
-            scheduler.enterabs(time.mktime(schedule_date_time.timetuple()), 1, run_script, (script,))
+            scheduler.enterabs(time.mktime(schedule_date_time.timetuple()), 1, run_script, (script, filename))
 
 
 def log_print(text):
@@ -103,6 +141,9 @@ scheduler = sched.scheduler(time.time, time.sleep)
 # Set logfile name, set to "" for no logging
 LOGFILE = "scheduler_log.txt"
 
+# Port of runner service, set to None to always start a separate process
+RUNNER_PORT = runner_service.DEFAULT_PORT
+
 # Record/show initial info
 log_print("*** Python Script Run Scheduler - New Run "+time.strftime("(%d-%m-%Y %H:%M:%S)")+" ***\n")
 log_print("Creating Scheduled Events")
@@ -123,8 +164,10 @@ run_times = from_now(interval=5, count=3)
 
 # Days on which to run from the present day, i.e. 0 for today, 1 for tomorrow, 2 for the day after that, e.g. [0,2,4].
 run_days = [0] #[0,2,4]
+# Spreadsheet for spreadsheet_run.py (None for eric_data.xlsx)
+filename = None
 # Create events
-create_events(script, run_times, run_days)
+create_events(script, run_times, run_days, filename)
 
 # ********************
 # * End of Test Data *
@@ -0,0 +1,89 @@
+"""
+Cache of authenticated Portal sessions.
+
+After a successful Portal login, Eric can save the browser cookies here
+(keyed by Portal url and username). A later run can put them into a fresh
+browser and skip the login form. Entries expire after max_age seconds and
+are discarded if the Portal no longer accepts them.
+
+The cache file holds live session cookies, so it is only readable by
+its owner (where the platform supports this).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class SessionCache(object):
+    """Cookies of logged-in Portal sessions, saved to a JSON file"""
+    def __init__(self, filename="session_cache.json", max_age=3600):
+        """
+        Args:
+            filename - file used to store the cache
+            max_age - seconds after which a saved session is not reused
+        """
+        self.filename = filename
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(url, username):
+        """Cache key for url/username pair"""
+        return hashlib.sha1((url + "\n" + username).encode("utf-8")).hexdigest()
+
+    def read(self):
+        """Whole cache contents as dictionary (empty if no file)"""
+        try:
+            with open(self.filename) as cache_file:
+                return json.load(cache_file)
+        except (IOError, ValueError):
+            return {}
+
+    def write(self, entries):
+        """Replace cache contents"""
+        temp_name = self.filename + ".tmp"
+        with open(temp_name, "w") as cache_file:
+            json.dump(entries, cache_file)
+        try:
+            os.chmod(temp_name, 0o600)
+        except OSError:
+            pass
+        # os.rename won't replace an existing file on Windows
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        os.rename(temp_name, self.filename)
+
+    def load(self, url, username):
+        """Get saved cookies for url/username
+        Returns:
+            list of cookie dictionaries (as from driver.get_cookies) or
+            None if nothing saved or saved session has expired
+        """
+        with self.lock:
+            entry = self.read().get(self.key(url, username))
+        if not entry or time.time() - entry["saved"] > self.max_age:
+            return None
+        # Leave out cookies that have expired since they were saved
+        now = time.time()
+        return [cookie for cookie in entry["cookies"]
+                if not cookie.get("expiry") or cookie["expiry"] > now]
+
+    def save(self, url, username, cookies):
+        """Save cookies for url/username
+        Args:
+            cookies - list of cookie dictionaries from driver.get_cookies
+        """
+        with self.lock:
+            entries = self.read()
+            entries[self.key(url, username)] = {"saved": time.time(), "cookies": cookies}
+            self.write(entries)
+
+    def discard(self, url, username):
+        """Remove saved session for url/username (e.g. when rejected)"""
+        with self.lock:
+            entries = self.read()
+            if entries.pop(self.key(url, username), None) is not None:
+                self.write(entries)
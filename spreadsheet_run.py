@@ -19,24 +19,53 @@ import os
 import openpyxl
 
 # Generic function timer
-from eric import fn_timer
+from eric import action_timer
 # import eric Webdriver handling
 from eric import Eric
 
 #Write results to Excel files
 import excel_block_write
+# Reuse of Portal logins between runs
+from session_cache import SessionCache
+# Span events for live monitoring
+from timing import ActionTiming
+import tracing
+# Crash-safe results recording
+from results_log import ResultsLog
+import results_log
+# Long-term columnar history (needs pyarrow)
+from results_store import ResultsStore
+# Compressed, de-duplicated report HTML
+from report_store import ReportStore
+# Streaming percentiles and SLA checks
+from quantiles import ActionStats, SLA, evaluate
+# Scenario reading and checking
+from scenario_plan import read_rows, compile_plan, ScenarioError, report_numbers
 
 
 class ExcelRun(object):
-    def __init__(self, filename=""):
+    def __init__(self, filename="", session_cache=None, tracer=None, store=None):
         """
         Uses Selenium to search, select and view Reports in Eric based on
         data from specially formatted spreadsheet.
         Args:
             filename - Excel file with test data
+            session_cache - (optional) session_cache.SessionCache used to
+                reuse Portal logins between runs
+            tracer - (optional) tracing.Tracer that receives a span for
+                each timed Eric action and for the run as a whole
+            store - (optional) results_store.ResultsStore that keeps each
+                timed Eric action for long-term history
         """
         # Selenium runner in Eric
         self.eric = Eric()
+        self.eric.session_cache = session_cache
+        self.tracer = tracer
+        if tracer:
+            tracer.attach(self.eric)
+        self.store = store
+        if store:
+            store.attach(self.eric)
         # Excel filename
         self.filename = filename
         # Row where columns headings are located
@@ -44,8 +73,47 @@ class ExcelRun(object):
         # When True, export details fro any viewed report to Excel file(s)
         # Value can be changed by flag read from spreadsheet data (in self.run)
         self.extract_details = False
+        # excel_block_write.WriteExcel for extracted report details
+        self.report_excel = None
+        # When set (report_store.ReportStore), report HTML is stored there
+        # (once per distinct report) instead of in separate HTML files
+        self.report_store = None
+        # Account most recently searched for
+        self.account = None
+        # (username, password) by url, for logins without them in spreadsheet
+        self.credentials = {}
+        # Set False by a step (failed login) to end the run
+        self.continue_run = True
         # Start date/time (used in results filename creation)
         self.run_start = time.strftime("%Y.%m.%d_%H.%M.%S")
+        # Per-phase breakdown of each timed Eric action, written to Phases tab
+        # Includes browser-side timings (TTFB etc.) captured by Eric
+        # (only kept here when no results log is open)
+        self.phase_rows = []
+        self.eric.capture_page_timing = True
+        self.eric.timing_listeners.append(self.record_phases)
+        # Streaming percentiles per action/report for the run, checked
+        # against the SLA tab (if present) at the end of the run
+        self.stats = ActionStats()
+        self.eric.timing_listeners.append(self.record_stats)
+        # (SLA, measured value, breached) for each SLA breached in last run
+        self.sla_breaches = []
+        # Number of times each view step is timed in "repeat" cache mode
+        # (see Eric.cache_mode)
+        self.repeat_count = 3
+        # Actions in this run during which the load generator itself was
+        # saturated (only counted when Eric is sampling resources)
+        self.saturated_actions = 0
+        # Results are appended to a log as they happen and applied to the
+        # workbook (then saved) every consolidate_interval seconds (None for
+        # only at the end). A log left by a crashed run is applied next run.
+        self.results_log = None
+        self.log_filename = os.path.splitext(filename)[0] + "_results.jsonl"
+        self.consolidate_interval = None
+        # When True, the workbook is kept in memory between runs and only
+        # re-read if the file has been changed by something else
+        self.keep_workbook = False
+        self.saved_mtime = None
 
         #Sub folder for results - setup if not present
         self.results_folder = os.path.join(os.getcwd(),"extracted_details")
@@ -53,13 +121,28 @@ class ExcelRun(object):
         if not os.path.exists(self.results_folder):
             os.makedirs(self.results_folder)
 
-    def run(self, max_scenario_row=60):
+    def run(self, max_scenario_row=None):
         """Run using data from spreadsheet
 
         Args:
-            max_scenario_row - maximum row number for scenario. Execution will
-                stop after maximum row reached.
+            max_scenario_row - (optional) maximum row number for scenario.
+                Defaults to last used row of Scenario tab.
         """
+        run_timing = ActionTiming("run", self.filename)
+        try:
+            result = self.run_scenario(max_scenario_row)
+        except Exception as e:
+            run_timing.stop("error: " + type(e).__name__)
+            raise
+        else:
+            run_timing.stop()
+        finally:
+            if self.tracer:
+                self.tracer.emit(tracing.make_span(run_timing, self.eric.session_id))
+        return result
+
+    def run_scenario(self, max_scenario_row=None):
+        """Perform the run (see run)"""
         # Try to open spreadsheet
         self.open_spreadsheet()
 
@@ -76,6 +159,19 @@ class ExcelRun(object):
         # The results sheet
         rs = self.wb.get_sheet_by_name("Results")
 
+        # Recover results logged by a previous run that didn't finish
+        if os.path.exists(self.log_filename):
+            print "Recovering results from", self.log_filename
+            self.consolidate()
+
+        # Read and check whole scenario before any browser starts
+        try:
+            plan = self.read_plan(ss, max_scenario_row)
+        except ScenarioError as e:
+            print "Excel file:", self.filename
+            print "Ending - " + str(e)
+            return str(e)
+
         # Get the starting row to write_results from
         # Read value recorded in spreadsheet but ensure
         # it is below the heading row
@@ -89,124 +185,288 @@ class ExcelRun(object):
 
         # Sheet starting results column
         results_start_column = 2
-
-        # Iterate through the scenario rows
-        scenario_row = self.heading_row + 1
+        # Cache mode (if set) is written to Results column headed "Mode",
+        # which is added after the last heading if not already present
+        mode_column = self.heading_column(rs, "Mode")
+        add_mode_heading = mode_column is None and bool(self.eric.cache_mode)
+        if add_mode_heading:
+            mode_column = self.last_heading_column(rs) + 1
+
+        # Iterate through the scenario steps
+        self.stats = ActionStats()
+        self.saturated_actions = 0
         results_row = results_start_row
+        # Row the next run starts from (as recorded in C3)
+        next_row = results_start_row
         results_column = results_start_column
-        continue_run = True
-        while continue_run:
-            # Read scenario step from spreadsheet
-            action = ss.cell(row=scenario_row, column=1).value
-            # make action lower-case str
-            action = str(action).lower()
-            # Associated parameters
-            parameter = ss.cell(row=scenario_row, column=2).value
-            # Parameter 2 and 3 currently only used for username/password
-            parameter2 = ss.cell(row=scenario_row, column=3).value
-            parameter3 = ss.cell(row=scenario_row, column=4).value
-
-            # Record run time to spreadsheet
-            rs.cell(row=results_row, column=1).value = time.strftime("%d/%m/%Y - %H:%M:%S")
-
-            # Take action based on step details
-
-            # Login to Eric
-            if action == "login":
-                # Get username and password if not in spreadsheet
-                if not parameter2:
-                    parameter2 = raw_input("Username:")
-                if not parameter3:
-                    parameter3 = getpass.getpass(prompt="Password:")
-
-                rs.cell(row=results_row, column=results_column).value = parameter + " " + parameter2
-                results_column += 1
-                launch_time = self.check_login(parameter2, parameter3, parameter)
-                rs.cell(row=results_row, column=results_column).value = launch_time
-                results_column += 1
-                # Give up if login was unsuccessful
-                if str(launch_time) == "Login Failed":
-                    continue_run = False
-
-            elif action == "dlogin":
-                rs.cell(row=results_row, column=results_column).value = parameter + " " + parameter2
-                self.eric.login_direct(parameter, parameter2)
-                results_column += 2
-
-            # Perform search
-            elif action == "search":
-                rs.cell(row=results_row, column=results_column).value = parameter
-                results_column += 1
-                search_time = self.check_search(parameter)
-                rs.cell(row=results_row, column=results_column).value = search_time
-                results_column += 1
-
-            # Select report
-            elif action == "select":
-                # Record parameter value
-                rs.cell(row=results_row, column=results_column).value = parameter
-                results_column += 1
-                # Check there are reports available to view
-                message, report_names = self.eric.report_list_items()
-                # Get selection time if reports are present
-                if report_names:
-                    select_time = self.check_report_select(parameter)
-                    rs.cell(row=results_row, column=results_column).value = select_time
-                # Write message if reports absent
-                else:
-                    rs.cell(row=results_row, column=results_column).value = "No Reports Present"
-                results_column += 1
-
-            # View report (previously selected)
-            elif action == "view":
-                # See which report is currently selected
-                report_name = self.eric.read_report_choice()
-                # Write report name to spreadsheet
-                rs.cell(row=results_row, column=results_column).value = report_name
-                results_column += 1
-                # If we've a report measure the time it takes to open it
-                if report_name:
-                    view_time = self.check_report_view()
-                else:
-                    view_time = "n/a - no report selected"
-                rs.cell(row=results_row, column=results_column).value = view_time
-                results_column += 1
-
-            # Logout from Eric and end Webdriver session
-            elif action == "logout":
-                # Logout from Eric
-                self.eric.log_out()
-                # Close Webdriver Session
-                self.eric.close()
-
-            # Start new results line
-            elif action == "newline":
-                results_row += 1
-                results_column = results_start_column
-
-            # Advance to next row for next run
-            scenario_row += 1
-
-            # Quit if we're at end
-            if scenario_row > max_scenario_row or not action:
-                continue_run = False
-
-        # Final actions
-        # Update the details of the row reached
-        results_row += 1
-        rs["C3"].value = results_row
-
-        # Save at end
-        self.wb.save(self.filename)
+        self.continue_run = True
+        self.results_log = ResultsLog(self.log_filename)
+        consolidated_at = time.time()
+        if add_mode_heading:
+            self.results_log.cell("Results", self.heading_row, mode_column, "Mode")
+        try:
+            for step in plan.steps():
+                # Stop if previous step ended the run
+                if not self.continue_run:
+                    break
+
+                # Start new results line
+                if step.action == "newline":
+                    results_row += 1
+                    results_column = results_start_column
+                    continue
+
+                # Record run time to spreadsheet
+                self.results_log.cell("Results", results_row, 1,
+                                      time.strftime("%d/%m/%Y - %H:%M:%S"))
+                # Move next run's starting row (C3) past this row as soon as
+                # it is used, so a run ending early (or recovered from its
+                # log) isn't overwritten by the next one
+                if results_row >= next_row:
+                    next_row = results_row + 1
+                    self.results_log.cell("Results", 3, 3, next_row)
+                if mode_column and self.eric.cache_mode:
+                    self.results_log.cell("Results", results_row, mode_column,
+                                          self.eric.cache_mode)
+
+                # Take action based on step details, writing its results
+                for value in self.perform(step):
+                    if value is not None:
+                        self.results_log.cell("Results", results_row, results_column, value)
+                    results_column += 1
+
+                # Periodically apply results to the workbook file
+                if self.consolidate_interval and \
+                        time.time() - consolidated_at >= self.consolidate_interval:
+                    self.consolidate()
+                    self.results_log = ResultsLog(self.log_filename)
+                    consolidated_at = time.time()
+
+            # Final actions
+            # Update the details of the row reached
+            results_row += 1
+            if results_row > next_row:
+                self.results_log.cell("Results", 3, 3, results_row)
+            # Add phase breakdown of this run's actions
+            self.write_phases()
+            # Percentiles and SLA checks
+            self.write_summary()
+        finally:
+            # Save at end (including when ending with an error)
+            self.consolidate()
+            self.results_log = None
+            self.save_reports()
+            if self.store:
+                self.store.flush()
 
         # Quit webdriver (rely on logout action above instead)
         ##self.eric.close()
 
+    # Browser-side timing summary fields recorded in Phases tab
+    page_timing_fields = ["ttfb", "dom_content_loaded", "load_event",
+                          "frame_ttfb", "frame_load_event",
+                          "resource_count", "resource_bytes"]
+
+    # Load generator resource fields (see resource_sampler.py) and headings
+    resource_fields = ["browser_cpu", "browser_rss", "browser_handles",
+                       "driver_cpu", "driver_rss", "driver_handles",
+                       "host_cpu", "mem_available", "saturated"]
+    resource_headings = ["Browser CPU %", "Browser RSS MB", "Browser Handles",
+                         "Driver CPU %", "Driver RSS MB", "Driver Handles",
+                         "Host CPU %", "Memory Available %", "Saturated"]
+
+    # Headings for tabs created when results are consolidated
+    tab_headings = {"Phases": ["Date", "Action", "Parameter", "Total", "Outcome",
+                               "Overhead", "Corrected", "Mode", "Iteration"]
+                              + page_timing_fields
+                              + resource_headings
+                              + ["Wait Polls", "Poll Time", "Phase",
+                                 "Duration (pairs continue to right)"],
+                    "Calibration": ["Date", "Command", "Median", "90th Percentile",
+                                    "Max", "Samples"],
+                    "Summary": ["Date", "Action", "Report", "Count", "Errors", "Mean",
+                                "50th Percentile", "90th Percentile", "99th Percentile", "Max"],
+                    "SLA Results": ["Date", "Action", "Report", "Percentile", "Threshold",
+                                    "Measured", "Breached"]}
+
+    def consolidate(self):
+        """Close results log, apply it to the workbook and save, then
+        remove the log
+        """
+        if self.results_log:
+            self.results_log.close()
+        if os.path.exists(self.log_filename):
+            results_log.consolidate(self.wb, self.log_filename, self.tab_headings)
+            self.wb.save(self.filename)
+            self.saved_mtime = os.path.getmtime(self.filename)
+            os.remove(self.log_filename)
+
+    def heading_column(self, ws, heading):
+        """Column number with heading in heading row (None if not found)"""
+        for column in range(1, (ws.max_column or 0) + 1):
+            value = ws.cell(row=self.heading_row, column=column).value
+            if value is not None and unicode(value).strip().lower() == heading.lower():
+                return column
+        return None
+
+    def last_heading_column(self, ws):
+        """Number of last column with a heading in heading row (0 if none)"""
+        last = 0
+        for column in range(1, (ws.max_column or 0) + 1):
+            if ws.cell(row=self.heading_row, column=column).value not in (None, ""):
+                last = column
+        return last
+
+    def read_plan(self, ss, max_scenario_row=None):
+        """Read scenario sheet and compile it into a plan
+        Args:
+            ss - openpyxl worksheet holding the scenario
+            max_scenario_row - (optional) maximum row number for scenario
+        Returns:
+            scenario_plan.Plan
+        Raises:
+            scenario_plan.ScenarioError if scenario is invalid
+        """
+        return compile_plan(self.read_scenario(ss, max_scenario_row))
+
+    def read_scenario(self, ss, max_scenario_row=None):
+        """Read scenario steps from scenario sheet
+        Args:
+            ss - openpyxl worksheet holding the scenario
+            max_scenario_row - (optional) maximum row number for scenario
+        Returns:
+            list of scenario_plan.Step, one per scenario row with an action.
+            Action is lower-case str.
+        """
+        return read_rows(ss, self.heading_row + 1, max_scenario_row)
+
+    def perform(self, step):
+        """Take action for one scenario step
+        Args:
+            step - scenario_plan.Step
+        Returns:
+            list of values for the step's results cells
+            (None leaves a cell blank)
+        """
+        return self.dispatch[step.action](step)
+
+    @property
+    def dispatch(self):
+        """Step handler for each scenario action"""
+        return {"login": self.do_login,
+                "dlogin": self.do_dlogin,
+                "search": self.do_search,
+                "select": self.do_select,
+                "view": self.do_view,
+                "viewall": self.do_viewall,
+                "logout": self.do_logout,
+                "newline": lambda step: []}
+
+    def do_login(self, step):
+        """Login to Eric"""
+        url, username, password = step.parameter, step.parameter2, step.parameter3
+        # Get username and password if not in spreadsheet
+        # (asked once per url)
+        if not username or not password:
+            if url not in self.credentials:
+                self.credentials[url] = (username or raw_input("Username:"),
+                                         password or getpass.getpass(prompt="Password:"))
+            username, password = self.credentials[url]
+        launch_time = self.check_login(username, password, url)
+        # Give up if login was unsuccessful
+        if str(launch_time) == "Login Failed":
+            self.continue_run = False
+        return [url + " " + username, launch_time]
+
+    def do_dlogin(self, step):
+        """Direct login to Eric with a Firefox profile"""
+        self.eric.login_direct(step.parameter, step.parameter2)
+        return [step.parameter + " " + step.parameter2, None]
+
+    def do_search(self, step):
+        """Perform search"""
+        self.account = step.parameter
+        return [step.parameter, self.check_search(step.parameter)]
+
+    def do_select(self, step):
+        """Select report"""
+        # Check there are reports available to view
+        message, report_names = self.eric.report_list_items()
+        # Get selection time if reports are present
+        if report_names:
+            select_time = self.check_report_select(step.parameter)
+        # Write message if reports absent
+        else:
+            select_time = "No Reports Present"
+        return [step.parameter, select_time]
+
+    def do_view(self, step):
+        """View report (previously selected). In warm cache mode an
+        untimed view comes first, in repeat mode the report is viewed
+        repeat_count times. Only these measured views are recorded with the
+        warm/repeat mode. Results are the report name and time of the
+        first view, so the Results layout is the same in every mode - each
+        view's time is in the Phases tab (with its mode and iteration).
+        """
+        # See which report is currently selected
+        report_name = self.eric.read_report_choice()
+        # If we've a report measure the time it takes to open it
+        if not report_name:
+            return [report_name, "n/a - no report selected"]
+        if self.eric.cache_mode == "warm":
+            self.warm_report_view()
+        views = self.repeat_count if self.eric.cache_mode == "repeat" else 1
+        self.eric.measuring = True
+        try:
+            for iteration in range(1, views + 1):
+                self.eric.iteration = iteration
+                # Report details only extracted from first view
+                view_time = self.check_report_view(extract=iteration == 1)
+                if iteration == 1:
+                    first_time = view_time
+        finally:
+            self.eric.measuring = False
+            self.eric.iteration = 1
+        return [report_name, first_time]
+
+    def warm_report_view(self):
+        """View and close the selected report without reporting a timing,
+        so that the timed view follows a warm-up
+        """
+        self.eric.warming = True
+        try:
+            self.eric.view_report()
+            self.eric.close_report()
+        finally:
+            self.eric.warming = False
+
+    def do_viewall(self, step):
+        """Open several reports at once and wait for all of them
+        Results are the total time then report name/time pairs
+        """
+        message, report_names = self.eric.report_list_items()
+        if not report_names:
+            return [step.parameter, "No Reports Present"]
+        reports = [report for report in report_numbers(step.parameter)
+                   if report < len(report_names)]
+        report_times = self.eric.view_reports(reports)
+        results = [step.parameter or "all", self.eric.last_timing.duration]
+        for name, report_time in report_times:
+            results.extend([name, report_time])
+        self.eric.close_reports()
+        return results
+
+    def do_logout(self, step):
+        """Logout from Eric and end Webdriver session"""
+        self.eric.log_out()
+        self.eric.close()
+        return []
+
     def check_login(self, username, password, url):
         """Login to CCR"""
         login_response = self.eric.login(username, password, url)
         if login_response == 0:
-            launch_time = fn_timer(self.eric.open_eric)
+            launch_time = action_timer(self.eric.open_eric)
         else:
             launch_time = "Login Failed"
         return launch_time
@@ -215,7 +475,7 @@ class ExcelRun(object):
         """Complete Eric search using supplied account number
         and return the time taken for search to conclude.
         """
-        search_time = fn_timer(self.eric.search, account_no)
+        search_time = action_timer(self.eric.search, account_no)
         return search_time
 
     def check_report_select(self, report_id):
@@ -227,20 +487,24 @@ class ExcelRun(object):
         """
         report_no = int(report_id)-1
         if report_no in (0, 1, 2, 3):
-            select_time = fn_timer(self.eric.select_report, report_no)
+            select_time = action_timer(self.eric.select_report, report_no)
         else:
             select_time = "Invalid report_id '{}'".format(report_id)
         return select_time
 
-    def check_report_view(self):
-        """Response time for report to appear after clicking view button"""
+    def check_report_view(self, extract=True):
+        """Response time for report to appear after clicking view button
+        Args:
+            extract - when False report details aren't extracted (whatever
+                extract_details is set to)
+        """
         #Read the current report choice before viewing
         # Also capture "N reports for supplier X" message
         current_choice = self.eric.read_report_choice()
         short_name = current_choice.split(" ")[0]
         supplier, _ = self.eric.report_list_items()
         # View the report
-        view_time = fn_timer(self.eric.view_report)
+        view_time = action_timer(self.eric.view_report)
 
         # Write financial details to Excel file or HTML file if flag set
         # Setup some heading info to write to spreadsheet
@@ -248,19 +512,135 @@ class ExcelRun(object):
         now = time.strftime("%d/%m/%Y - %H:%M:%S")
         info = [[supplier, now, url]]
         # Read details from the report
-        if self.extract_details in ("html", "both"):
-            # Get report content as page source
-            details = self.eric.get_report_details()
+        # Page source and/or individual cells fetched in one pass
+        get_source = extract and self.extract_details in ("html", "both")
+        get_cells = extract and self.extract_details in ("exce", "both")
+        if get_source or get_cells:
+            details = self.eric.get_report_details(get_source=get_source,
+                                                   get_cells=get_cells)
+        if get_source and self.report_store:
+            self.report_store.put(details["source"], run=self.run_start,
+                                  account=self.account, report=short_name, url=url)
+        elif get_source:
             self.html_report_write(info, details["source"], short_name+"_source_")
-        if self.extract_details in ("exce", "both"):
-            # Get report content as individual cells
-            details = self.eric.get_report_details(get_cells=True)
+        if get_cells:
             self.excel_report_write(info, details["cells"], short_name)
 
         # Close the Eric report after viewing (not timed currently)
         self.eric.close_report()
         return view_time
 
+    def record_phases(self, timing):
+        """Keep phase breakdown of completed Eric action
+        Args:
+            timing - timing.ActionTiming of the action
+        """
+        row = [time.strftime("%d/%m/%Y - %H:%M:%S", time.localtime(timing.timestamp)),
+               timing.action, timing.parameter, timing.duration, timing.outcome,
+               timing.overhead, timing.corrected_duration, timing.mode, timing.iteration]
+        # Browser-side figures (ms), blank if not captured
+        summary = {}
+        if timing.page_timing:
+            summary = timing.page_timing["summary"]
+        for key in self.page_timing_fields:
+            row.append(summary.get(key))
+        # Load generator resources (peaks during action), blank if not sampled
+        resources = timing.resources or {}
+        for key in self.resource_fields:
+            row.append(resources.get(key))
+        if resources.get("saturated"):
+            self.saturated_actions += 1
+        # Polling overhead within the action's waits
+        row.extend(timing.wait_overhead())
+        for phase, duration in timing.phase_durations():
+            row.extend([phase, duration])
+        if self.results_log:
+            self.results_log.append("Phases", row)
+        else:
+            self.phase_rows.append(row)
+
+    def stop_phase_recording(self):
+        """Stop keeping phase breakdowns of Eric actions. For runners that
+        perform steps without a results log (load, arrival and sweep
+        modes), which would otherwise keep every breakdown in memory.
+        """
+        if self.record_phases in self.eric.timing_listeners:
+            self.eric.timing_listeners.remove(self.record_phases)
+
+    def write_phases(self):
+        """Log any phase breakdowns not yet logged, plus calibration
+        results, for the Phases tab (created if not already present)
+        """
+        for row in self.phase_rows:
+            self.results_log.append("Phases", row)
+        self.phase_rows = []
+        # Webdriver command cost distributions from calibration (if used)
+        if self.eric.calibrator:
+            self.write_calibration()
+
+    def write_calibration(self):
+        """Log Webdriver command costs from each calibration for
+        Calibration tab (created if not already present)
+        """
+        for when, summary in self.eric.calibrator.history:
+            date = time.strftime("%d/%m/%Y - %H:%M:%S", time.localtime(when))
+            for command, costs in sorted(summary.items()):
+                self.results_log.append("Calibration",
+                                        [date, command, costs["median"], costs["p90"],
+                                         costs["max"], costs["samples"]])
+        self.eric.calibrator.history = []
+
+    def record_stats(self, timing):
+        """Add completed Eric action to this run's percentiles"""
+        self.stats.record(timing)
+
+    def read_slas(self):
+        """SLAs from SLA tab (if present) - Action, Report (blank for all),
+        Percentile (e.g. p90 or max) and Threshold (seconds) columns,
+        headings in row 1
+        Returns:
+            list of quantiles.SLA
+        """
+        slas = []
+        if "SLA" not in self.wb.sheetnames:
+            return slas
+        ws = self.wb["SLA"]
+        for row in range(2, ws.max_row + 1):
+            action, report, percentile, threshold = [ws.cell(row=row, column=column).value
+                                                     for column in range(1, 5)]
+            if not action or threshold is None:
+                continue
+            # Report numbers may be read as floats
+            if isinstance(report, float):
+                report = int(report)
+            slas.append(SLA(str(action).strip().lower(), report, percentile or "p90",
+                            float(threshold)))
+        return slas
+
+    def write_summary(self):
+        """Log this run's percentiles for the Summary tab, then check
+        SLAs, logging results for the SLA Results tab and printing breaches.
+        Actions during which the load generator was saturated are counted
+        in the Summary tab too.
+        """
+        date = time.strftime("%d/%m/%Y - %H:%M:%S")
+        for row in self.stats.summary_rows():
+            self.results_log.append("Summary", [date] + row)
+        self.sla_breaches = []
+        for sla, value, breached in evaluate(self.stats, self.read_slas()):
+            self.results_log.append("SLA Results", [date, sla.action, sla.report, sla.percentile,
+                                                    sla.threshold, value, breached])
+            if breached:
+                self.sla_breaches.append((sla, value, breached))
+                print "SLA breached: {} {} {} {:.3f}s > {}s".format(
+                    sla.action, sla.report or "", sla.percentile, value, sla.threshold)
+        # Flag runs where our own machine may have slowed the timings
+        if self.saturated_actions:
+            self.results_log.append("Summary", [date, "load generator saturated", None,
+                                                self.saturated_actions])
+            print "Load generator saturated during {} action(s) - " \
+                  "see Phases tab".format(self.saturated_actions)
+
     def html_report_write(self, info, details, report_name):
         """Write extracted financial statement content to an HTML file
         Args:
@@ -281,7 +661,7 @@ class ExcelRun(object):
             html_file.write("</pre> <hr>\n\n")
 
             # Write each report contents to the file
-            html_file.write(details+"\n")
+            html_file.write(details.encode("utf-8")+"\n")
 
     def excel_report_write(self, info, details, tab_name="Report"):
         """Write extracted financial statement content to an Excel file
@@ -291,20 +671,37 @@ class ExcelRun(object):
                     (as extracted by self.eric.examine_report_details)
             tab_name - (optional) name of Excel tab to write to
         """
-        excel_filename = "Reports_" + self.run_start + ".xlsx"
-        excel_path = os.path.join(self.results_folder, excel_filename)
-        excel = excel_block_write.WriteExcel(excel_path)
+        # One workbook per run, saved once at the end (see save_reports)
+        if self.report_excel is None:
+            excel_filename = "Reports_" + self.run_start + ".xlsx"
+            excel_path = os.path.join(self.results_folder, excel_filename)
+            self.report_excel = excel_block_write.WriteExcel(excel_path)
+        excel = self.report_excel
+        # Same report viewed again goes below the previous one
+        top_row = excel.next_free_row(tab_name)
+        if top_row > 1:
+            top_row += 1
         # Write info text to top row
-        excel.write_block(info, top_row=1, tab_name=tab_name, highlight_rows=[0])
+        excel.write_block(info, top_row=top_row, tab_name=tab_name, highlight_rows=[0])
         # Write report details to further rows
-        start_row = 3
+        start_row = top_row + 2
         for item in details:
             excel.write_block(item, start_row, tab_name=tab_name)
-            excel.save()
             start_row = start_row + 1 + len(item)
 
+    def save_reports(self):
+        """Save report details workbook (if any reports were written)"""
+        if self.report_excel is not None:
+            self.report_excel.save()
+            self.report_excel = None
+
     def open_spreadsheet(self):
-        """Open test data spreadsheet"""
+        """Open test data spreadsheet (or, if keep_workbook is set, reuse
+        the workbook from the last run if the file is unchanged since saved)
+        """
+        if self.keep_workbook and self.saved_mtime is not None and \
+                os.path.exists(self.filename) and os.path.getmtime(self.filename) == self.saved_mtime:
+            return
         try:
             self.wb = openpyxl.load_workbook(filename=self.filename)
         # Give up if fails
@@ -321,9 +718,54 @@ if __name__ == "__main__":
     # Default filename
     filename = "eric_data.xlsx"
     # Get filename from command-line arg if supplied
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
-
-    go = ExcelRun(filename=filename)
+    # (options starting -- are handled separately)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if args:
+        filename = args[0]
+    # --session-cache reuses saved Portal logins
+    session_cache = None
+    if "--session-cache" in sys.argv:
+        session_cache = SessionCache()
+
+    # --trace writes span events to eric_trace.jsonl
+    tracer = None
+    if "--trace" in sys.argv:
+        tracer = tracing.Tracer([tracing.JsonlSink("eric_trace.jsonl")])
+
+    # --store keeps timings in columnar store (results_store folder)
+    store = None
+    if "--store" in sys.argv:
+        store = ResultsStore()
+
+    go = ExcelRun(filename=filename, session_cache=session_cache, tracer=tracer,
+                  store=store)
+    # --calibrate measures Webdriver overhead (Phases/Calibration tabs)
+    go.eric.calibrate = "--calibrate" in sys.argv
+    # --resources samples browser/driver CPU, memory and handles (Phases tab)
+    go.eric.sample_resources = "--resources" in sys.argv
+    # Cache measurement mode: --cold (new browser, cache disabled),
+    # --warm (untimed view before each timed view) or --repeat=N
+    # (each view timed N times)
+    if "--cold" in sys.argv:
+        go.eric.cache_mode = "cold"
+    elif "--warm" in sys.argv:
+        go.eric.cache_mode = "warm"
+    for arg in sys.argv:
+        if arg.startswith("--repeat"):
+            go.eric.cache_mode = "repeat"
+            if "=" in arg:
+                value = arg.split("=", 1)[1]
+                if not value.isdigit() or int(value) < 1:
+                    print "--repeat needs a whole number of views, 1 or more: " + arg
+                    sys.exit(2)
+                go.repeat_count = int(value)
+    # --report-store keeps report HTML in content-addressed store
+    if "--report-store" in sys.argv:
+        go.report_store = ReportStore()
     go.run()
+    if tracer:
+        tracer.close()
     print "Finished"
+    # Non-zero exit status when an SLA was breached (for scheduled runs)
+    if go.sla_breaches:
+        sys.exit(1)
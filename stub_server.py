@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+"""
+Local stand-in for the LAA Portal and Eric.
+
+Serves pages with the features that eric.py relies on - Portal login forms
+(new and old), "Logged in as:" and the MI link, the tableBoxInd search,
+tableBoxIndHalf2 results, blockingDiv "Please Wait" message,
+ReportDetailsForm, the report window with its reportContent iframe and
+the logout pages - so the harness can be exercised and benchmarked without
+the real services.
+
+Each endpoint can be given a latency (plus random jitter) and the report
+table sizes can be set, so harness overhead can be measured precisely and
+load modes can be run at scale.
+
+Urls:
+    /portal                 new Portal login (title "LAA Online Portal")
+    /portal/old             old Portal login
+    /eric/AutoLoginServlet  direct login to Eric (as Eric.login_direct)
+
+Login fails for password "bad". Searches for accounts starting "X" find
+no reports. Report 4 ("Financial statement summary") is an empty report.
+"""
+
+import argparse
+import cgi
+import random
+import threading
+import time
+import urllib
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+REPORT_NAMES = ["Civil financial statement",
+                "Criminal financial statement",
+                "Family mediation financial statement",
+                "Financial statement summary"]
+
+# Endpoints that latency can be set for
+ENDPOINTS = ("portal", "login", "open", "search", "select", "view", "report", "logout")
+
+SHOW_BLOCKER = "document.getElementById('blockingDiv').style.display='block';"
+HIDE_BLOCKER = "document.getElementById('blockingDiv').style.display='none';"
+
+
+def page(title, body):
+    """Complete HTML page"""
+    return ("<!DOCTYPE html>\n<html><head><title>{}</title></head>\n"
+            "<body>\n{}\n</body></html>\n").format(cgi.escape(title), body)
+
+
+def blocking_div(shown=False):
+    """"Please Wait" message as used by Eric"""
+    display = "block" if shown else "none"
+    return '<div id="blockingDiv" style="display:{}">Please Wait</div>'.format(display)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handles requests for StubServer (settings from self.server)"""
+    protocol_version = "HTTP/1.1"
+    # Buffer each response so headers and body go out together
+    # (avoids Nagle/delayed-ACK stalls on kept-alive connections)
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_GET(self):
+        self.route()
+
+    def do_POST(self):
+        self.route()
+
+    def route(self):
+        parts = urlparse.urlsplit(self.path)
+        self.query = dict(urlparse.parse_qsl(parts.query))
+        if self.command == "POST":
+            length = int(self.headers.getheader("content-length") or 0)
+            self.query.update(urlparse.parse_qsl(self.rfile.read(length)))
+        self.cookies = {}
+        for item in (self.headers.getheader("cookie") or "").split(";"):
+            name, _, value = item.strip().partition("=")
+            if name:
+                self.cookies[name] = value
+        routes = {"/portal": self.portal,
+                  "/portal/old": self.portal_old,
+                  "/portal/login": self.portal_login,
+                  "/portal/home": self.portal_home,
+                  "/portal/logout": self.portal_logout,
+                  "/eric/": self.eric_open,
+                  "/eric/AutoLoginServlet": self.eric_open,
+                  "/eric/search": self.eric_search,
+                  "/eric/select": self.eric_select,
+                  "/eric/report": self.eric_report,
+                  "/eric/report/content": self.eric_report_content,
+                  "/eric/logout": self.eric_logout}
+        handler = routes.get(parts.path)
+        if handler:
+            handler()
+        else:
+            self.respond(page("Not Found", "<h1>Not Found</h1>"), status=404)
+
+    def respond(self, body, status=200, headers=()):
+        body = body.encode("utf-8") if isinstance(body, unicode) else body
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def redirect(self, location, headers=()):
+        self.respond("", status=303, headers=[("Location", location)] + list(headers))
+
+    # Portal
+
+    def portal(self):
+        self.server.delay("portal")
+        body = ('<form method="post" action="/portal/login">'
+                '<input name="username"> <input name="password" type="password">'
+                '<button class="button-start" type="submit">Sign in</button></form>')
+        self.respond(page("LAA Online Portal", body))
+
+    def portal_old(self):
+        self.server.delay("portal")
+        body = ('<p>By logging in to this Portal you agree to the terms of use.</p>'
+                '<form method="post" action="/portal/login">'
+                '<input name="ssousername"> <input name="password" type="password">'
+                '<input name="submit" type="submit" value="Login"></form>')
+        self.respond(page("Portal", body))
+
+    def portal_login(self):
+        self.server.delay("login")
+        username = self.query.get("username") or self.query.get("ssousername", "")
+        if self.query.get("password") == "bad":
+            self.respond(page("Portal", "<p>An incorrect Username or Password was specified</p>"))
+            return
+        session = urllib.quote(username or "user")
+        self.redirect("/portal/home", [("Set-Cookie", "portal_session={}; Path=/".format(session))])
+
+    def portal_home(self):
+        if "portal_session" not in self.cookies:
+            self.redirect("/portal")
+            return
+        self.server.delay("portal")
+        user = cgi.escape(urllib.unquote(self.cookies["portal_session"]))
+        # Opened by script so that Eric's logout can close the window
+        body = ('<p><span>Logged in as: {}</span></p>'
+                '<ul><li><a href="#" onclick="window.open(\'/eric/\'); return false;">'
+                'Management Information (MI)</a></li></ul>'
+                '<p><a href="/portal/logout">Log Out</a></p>').format(user)
+        self.respond(page("LAA Online Portal", body))
+
+    def portal_logout(self):
+        self.server.delay("logout")
+        self.respond(page("LAA Online Portal", '<h1 class="heading-xlarge">Logged Out</h1>'),
+                     headers=[("Set-Cookie", "portal_session=; Path=/; Max-Age=0")])
+
+    # Eric
+
+    def eric_page(self, account=None, report=None):
+        """Main Eric page, optionally with search results and a selected report"""
+        user = cgi.escape(urllib.unquote(self.cookies.get("portal_session", "direct")))
+        parts = ["<h3>Eric - Management Information</h3>", blocking_div(),
+                 '<p><a href="/eric/logout">Log out</a></p>',
+                 '<div class="tableBoxInd"><form method="post" action="/eric/search" '
+                 'onsubmit="{}">'.format(SHOW_BLOCKER),
+                 '<input type="hidden" name="token" value="stub">',
+                 '<input type="text" name="account" value="{}">'.format(cgi.escape(account or "", True)),
+                 '<input type="submit" value="Search"></form></div>']
+        if account is None:
+            parts.append("<ul><li>0 report(s) found for user {}</li></ul>".format(user))
+        elif account.upper().startswith("X"):
+            parts.append("<ul><li>0 report(s) found for {}</li></ul>".format(cgi.escape(account)))
+        else:
+            parts.append('<div class="tableBoxIndHalf2"><p>{} reports found for {}</p>'.format(
+                len(REPORT_NAMES), cgi.escape(account)))
+            for position, name in enumerate(REPORT_NAMES):
+                href = "/eric/select?" + urllib.urlencode({"account": account, "report": position})
+                parts.append('<p><a href="{}" onclick="{}">{}</a></p>'.format(
+                    cgi.escape(href, True), SHOW_BLOCKER, name))
+            parts.append("</div>")
+        if report is not None:
+            href = "/eric/report?" + urllib.urlencode({"account": account, "report": report})
+            parts.append("<h3>{}</h3>".format(REPORT_NAMES[report]))
+            # Browser opens report with script (so Close Report can close it),
+            # form action is there for browserless clients
+            parts.append('<form id="ReportDetailsForm" method="get" action="/eric/report">'
+                         '<input type="hidden" name="account" value="{}">'
+                         '<input type="hidden" name="report" value="{}">'
+                         '<input type="submit" value="View Report" '
+                         'onclick="window.open(\'{}\'); return false;"></form>'.format(
+                             cgi.escape(account, True), report, href))
+        return page("Eric", "\n".join(parts))
+
+    def eric_open(self):
+        self.server.delay("open")
+        self.respond(self.eric_page())
+
+    def eric_search(self):
+        self.server.delay("search")
+        self.respond(self.eric_page(self.query.get("account", "")))
+
+    def eric_select(self):
+        self.server.delay("select")
+        report = int(self.query.get("report", 0))
+        self.respond(self.eric_page(self.query.get("account", ""), report))
+
+    def eric_report(self):
+        self.server.delay("view")
+        report = int(self.query.get("report", 0))
+        src = "/eric/report/content?" + urllib.urlencode(self.query)
+        body = ("<h3>{}</h3>{}"
+                '<div id="buttons2"><a href="#" onclick="window.print(); return false;">Print</a> '
+                '<a href="#" onclick="window.close(); return false;">Close Report</a></div>'
+                '<iframe id="reportContent" src="{}" onload="{}"></iframe>').format(
+                    REPORT_NAMES[report], blocking_div(shown=True), cgi.escape(src, True), HIDE_BLOCKER)
+        self.respond(page("Eric Report", body))
+
+    def eric_report_content(self):
+        self.server.delay("report")
+        if int(self.query.get("report", 0)) == len(REPORT_NAMES) - 1:
+            self.respond(page("Report", "<p>Empty Report</p>"))
+            return
+        self.respond(page("Report", self.server.report_tables))
+
+    def eric_logout(self):
+        self.server.delay("logout")
+        if "portal_session" in self.cookies:
+            # Eric window closes, leaving the Portal window
+            self.respond(page("Eric", "<script>window.close();</script>"))
+        else:
+            self.respond(page("Eric", "<p>You have successfully logged out of EMI application</p>"))
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """Threaded server for stand-in Portal/Eric pages"""
+    daemon_threads = True
+
+    def __init__(self, port=8000, latency=None, jitter=0.0,
+                 tables=4, rows=20, columns=6, verbose=False):
+        """
+        Args:
+            port - port to listen on (0 picks a free port)
+            latency - dictionary of endpoint name: seconds
+                (endpoints listed in ENDPOINTS)
+            jitter - maximum random variation (+/-) in seconds added to latency
+            tables - number of tables in each report
+            rows - rows per report table
+            columns - columns per report table
+            verbose - when True each request is logged
+        """
+        HTTPServer.__init__(self, ("127.0.0.1", port), StubHandler)
+        self.latency = latency or {}
+        self.jitter = jitter
+        self.verbose = verbose
+        self.report_tables = self.make_tables(tables, rows, columns)
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def delay(self, endpoint):
+        """Sleep for endpoint's configured latency plus jitter"""
+        seconds = self.latency.get(endpoint, 0)
+        if self.jitter:
+            seconds += random.uniform(-self.jitter, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def make_tables(tables, rows, columns):
+        """HTML for report tables of given size"""
+        parts = []
+        for table in range(tables):
+            parts.append("<table>")
+            parts.append("<tr>" + "".join("<th>Heading {}</th>".format(column + 1)
+                                          for column in range(columns)) + "</tr>")
+            for row in range(rows):
+                parts.append("<tr>" + "".join("<td>{:,.2f}</td>".format((table + 1) * (row + 1) * (column + 1) * 1.5)
+                                              for column in range(columns)) + "</tr>")
+            parts.append("</table>")
+        return "\n".join(parts)
+
+    def start(self):
+        """Serve in a background thread
+        Returns:
+            base url of server
+        """
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        """Stop background server"""
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Portal/Eric server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", action="append", default=[],
+                        help="endpoint=seconds, endpoints: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--tables", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--columns", type=int, default=6)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    latency = {}
+    for item in args.latency:
+        endpoint, _, seconds = item.partition("=")
+        if endpoint not in ENDPOINTS:
+            parser.error("unknown endpoint: " + endpoint)
+        latency[endpoint] = float(seconds)
+
+    server = StubServer(args.port, latency, args.jitter,
+                        args.tables, args.rows, args.columns, args.verbose)
+    print "Portal:", server.url + "/portal", "(old:", server.url + "/portal/old)"
+    print "Direct login:", server.url + "/eric/AutoLoginServlet"
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+    print "Finished"
@@ -0,0 +1,151 @@
+"""
+High-resolution timing of Eric actions.
+
+Provides a monotonic clock (best available on the host) and ActionTiming,
+which records the total duration of an action plus the named phases
+within it (e.g. element located, click sent, "Please Wait" cleared).
+"""
+
+import sys
+import time
+
+
+def _best_clock():
+    """Pick the most suitable monotonic, high-resolution clock
+    Returns:
+        function returning seconds (float) from an arbitrary start point
+    """
+    # Python 3.3+
+    if hasattr(time, "perf_counter"):
+        return time.perf_counter
+    # Windows - time.clock uses QueryPerformanceCounter
+    if sys.platform == "win32":
+        return time.clock
+    # Linux - clock_gettime(CLOCK_MONOTONIC) via ctypes
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+            import ctypes.util
+
+            class Timespec(ctypes.Structure):
+                _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+            library = ctypes.util.find_library("rt") or ctypes.util.find_library("c")
+            clock_gettime = ctypes.CDLL(library, use_errno=True).clock_gettime
+            clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+            clock_monotonic = 1
+
+            def monotonic():
+                ts = Timespec()
+                if clock_gettime(clock_monotonic, ctypes.pointer(ts)) != 0:
+                    raise OSError(ctypes.get_errno())
+                return ts.tv_sec + ts.tv_nsec * 1e-9
+
+            monotonic()
+            return monotonic
+        except (OSError, AttributeError, TypeError):
+            pass
+    # Last resort - wall clock
+    return time.time
+
+
+# Monotonic high-resolution clock used for all measurements
+clock = _best_clock()
+
+
+class ActionTiming(object):
+    """Timing of a single action, broken down into named phases"""
+    def __init__(self, action, parameter=None):
+        """
+        Args:
+            action - name of action being timed, e.g. "search"
+            parameter - (optional) parameter of the action, e.g. account no.
+        """
+        self.action = action
+        self.parameter = parameter
+        # Wall-clock time of start, for reporting only
+        self.timestamp = time.time()
+        self.start = clock()
+        self.end = None
+        # Phases as (name, seconds since start) in the order they occurred
+        self.phases = []
+        # "ok" or error description once stopped
+        self.outcome = None
+        # Browser-side figures (see page_timing.py), when captured
+        self.page_timing = None
+        # waits.WaitResult of each wait made during the action
+        self.waits = []
+        # Webdriver commands issued during the action (name: count), if counted
+        self.commands = None
+        # Estimated harness (Webdriver command) overhead in seconds, if calibrated
+        self.overhead = None
+        # Cache measurement mode (cold, warm, repeat or None) and
+        # iteration index within it
+        self.mode = None
+        self.iteration = 1
+        # Load generator resource use during the action, if sampled
+        # (see resource_sampler.ResourceSampler.summary)
+        self.resources = None
+
+    def mark(self, phase):
+        """Record that named phase has been reached"""
+        self.phases.append((phase, clock() - self.start))
+
+    def stop(self, outcome="ok"):
+        """Record end of action"""
+        self.end = clock()
+        self.outcome = outcome
+
+    @property
+    def duration(self):
+        """Total duration in seconds (None if not stopped)"""
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    @property
+    def corrected_duration(self):
+        """Duration less estimated harness overhead
+        (None if not stopped or no overhead estimate)
+        """
+        if self.duration is None or self.overhead is None:
+            return None
+        return max(self.duration - self.overhead, 0.0)
+
+    def phase_durations(self):
+        """Duration of each phase measured from the previous phase
+        (or start of action for the first one)
+        Returns:
+            list of (phase name, seconds) tuples
+        """
+        durations = []
+        previous = 0.0
+        for phase, offset in self.phases:
+            durations.append((phase, offset - previous))
+            previous = offset
+        return durations
+
+    def wait_overhead(self):
+        """Total polls and seconds spent polling in this action's waits
+        Returns:
+            (polls, seconds) tuple
+        """
+        return (sum(wait.polls for wait in self.waits),
+                sum(wait.poll_time for wait in self.waits))
+
+    def as_dict(self):
+        """Timing details as dictionary, e.g. for writing to results"""
+        return {"timestamp": self.timestamp,
+                "action": self.action,
+                "parameter": self.parameter,
+                "duration": self.duration,
+                "overhead": self.overhead,
+                "corrected_duration": self.corrected_duration,
+                "commands": self.commands,
+                "outcome": self.outcome,
+                "mode": self.mode,
+                "iteration": self.iteration,
+                "phases": self.phase_durations(),
+                "page_timing": self.page_timing,
+                "resources": self.resources,
+                "waits": [wait.as_dict() for wait in self.waits]}
@@ -0,0 +1,210 @@
+"""
+Tracing and metrics output for Eric actions.
+
+Tracer turns each completed action timing (timing.ActionTiming) into a
+span event - action, parameter, start, end, duration, phases, outcome and
+session id - and passes it to one or more sinks:
+
+    JsonlSink       - appends one JSON line per span to a file
+    StatsdSink      - sends statsd-style UDP timing/counter packets
+    PrometheusSink  - serves Prometheus-format metrics over HTTP
+
+Spans go through a bounded queue handled by a background thread, so
+emitting never blocks the timed code. If the queue is full the span is
+dropped (and counted) rather than waiting.
+"""
+
+import json
+import socket
+import threading
+import time
+import Queue
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+def make_span(timing, session=None, **tags):
+    """Span event dictionary for completed action
+    Args:
+        timing - timing.ActionTiming
+        session - session id
+        tags - any further values to include (e.g. user)
+    """
+    duration = timing.duration or 0.0
+    span = {"action": timing.action,
+            "parameter": timing.parameter,
+            "start": timing.timestamp,
+            "end": timing.timestamp + duration,
+            "duration": timing.duration,
+            "phases": timing.phase_durations(),
+            "outcome": timing.outcome,
+            "session": session}
+    if timing.page_timing:
+        span["page_timing"] = timing.page_timing.get("summary")
+    span.update(tags)
+    return span
+
+
+class Tracer(object):
+    """Passes span events to sinks from a background thread"""
+    def __init__(self, sinks, buffer_size=1000):
+        """
+        Args:
+            sinks - list of sink objects (each with handle(span) and close())
+            buffer_size - maximum spans waiting to be handled
+        """
+        self.sinks = sinks
+        self.queue = Queue.Queue(maxsize=buffer_size)
+        # Spans dropped because queue was full
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.dispatch)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def emit(self, span):
+        """Queue span for sinks without waiting"""
+        try:
+            self.queue.put_nowait(span)
+        except Queue.Full:
+            self.dropped += 1
+
+    def listener(self, session=None, **tags):
+        """Function suitable for Eric.timing_listeners that emits a span
+        for each completed timing
+        Args:
+            session - session id recorded in spans
+            tags - further values recorded in spans
+        """
+        def emit_timing(timing):
+            self.emit(make_span(timing, session, **tags))
+        return emit_timing
+
+    def attach(self, eric, **tags):
+        """Emit spans for every timed action of Eric instance"""
+        eric.timing_listeners.append(self.listener(eric.session_id, **tags))
+
+    def dispatch(self):
+        """Background thread - hand each span to every sink"""
+        while True:
+            span = self.queue.get()
+            if span is None:
+                self.queue.task_done()
+                break
+            for sink in self.sinks:
+                try:
+                    sink.handle(span)
+                except Exception:
+                    # A failing sink must not stop the others (or the run)
+                    pass
+            self.queue.task_done()
+
+    def close(self):
+        """Handle remaining spans, then close sinks"""
+        self.queue.put(None)
+        self.thread.join()
+        for sink in self.sinks:
+            sink.close()
+
+
+class JsonlSink(object):
+    """Appends spans as JSON lines to file"""
+    def __init__(self, filename):
+        self.file = open(filename, "a")
+
+    def handle(self, span):
+        self.file.write(json.dumps(span, default=str) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class StatsdSink(object):
+    """Sends statsd-style metrics over UDP:
+    <prefix>.<action>:<ms>|ms and <prefix>.<action>.<outcome>:1|c
+    """
+    def __init__(self, host="127.0.0.1", port=8125, prefix="eric"):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def handle(self, span):
+        name = "{}.{}".format(self.prefix, span["action"])
+        outcome = (span["outcome"] or "unknown").split(":")[0]
+        lines = ["{}.{}:1|c".format(name, outcome)]
+        if span["duration"] is not None:
+            lines.append("{}:{:.3f}|ms".format(name, span["duration"] * 1000))
+        self.socket.sendto("\n".join(lines), self.address)
+
+    def close(self):
+        self.socket.close()
+
+
+class PrometheusSink(object):
+    """Keeps per-action counters and duration histograms, served in
+    Prometheus text format at http://<host>:<port>/metrics
+    """
+    # Histogram bucket upper bounds in seconds
+    buckets = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 60)
+
+    def __init__(self, port=9108, host="127.0.0.1"):
+        self.lock = threading.Lock()
+        # (action, outcome): count
+        self.counts = {}
+        # action: [bucket counts..., sum, count]
+        self.histograms = {}
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = HTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def handle(self, span):
+        action = span["action"]
+        outcome = (span["outcome"] or "unknown").split(":")[0]
+        with self.lock:
+            key = (action, outcome)
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if span["duration"] is not None:
+                histogram = self.histograms.setdefault(action, [0] * (len(self.buckets) + 2))
+                for position, bound in enumerate(self.buckets):
+                    if span["duration"] <= bound:
+                        histogram[position] += 1
+                histogram[-2] += span["duration"]
+                histogram[-1] += 1
+
+    def render(self):
+        """Metrics in Prometheus text format"""
+        lines = ["# TYPE eric_actions_total counter"]
+        with self.lock:
+            for (action, outcome), count in sorted(self.counts.items()):
+                lines.append('eric_actions_total{{action="{}",outcome="{}"}} {}'.format(
+                    action, outcome, count))
+            lines.append("# TYPE eric_action_duration_seconds histogram")
+            for action, histogram in sorted(self.histograms.items()):
+                for position, bound in enumerate(self.buckets):
+                    lines.append('eric_action_duration_seconds_bucket{{action="{}",le="{}"}} {}'.format(
+                        action, bound, histogram[position]))
+                lines.append('eric_action_duration_seconds_bucket{{action="{}",le="+Inf"}} {}'.format(
+                    action, histogram[-1]))
+                lines.append('eric_action_duration_seconds_sum{{action="{}"}} {}'.format(action, histogram[-2]))
+                lines.append('eric_action_duration_seconds_count{{action="{}"}} {}'.format(action, histogram[-1]))
+        lines.append("# TYPE eric_metrics_time_seconds gauge")
+        lines.append("eric_metrics_time_seconds {}".format(time.time()))
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,160 @@
+"""
+Wait engine that evaluates conditions inside the browser.
+
+Alternative to WebDriverWait lambdas that check driver.page_source, which
+transfers the whole DOM on every poll. Conditions here are small
+JavaScript expressions, each costing one short round-trip per poll.
+Conditions can be combined with | (either) and & (both) and are still
+evaluated in a single call.
+
+Wait also reports how long it waited, how many polls it made and how much
+of the wait was spent in the polls themselves (harness overhead).
+"""
+
+import json
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from timing import clock
+
+
+class Condition(object):
+    """Condition evaluated in the browser as one JavaScript expression"""
+    def __init__(self, expression, description=""):
+        """
+        Args:
+            expression - JavaScript expression, truthy when condition met
+            description - text used in timeout messages
+        """
+        self.expression = expression
+        self.description = description or expression
+
+    def __call__(self, driver):
+        return driver.execute_script("return !!(" + self.expression + ");")
+
+    def __or__(self, other):
+        return Condition("(" + self.expression + ") || (" + other.expression + ")",
+                         self.description + " or " + other.description)
+
+    def __and__(self, other):
+        return Condition("(" + self.expression + ") && (" + other.expression + ")",
+                         self.description + " and " + other.description)
+
+
+def text_present(*texts):
+    """Any of texts present in page HTML (like checking driver.page_source)"""
+    checks = ["document.documentElement.innerHTML.indexOf({}) != -1".format(json.dumps(text))
+              for text in texts]
+    return Condition(" || ".join(checks), "text " + " / ".join(texts))
+
+
+def title_is(title):
+    """Page title matches exactly"""
+    return Condition("document.title == {}".format(json.dumps(title)),
+                     "title " + title)
+
+
+def element_present(css_selector):
+    """Element matching CSS selector exists"""
+    return Condition("document.querySelector({}) !== null".format(json.dumps(css_selector)),
+                     "element " + css_selector)
+
+
+# Expression giving visibility of element "e" - roughly as Webdriver's is_displayed
+_VISIBLE = ("(function(e) {if (!e) {return null;} var s = window.getComputedStyle(e);"
+            " return s.display != 'none' && s.visibility != 'hidden'"
+            " && (e.offsetWidth > 0 || e.offsetHeight > 0);})")
+
+# Returns visibility of element with id arguments[0] (null if absent)
+VISIBILITY_SCRIPT = "return " + _VISIBLE + "(document.getElementById(arguments[0]));"
+
+
+def element_visible(element_id):
+    """Element with id exists and is displayed"""
+    return Condition(_VISIBLE + "(document.getElementById({})) === true".format(json.dumps(element_id)),
+                     element_id + " visible")
+
+
+def element_hidden(element_id):
+    """Element with id exists and is not displayed"""
+    return Condition(_VISIBLE + "(document.getElementById({})) === false".format(json.dumps(element_id)),
+                     element_id + " hidden")
+
+
+def window_count(count):
+    """Number of browser windows equals count (not a browser-side check)"""
+    return lambda driver: len(driver.window_handles) == count
+
+
+class WaitResult(object):
+    """Details of a completed wait"""
+    def __init__(self, name, waited, polls, poll_time):
+        """
+        Args:
+            name - description of the wait
+            waited - total seconds spent waiting
+            polls - number of times condition was evaluated
+            poll_time - seconds spent evaluating condition (harness overhead)
+        """
+        self.name = name
+        self.waited = waited
+        self.polls = polls
+        self.poll_time = poll_time
+
+    def as_dict(self):
+        return {"name": self.name, "waited": self.waited,
+                "polls": self.polls, "poll_time": self.poll_time}
+
+
+class Wait(object):
+    """Polls a condition until it is met or timeout reached"""
+    def __init__(self, driver, timeout=20, poll=0.1):
+        """
+        Args:
+            driver - Webdriver instance
+            timeout - maximum wait in seconds
+            poll - pause between polls in seconds
+        """
+        self.driver = driver
+        self.timeout = timeout
+        self.poll = poll
+        # WaitResult of most recent successful wait
+        self.last_result = None
+
+    def until(self, condition, name=""):
+        """Wait for condition
+        Args:
+            condition - Condition or any callable taking the driver and
+                returning a truthy value when met
+            name - description of the wait (defaults to condition description)
+        Returns:
+            condition's final return value
+        Raises:
+            TimeoutException if condition not met within timeout
+        """
+        name = name or getattr(condition, "description", "")
+        start = clock()
+        polls = 0
+        poll_time = 0.0
+        last_error = None
+        while True:
+            poll_start = clock()
+            try:
+                value = condition(self.driver)
+            except WebDriverException as e:
+                # e.g. page mid-navigation - try again at next poll
+                value = None
+                last_error = e
+            poll_end = clock()
+            polls += 1
+            poll_time += poll_end - poll_start
+            if value:
+                self.last_result = WaitResult(name, poll_end - start, polls, poll_time)
+                return value
+            if poll_end - start > self.timeout:
+                message = "Timed out waiting for " + name
+                if last_error:
+                    message += " (last error: {})".format(last_error)
+                raise TimeoutException(message)
+            time.sleep(self.poll)